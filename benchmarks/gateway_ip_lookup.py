@@ -0,0 +1,103 @@
+# Поиск адреса клиента в списке блокировки шлюза (IPRangeSet: бинарный поиск
+# по отсортированным интервалам) против прямого перебора ipaddress-сетей:
+#
+#     python benchmarks/gateway_ip_lookup.py [--ranges 100000] [--lookups 200000]
+#
+# Список - случайные подсети IPv4 /16-/32 и IPv6 /48-/128. Кроме поиска выводится
+# время построения списка из записей - столько фоновая перезагрузка
+# IP_BLOCKLIST_FILE занимает поток.
+import argparse
+import ipaddress
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "gateway"))
+
+from app.ipfilter import IPRangeSet  # noqa: E402
+
+ROUNDS = 5
+LINEAR_LOOKUPS = 200
+
+
+def make_entries(count: int, rng: random.Random):
+    entries = []
+    for _ in range(count):
+        if rng.random() < 0.9:
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+            entries.append(f"{address}/{rng.randint(16, 32)}")
+        else:
+            address = ipaddress.IPv6Address(rng.getrandbits(128))
+            entries.append(f"{address}/{rng.randint(48, 128)}")
+    return entries
+
+
+def make_addresses(count: int, rng: random.Random):
+    return [
+        str(ipaddress.IPv4Address(rng.getrandbits(32))) if rng.random() < 0.9
+        else str(ipaddress.IPv6Address(rng.getrandbits(128)))
+        for _ in range(count)
+    ]
+
+
+def linear_contains(networks, address: str) -> bool:
+    # Прямой перебор: каждая сеть проверяется по очереди
+    ip = ipaddress.ip_address(address)
+    return any(ip in network for network in networks)
+
+
+def measure(contains, addresses) -> float:
+    # Лучший из нескольких прогонов, мкс на поиск
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for address in addresses:
+            contains(address)
+        timings.append((time.perf_counter() - started) / len(addresses) * 1e6)
+    return min(timings)
+
+
+def main(ranges: int, lookups: int) -> None:
+    rng = random.Random(0)
+    entries = make_entries(ranges, rng)
+    misses = make_addresses(lookups, rng)
+
+    builds = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        range_set = IPRangeSet(entries)
+        builds.append(time.perf_counter() - started)
+    networks = [ipaddress.ip_network(entry, strict=False) for entry in entries]
+    # Адреса внутри подсетей списка - проверка доходит до совпадения
+    hits = [str(networks[rng.randrange(len(networks))].network_address) for _ in range(lookups)]
+    assert all(address in range_set for address in hits[:1000])
+
+    print(f"{ranges} записей, {len(range_set)} интервалов после объединения, "
+          f"построение {statistics.median(builds) * 1000:.0f} мс")
+    print(f"{'поиск':<22} {'адреса':<10} {'мкс/поиск':>10} {'поисков/с':>12}")
+    cases = [
+        ("IPRangeSet", "промах", lambda address: address in range_set, misses),
+        ("IPRangeSet", "попадание", lambda address: address in range_set, hits),
+        ("перебор ipaddress", "промах", lambda address: linear_contains(networks, address), misses[:LINEAR_LOOKUPS]),
+        ("перебор ipaddress", "попадание", lambda address: linear_contains(networks, address), hits[:LINEAR_LOOKUPS]),
+    ]
+    for label, kind, contains, addresses in cases:
+        if label != "IPRangeSet":
+            # Перебор на порядки медленнее: один прогон на малой выборке
+            started = time.perf_counter()
+            for address in addresses:
+                contains(address)
+            cost = (time.perf_counter() - started) / len(addresses) * 1e6
+        else:
+            cost = measure(contains, addresses)
+        print(f"{label:<22} {kind:<10} {cost:>10.2f} {1e6 / cost:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ranges", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.ranges, args.lookups)
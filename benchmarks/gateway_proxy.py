@@ -0,0 +1,201 @@
+# Прокси шлюза (proxy_router: пул соединений на сервис, потоковая передача тел)
+# против прямого запроса к сервису и прежнего варианта - общий httpx.AsyncClient()
+# без настроек, ответ читается целиком.
+#
+#     python benchmarks/gateway_proxy.py [--requests 2000] [--concurrency 32] [--slow-clients 150]
+#
+# Сервисы-заглушки работают в uvicorn в отдельных процессах (настоящие соединения),
+# шлюз вызывается через ASGI в процессе бенчмарка.
+#
+# Последний сценарий - исчерпание пула: slow-clients запросов висят на медленном
+# post-service, а замеряются быстрые запросы к user-service. У прежнего прокси
+# пул соединений общий на все сервисы, у шлюза - свой пул и bulkhead на сервис.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+LARGE_SIZE = 4 * 1024 * 1024
+SLOW_DELAY = 0.5
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+UPSTREAM_PORT = free_port()
+SECOND_UPSTREAM_PORT = free_port()
+os.environ["POST_SERVICE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}"
+os.environ["USER_SERVICE_URL"] = f"http://127.0.0.1:{SECOND_UPSTREAM_PORT}"
+os.environ.setdefault("UPSTREAM_HTTP2", "false")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "gateway"))
+
+from fastapi import FastAPI  # noqa: E402
+
+from app.proxy import proxy_router, upstreams  # noqa: E402
+
+
+async def small(request: Request):
+    return JSONResponse({"items": [{"id": i, "name": f"Пост {i}"} for i in range(20)], "total": 20})
+
+
+async def large(request: Request):
+    async def body():
+        chunk = b"x" * 65536
+        for _ in range(LARGE_SIZE // len(chunk)):
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/octet-stream")
+
+
+async def echo(request: Request):
+    return Response(await request.body(), media_type="application/octet-stream")
+
+
+async def slow(request: Request):
+    await asyncio.sleep(SLOW_DELAY)
+    return JSONResponse({"items": [], "total": 0})
+
+
+upstream_app = Starlette(routes=[
+    Route("/posts/small", small),
+    Route("/posts/large", large),
+    Route("/posts/echo", echo, methods=["POST"]),
+    Route("/posts/slow", slow),
+    Route("/users/small", small),
+])
+
+
+def run_upstream(port: int) -> None:
+    uvicorn.run(upstream_app, port=port, log_level="warning", lifespan="off")
+
+
+def start_upstream(port: int) -> multiprocessing.Process:
+    process = multiprocessing.Process(target=run_upstream, args=(port,), daemon=True)
+    process.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return process
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+
+def gateway_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(proxy_router("post"), prefix="/posts")
+    app.include_router(proxy_router("user"), prefix="/users")
+    return app
+
+
+def naive_gateway_app() -> FastAPI:
+    # Прежний шлюз: один клиент по умолчанию на все сервисы, тело ответа буферизуется
+    app = FastAPI()
+    client = httpx.AsyncClient()
+    urls = {"posts": os.environ["POST_SERVICE_URL"], "users": os.environ["USER_SERVICE_URL"]}
+
+    @app.api_route("/{service}/{path:path}", methods=["GET", "POST"])
+    async def proxy(service: str, path: str, request: Request):
+        response = await client.request(
+            request.method,
+            f"{urls[service]}/{service}/{path}",
+            content=await request.body(),
+        )
+        return Response(response.content, status_code=response.status_code, media_type=response.headers.get("content-type"))
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, method: str, path: str, body, requests: int, concurrency: int):
+    latencies = []
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            started = time.perf_counter()
+            async with client.stream(method, path, content=body) as response:
+                async for _ in response.aiter_raw():
+                    pass
+            assert response.status_code == 200, response.status_code
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.99) - 1)]
+
+
+async def measure_under_slow_load(client: httpx.AsyncClient, requests: int, concurrency: int, slow_clients: int):
+    # Быстрые запросы к user-service, пока slow_clients клиентов ждут post-service
+    stop = asyncio.Event()
+
+    async def slow_worker():
+        while not stop.is_set():
+            response = await client.get("/posts/slow")
+            if response.status_code != 200:
+                # 503 от bulkhead: клиент повторяет не сразу
+                await asyncio.sleep(0.05)
+
+    workers = [asyncio.create_task(slow_worker()) for _ in range(slow_clients)]
+    await asyncio.sleep(SLOW_DELAY)
+    try:
+        return await measure(client, "GET", "/users/small", None, requests, concurrency)
+    finally:
+        stop.set()
+        await asyncio.gather(*workers)
+
+
+async def main(requests: int, concurrency: int, slow_clients: int) -> None:
+    upstreams_processes = [start_upstream(UPSTREAM_PORT), start_upstream(SECOND_UPSTREAM_PORT)]
+    limits = httpx.Limits(max_connections=concurrency)
+    clients = {
+        "напрямую": httpx.AsyncClient(base_url=os.environ["POST_SERVICE_URL"], limits=limits),
+        "прокси шлюза": httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway_app()), base_url="http://gw"),
+        "прежний прокси": httpx.AsyncClient(transport=httpx.ASGITransport(app=naive_gateway_app()), base_url="http://gw"),
+    }
+    cases = [
+        ("GET 1KB JSON", "GET", "/posts/small", None, requests),
+        ("GET 4MB", "GET", "/posts/large", None, max(1, requests // 20)),
+        ("POST 256KB", "POST", "/posts/echo", b"y" * 256 * 1024, max(1, requests // 4)),
+    ]
+    print(f"{'запрос':<14} {'путь':<16} {'req/s':>9} {'p50, мс':>9} {'p99, мс':>9}")
+    try:
+        for label, method, path, body, count in cases:
+            for name, client in clients.items():
+                # Прогрев: соединения в пулах
+                await measure(client, method, path, body, min(count, concurrency), concurrency)
+                rps, p50, p99 = await measure(client, method, path, body, count, concurrency)
+                print(f"{label:<14} {name:<16} {rps:>9.0f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f}")
+        for name in ("прокси шлюза", "прежний прокси"):
+            rps, p50, p99 = await measure_under_slow_load(clients[name], requests // 4, concurrency, slow_clients)
+            print(f"{'пул исчерпан':<14} {name:<16} {rps:>9.0f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f}")
+    finally:
+        for client in clients.values():
+            await client.aclose()
+        await upstreams.close()
+        for process in upstreams_processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--slow-clients", type=int, default=150)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.slow_clients))
@@ -0,0 +1,100 @@
+# Накладные расходы RateLimitMiddleware шлюза на один запрос:
+#
+#     python benchmarks/gateway_rate_limit.py [--requests 200000] [--clients 100000] [--redis redis://localhost:6379/15]
+#
+# Middleware вызывается напрямую как ASGI-приложение с пустым приложением за ним,
+# без сети и сериализации - остается только работа лимитера: группа по пути,
+# адрес клиента, GCRA в хранилище. Из времени вычитается вызов без middleware.
+# С --redis дополнительно замеряется RedisRateLimitStore (один запрос к Redis).
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("TRUSTED_PROXIES", '["127.0.0.1"]')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "gateway"))
+
+from app.middleware.rate_limit import RateLimitMiddleware  # noqa: E402
+from app.ratelimit import MemoryRateLimitStore, RedisRateLimitStore, parse_rate  # noqa: E402
+
+ROUNDS = 5
+
+
+async def empty_app(scope, receive, send) -> None:
+    pass
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message) -> None:
+    pass
+
+
+def make_scopes(clients: int):
+    return [
+        {"type": "http", "path": "/posts/1", "headers": [], "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 50000)}
+        for i in range(clients)
+    ]
+
+
+async def measure(app, scopes, requests: int) -> float:
+    # Лучший из нескольких прогонов, мкс на запрос
+    timings = []
+    count = len(scopes)
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for i in range(requests):
+            await app(scopes[i % count], receive, send)
+        timings.append((time.perf_counter() - started) / requests * 1e6)
+    return min(timings)
+
+
+def middleware(store, limit: str) -> RateLimitMiddleware:
+    return RateLimitMiddleware(empty_app, store=store, rates={"posts": parse_rate(limit)}, exempt=())
+
+
+async def main(requests: int, clients: int, redis_url) -> None:
+    many = make_scopes(clients)
+    one = many[:1]
+    # Запрос через доверенный прокси: адрес клиента берется из X-Forwarded-For
+    proxied = [{**one[0], "client": ("127.0.0.1", 50000), "headers": [(b"x-forwarded-for", b"203.0.113.7, 10.0.0.1")]}]
+
+    baseline = await measure(empty_app, one, requests)
+    cases = [
+        ("1 клиент, пропуск", middleware(MemoryRateLimitStore(), "1000000000/second"), one),
+        (f"{clients} клиентов, пропуск", middleware(MemoryRateLimitStore(), "1000000000/second"), many),
+        ("1 клиент, X-Forwarded-For", middleware(MemoryRateLimitStore(), "1000000000/second"), proxied),
+        ("1 клиент, отказ 429", middleware(MemoryRateLimitStore(), "1/day"), one),
+    ]
+    if redis_url:
+        cases.append(("Redis, 1 клиент", middleware(RedisRateLimitStore(redis_url, "bench:"), "1000000000/second"), one))
+
+    print(f"без middleware: {baseline:.2f} мкс на запрос")
+    print(f"{'случай':<30} {'мкс/запрос':>11} {'запросов/с':>12}")
+    for label, app, scopes in cases:
+        count = requests if "Redis" not in label else max(1, requests // 100)
+        overhead = await measure(app, scopes, count) - baseline
+        print(f"{label:<30} {overhead:>11.2f} {1e6 / overhead:>12.0f}")
+
+    # Память: одно число на ключ
+    store = MemoryRateLimitStore()
+    rate = parse_rate("60/minute")
+    for scope in many:
+        await store.hit(scope["client"][0], rate)
+    sizes = [sys.getsizeof(shard) for shard in store._shards]
+    print(f"ключей в памяти: {len(store)}, словари шардов: {sum(sizes) / 1024:.0f} KB "
+          f"(медиана шарда {statistics.median(sizes) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--redis", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.clients, args.redis))
@@ -0,0 +1,96 @@
+# Отдача /media шлюза (MediaFileCache + MediaResponse) против StaticFiles:
+#
+#     python benchmarks/media_files.py [--requests 2000] [--concurrency 32]
+#
+# Оба приложения вызываются напрямую через ASGI (httpx.ASGITransport), без сети:
+# сравнивается работа самого обработчика - open/stat/чтение и заголовки.
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "gateway"))
+
+from app.media import MediaFileCache, MediaResponse  # noqa: E402
+
+FILES = {
+    "small.css": 8 * 1024,
+    "blobs/objects/ab/" + "ab" * 32 + "/original.jpg": 200 * 1024,
+    "large.bin": 4 * 1024 * 1024,
+}
+
+
+def media_app(root: str) -> Starlette:
+    cache = MediaFileCache(root)
+
+    async def media(request: Request) -> Response:
+        media_file = await cache.acquire(request.path_params["path"])
+        if media_file is None:
+            return Response(status_code=404)
+        return MediaResponse(media_file, cache, request.method, request.headers, 3600)
+
+    return Starlette(routes=[Route("/media/{path:path}", media, methods=["GET", "HEAD"])])
+
+
+def static_app(root: str) -> Starlette:
+    return Starlette(routes=[Mount("/media", StaticFiles(directory=root))])
+
+
+async def measure(app: Starlette, path: str, requests: int, concurrency: int, headers=None):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                started = time.perf_counter()
+                response = await client.get(f"/media/{path}", headers=headers)
+                assert response.status_code in (200, 206, 304), response.status_code
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return requests / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main(requests: int, concurrency: int) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        for name, size in FILES.items():
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+
+        apps = {"StaticFiles": static_app(root), "MediaFileCache": media_app(root)}
+        cases = [(name, None) for name in FILES] + [("small.css", {"range": "bytes=0-1023"})]
+        print(f"{'файл':<24} {'приложение':<16} {'req/s':>9} {'p50, мс':>9} {'p99, мс':>9}")
+        for path, headers in cases:
+            label = Path(path).name + (" (Range)" if headers else "")
+            for app_name, app in apps.items():
+                # Прогрев: кэш дескрипторов и страничный кэш ОС
+                await measure(app, path, min(requests, 100), concurrency, headers)
+                rps, p50, p99 = await measure(app, path, requests, concurrency, headers)
+                print(f"{label:<24} {app_name:<16} {rps:>9.0f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
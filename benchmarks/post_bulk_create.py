@@ -0,0 +1,95 @@
+# PostCRUD.bulk_create (один IN-запрос и многострочный INSERT ... RETURNING)
+# против прежнего цикла: EXISTS, flush и refresh на каждый пост.
+#
+#     DATABASE_URL=postgresql+asyncpg://... python benchmarks/post_bulk_create.py [--batch 100] [--rounds 20]
+#
+# Без DATABASE_URL - временная база SQLite. Таблицы в базе пересоздаются.
+# Кроме времени выводится число запросов к базе: по сети каждый из них - еще
+# одна задержка туда-обратно.
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent / "services" / "post-service"
+sys.path[:0] = [str(SERVICE_DIR / "app"), str(SERVICE_DIR.parent)]
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import event  # noqa: E402
+
+import database  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+from crud import PostCRUD  # noqa: E402
+
+
+async def legacy_bulk_create(db, posts, owner_id):
+    # Прежняя реализация: запрос уникальности, flush и refresh для каждого поста
+    db_posts = []
+    for post in posts:
+        normalized_name = models.Post(name=post.name).normalized_name
+        await models.Post.validate_unique_normalized_name(db, normalized_name)
+        db_posts.append(models.Post(
+            name=post.name,
+            text=post.text,
+            is_published=True,
+            user_id=owner_id,
+            normalized_name=normalized_name,
+        ))
+    db.add_all(db_posts)
+    await db.flush()
+    for post in db_posts:
+        await db.refresh(post)
+    return db_posts
+
+
+async def set_based_bulk_create(db, posts, owner_id):
+    return await PostCRUD.bulk_create(db, posts, owner_id)
+
+
+async def measure(create, batch: int, rounds: int, offset: int, statements: list):
+    timings = []
+    for round_number in range(rounds):
+        posts = [
+            schemas.PostCreate(name=f"Пост {offset + round_number * batch + i}", text="Кот сидит на окне", user_id=1)
+            for i in range(batch)
+        ]
+        async with database.AsyncSessionFactory() as db:
+            statements.clear()
+            started = time.perf_counter()
+            await create(db, posts, 1)
+            await db.commit()
+            timings.append(time.perf_counter() - started)
+    return timings, len(statements)
+
+
+async def main(batch: int, rounds: int) -> None:
+    engine = database.engine
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.drop_all)
+        await conn.run_sync(database.Base.metadata.create_all)
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    print(f"{engine.dialect.name}, пачка {batch} постов, {rounds} повторов")
+    print(f"{'реализация':<14} {'запросов':>9} {'p50, мс':>9} {'p99, мс':>9} {'постов/с':>10}")
+    for offset, (label, create) in enumerate([("цикл", legacy_bulk_create), ("bulk_create", set_based_bulk_create)]):
+        timings, count = await measure(create, batch, rounds, offset * batch * rounds, statements)
+        timings.sort()
+        p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+        rate = batch * len(timings) / sum(timings)
+        print(f"{label:<14} {count:>9} {statistics.median(timings) * 1000:>9.2f} {p99 * 1000:>9.2f} {rate:>10.0f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch, args.rounds))
@@ -0,0 +1,119 @@
+# Обработка изображений постов под параллельной нагрузкой: прежний путь
+# (новый ThreadPoolExecutor и одна миниатюра на каждую загрузку) против общего
+# пула процессов ImageProcessor (одна миниатюра и все варианты imaging.IMAGE_VARIANTS).
+#
+#     python benchmarks/post_image_pipeline.py [--uploads 64] [--concurrency 16] [--size 3000x2000]
+#
+# Выводит загрузки в секунду, p50/p99 времени обработки одной загрузки и
+# наибольшую задержку событийного цикла - ее видят все остальные запросы.
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent / "services" / "post-service"
+sys.path[:0] = [str(SERVICE_DIR / "app"), str(SERVICE_DIR.parent)]
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from PIL import Image  # noqa: E402
+
+from imaging import IMAGE_VARIANTS, image_processor, variant_path  # noqa: E402
+
+
+def make_source(path: str, size) -> None:
+    gradient = Image.linear_gradient("L").resize(size)
+    Image.merge("RGB", (gradient, gradient.rotate(90, expand=False), gradient.transpose(Image.FLIP_LEFT_RIGHT))) \
+        .save(path, "JPEG", quality=90)
+
+
+async def legacy_upload(source_path: str, directory: str) -> None:
+    # Прежний PostImage._create_thumbnail
+    def create_thumbnail_sync():
+        with Image.open(source_path) as image:
+            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
+            image.save(os.path.join(directory, "thumb.jpg"), "JPEG", quality=85)
+
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor() as pool:
+        await loop.run_in_executor(pool, create_thumbnail_sync)
+
+
+async def pooled_upload(source_path: str, directory: str, names=tuple(IMAGE_VARIANTS)) -> None:
+    # Копия оригинала в своем каталоге: варианты пишутся рядом с ним
+    path = os.path.join(directory, "original.jpg")
+    shutil.copyfile(source_path, path)
+    await image_processor.render(path, [(IMAGE_VARIANTS[name], variant_path(path, name)) for name in names])
+
+
+async def pooled_thumbnail(source_path: str, directory: str) -> None:
+    await pooled_upload(source_path, directory, ("thumb",))
+
+
+async def loop_lag(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def measure(upload, source_path: str, uploads: int, concurrency: int):
+    latencies = []
+    lags = []
+    queue = iter(range(uploads))
+    with tempfile.TemporaryDirectory() as root:
+        async def worker():
+            for number in queue:
+                directory = os.path.join(root, str(number))
+                os.makedirs(directory)
+                started = time.perf_counter()
+                await upload(source_path, directory)
+                latencies.append(time.perf_counter() - started)
+
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(loop_lag(stop, lags))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return uploads / elapsed, statistics.median(latencies), p99, max(lags, default=0.0)
+
+
+async def main(uploads: int, concurrency: int, size) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        source_path = os.path.join(root, "source.jpg")
+        make_source(source_path, size)
+        # Процессы пула запускаются до замера
+        await pooled_upload(source_path, tempfile.mkdtemp(dir=root))
+
+        print(f"{size[0]}x{size[1]} JPEG, {uploads} загрузок, {concurrency} одновременно, "
+              f"{image_processor.workers} процессов в пуле")
+        print(f"{'путь':<26} {'загрузок/с':>11} {'p50, мс':>9} {'p99, мс':>9} {'задержка цикла, мс':>19}")
+        cases = [
+            ("ThreadPool, 1 размер", legacy_upload),
+            ("ImageProcessor, 1 размер", pooled_thumbnail),
+            (f"ImageProcessor, {len(IMAGE_VARIANTS)} вар.", pooled_upload),
+        ]
+        for label, upload in cases:
+            rate, p50, p99, lag = await measure(upload, source_path, uploads, concurrency)
+            print(f"{label:<26} {rate:>11.1f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} {lag * 1000:>19.1f}")
+    image_processor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size", default="3000x2000")
+    args = parser.parse_args()
+    width, height = map(int, args.size.split("x"))
+    asyncio.run(main(args.uploads, args.concurrency, (width, height)))
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import PostgresDsn, validator, Field, HttpUrl
 import secrets
@@ -12,6 +12,10 @@ class Settings(BaseSettings):
     # Security
     JWT_SECRET_KEY: str = Field(default_factory=lambda: secrets.token_urlsafe(32))
     JWT_ALGORITHM: str = Field(default="HS256")
+    JWT_AUDIENCE: Optional[str] = Field(
+        default=None,
+        description="Обязательный aud токена; без значения токены с aud отклоняются"
+    )
     ACCESS_TOKEN_COOKIE_NAME : str = Field(default="access_token")
     ACCESS_TOKEN_COOKIE_SECURE: bool = Field(default=True)
     ACCESS_TOKEN_COOKIE_HTTPONLY: bool = Field(default=True)
@@ -20,6 +24,21 @@ class Settings(BaseSettings):
     CSRF_COOKIE_SECURE: bool = Field(default=True)
     CSRF_HEADER_NAME: str = Field(default="X-CSRF-Token")
     CSRF_TOKEN_LENGTH: int = Field(default=32)
+    JWT_JWKS_URL: Optional[str] = Field(
+        default=None,
+        description="JWKS с ключами подписи (смена ключей без перезапуска шлюза)"
+    )
+    JWT_JWKS_CACHE_TTL: float = Field(default=300.0, gt=0, description="Период перечитывания JWKS")
+    JWT_TOKEN_CACHE_SIZE: int = Field(default=10000, ge=1, description="Проверенных токенов в кэше")
+    JWT_TOKEN_CACHE_TTL: float = Field(default=300.0, gt=0, description="Максимальное время токена в кэше")
+    AUTH_PUBLIC_PATHS: List[str] = Field(
+        default=["/", "/docs", "/redoc", "/openapi.json"],
+        description="Пути без проверки токена (/metrics доступен только суперпользователям)"
+    )
+    AUTH_PUBLIC_PREFIXES: List[str] = Field(
+        default=["/auth", "/static", "/media"],
+        description="Первые сегменты путей без проверки токена"
+    )
 
     # Settings other services
     AUTH_SERVICE_URL: HttpUrl = Field(default="https://auth-service:8001")
@@ -27,6 +46,69 @@ class Settings(BaseSettings):
     POST_SERVICE_URL: HttpUrl  = Field(default="https://post-service:8003")
     COMMENT_SERVICE_URL: HttpUrl  = Field(default="https://comment-service:8004")
 
+    # Пулы соединений с сервисами (у каждого сервиса свой)
+    UPSTREAM_MAX_CONNECTIONS: int = Field(default=100, ge=1)
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, ge=0)
+    UPSTREAM_KEEPALIVE_EXPIRY: float = Field(default=30.0, ge=0, description="Время жизни простаивающего соединения")
+    UPSTREAM_CONNECT_TIMEOUT: float = Field(default=5.0, gt=0)
+    UPSTREAM_HTTP2: bool = Field(default=True, description="HTTP/2 к сервисам по https (нужен пакет h2)")
+
+    # Защита от медленных и упавших сервисов (настройки на каждый сервис)
+    UPSTREAM_MAX_CONCURRENT: int = Field(default=64, ge=1, description="Одновременных запросов к сервису")
+    UPSTREAM_MAX_WAITING: int = Field(default=64, ge=0, description="Запросов в ожидании слота")
+    UPSTREAM_QUEUE_TIMEOUT: float = Field(default=1.0, gt=0, description="Ожидание слота до ответа 503")
+    UPSTREAM_BREAKER_FAILURES: int = Field(default=5, ge=1, description="Ошибок подряд до размыкания цепи")
+    UPSTREAM_BREAKER_RESET_TIMEOUT: float = Field(default=10.0, gt=0)
+    UPSTREAM_MAX_RETRIES: int = Field(default=2, ge=0, description="Повторы GET/HEAD")
+    UPSTREAM_RETRY_BACKOFF: float = Field(default=0.05, ge=0)
+    UPSTREAM_RETRY_BUDGET_RATIO: float = Field(default=0.2, ge=0, description="Доля повторов от запросов")
+    UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND: float = Field(default=1.0, ge=0)
+    UPSTREAM_HEDGE_DELAYS: Dict[str, float] = Field(
+        default={},
+        description="Сервис -> задержка в секундах, после которой GET дублируется"
+    )
+
+    # Медиафайлы: тот же каталог, что STORAGE_LOCAL_ROOT у сервисов. Отдельный от
+    # статики шлюза (/static) и не зависит от рабочего каталога процессов
+    MEDIA_ROOT: str = Field(default="/var/lib/website/media")
+    MEDIA_PRIVATE_PREFIXES: List[str] = Field(
+        default=["blobs/refs", "blobs/trash"],
+        description="Служебные каталоги хранилища (ссылки владельцев, корзина сборщика), не отдаются"
+    )
+    MEDIA_FD_CACHE_SIZE: int = Field(default=256, ge=1, description="Открытых файлов в кэше")
+    MEDIA_RECHECK_INTERVAL: float = Field(
+        default=30.0,
+        ge=0,
+        description="Как часто файлы по содержимому из кэша сверяются с диском, в секундах"
+    )
+    MEDIA_CACHE_MAX_AGE: int = Field(
+        default=3600,
+        ge=0,
+        description="Cache-Control max-age для файлов не по содержимому, в секундах"
+    )
+    MEDIA_RESIZE_SIZES: List[str] = Field(
+        default=["50x50", "150x150", "300x300", "800x800", "1600x1600"],
+        description="Разрешенные размеры /media/resize"
+    )
+    MEDIA_RESIZE_CACHE_DIR: str = Field(default="media-cache")
+    MEDIA_RESIZE_CACHE_MAX_BYTES: int = Field(
+        default=1024 * 1024 * 1024,
+        ge=1,
+        description="Предел каталога кэша на диске, общий для всех воркеров"
+    )
+    MEDIA_RESIZE_WORKERS: int = Field(default=4, ge=1, description="Одновременных ресайзов")
+
+    # Главная страница
+    HOMEPAGE_PER_PAGE: int = Field(default=20, ge=1, le=100)
+    HOMEPAGE_CACHE_TTL: float = Field(default=10.0, ge=0, description="Кэш страницы для анонимных пользователей")
+    HOMEPAGE_CACHE_STALE_TTL: float = Field(
+        default=60.0,
+        ge=0,
+        description="Сколько еще отдавать устаревшую страницу, пока новая строится в фоне"
+    )
+    HOMEPAGE_PAGE_CACHE_SIZE: int = Field(default=256, ge=1)
+    HOMEPAGE_FRAGMENT_CACHE_SIZE: int = Field(default=2000, ge=1, description="Карточек постов в кэше")
+
     # CORS
     CORS_ALLOW_ORIGINS: List[str] = Field(
         default=["http://localhost:8000", "http://localhost:8000"],
@@ -52,16 +134,41 @@ class Settings(BaseSettings):
     RATE_LIMIT_DEFAULT: str = Field(default="60/minute", description="Лимит по умолчанию")
     RATE_LIMIT_AUTH: str = Field(default="10/minute", description="Лимит для аутентификации")
     RATE_LIMIT_API: str = Field(default="1000/minute", description="Лимит для API")
+    RATE_LIMIT_API_PREFIXES: List[str] = Field(
+        default=["/posts", "/users", "/comments"],
+        description="Пути с лимитом RATE_LIMIT_API"
+    )
+    RATE_LIMIT_EXEMPT_PREFIXES: List[str] = Field(
+        default=["/static", "/media", "/metrics"],
+        description="Пути без лимита"
+    )
+    # Хранилище лимитов: memory (один экземпляр шлюза) или redis (общее)
+    RATE_LIMIT_BACKEND: str = Field(default="memory")
+    RATE_LIMIT_REDIS_URL: str = Field(default="redis://localhost:6379/1")
+    RATE_LIMIT_SHARDS: int = Field(default=16, ge=1)
 
     # IP блокировка
     IP_BLOCKLIST_ENABLED: bool = Field(default=True, description="Включить блокировку IP")
-    IP_BLOCKLIST: List[str] = Field(default=[], description="Заблокированные IP адреса")
+    IP_BLOCKLIST: List[str] = Field(default=[], description="Заблокированные IP адреса и подсети CIDR")
+    IP_BLOCKLIST_FILE: Optional[str] = Field(
+        default=None,
+        description="Файл со списком блокировки, перечитывается при изменении"
+    )
+    IP_BLOCKLIST_RELOAD_INTERVAL: float = Field(default=5.0, gt=0)
+    TRUSTED_PROXIES: List[str] = Field(
+        default=[],
+        description="Прокси перед шлюзом (адреса и CIDR): им доверяется X-Forwarded-For"
+    )
 
     # Защита от атак
     MAX_REQUEST_SIZE: int = Field(
         default=10 * 1024 * 1024,  # 10 MB
         description="Максимальный размер запроса"
     )
+    MAX_REQUEST_SIZE_ROUTES: Dict[str, int] = Field(
+        default={"/posts/*/images": 11 * 1024 * 1024},  # 10 MB файла + multipart
+        description="Лимиты размера для путей (префикс, * - один сегмент)"
+    )
 
     REQUEST_TIMEOUT: int = Field(
         default=30,
@@ -75,7 +182,7 @@ class Settings(BaseSettings):
             raise ValueError("URL сервиса должен начинаться с http:// или https://")
         return v
 
-    @validator("CORS_ORIGINS", pre=True)
+    @validator("CORS_ALLOW_ORIGINS", pre=True)
     def assemble_cors_origins(cls, v: str | List[str]) -> List[str] | str:
         if isinstance(v, str) and not v.startswith("["):
             return [i.strip() for i in v.split(",")]
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
+from pydantic import BaseModel
+
+from .proxy import fetch_json, upstreams
+from .resilience import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Место списка постов в отрендеренной странице: страница делится по нему на части
+POSTS_MARKER = Markup("<!--posts-section-->")
+
+MONTHS = ("янв", "фев", "мар", "апр", "мая", "июн", "июл", "авг", "сен", "окт", "ноя", "дек")
+
+
+def format_date(value: datetime) -> str:
+    return f"{value.day:02d} {MONTHS[value.month - 1]} {value.year}"
+
+
+def format_datetime(value: datetime) -> str:
+    return f"{format_date(value)} в {value:%H:%M}"
+
+
+class PostCard(BaseModel):
+    id: int
+    name: str
+    created: datetime
+    updated: datetime
+    preview_text: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+
+    @property
+    def version_key(self) -> Tuple:
+        # Новая версия поста (или готовая миниатюра) - новая карточка
+        return self.id, self.updated, self.thumbnail_url
+
+
+class PostsPage(BaseModel):
+    items: List[PostCard]
+    total: Optional[int] = None
+    page: Optional[int] = None
+    total_pages: Optional[int] = None
+
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class HomepageRenderer:
+    # Главная страница с данными post-service:
+    # - карточки постов кэшируются по версии поста;
+    # - страница для анонимных пользователей кэшируется на cache_ttl секунд, еще
+    #   stale_ttl секунд отдается устаревшая копия, пока новая строится в фоне;
+    # - без кэша HTML отдается потоком: шапка уходит до ответа post-service.
+
+    def __init__(
+            self,
+            templates: Jinja2Templates,
+            per_page: int = 20,
+            cache_ttl: float = 10.0,
+            stale_ttl: float = 60.0,
+            page_cache_size: int = 256,
+            fragment_cache_size: int = 2000,
+    ):
+        self.templates = templates
+        templates.env.filters["format_date"] = format_date
+        templates.env.filters["format_datetime"] = format_datetime
+        self.per_page = per_page
+        self.cache_ttl = cache_ttl
+        self.stale_ttl = stale_ttl
+        # Ключ -> (HTML, момент рендеринга)
+        self.pages = LRUCache(page_cache_size)
+        self.fragments = LRUCache(fragment_cache_size)
+        self._refreshing: Dict[Tuple, asyncio.Task] = {}
+
+    async def fetch_posts(self, page: int, search: Optional[str], deadline: Optional[float]) -> PostsPage:
+        params = {"page": page, "per_page": self.per_page, "is_published": "true"}
+        if search:
+            params["search"] = search
+        data = await fetch_json(upstreams["post"], "/posts/", params=params, deadline=deadline)
+        return PostsPage.model_validate(data)
+
+    def render_card(self, post: PostCard) -> Markup:
+        key = post.version_key
+        card = self.fragments.get(key)
+        if card is None:
+            card = Markup(self.templates.get_template("includes/post_card.html").render(post=post))
+            self.fragments.set(key, card)
+        return card
+
+    def render_posts(self, context: dict, posts: Optional[PostsPage]) -> str:
+        page = context["page"]
+        total_pages = posts.total_pages if posts else None
+        if total_pages:
+            page_numbers = list(range(max(1, page - 2), min(total_pages, page + 2) + 1))
+        else:
+            page_numbers = []
+        return self.templates.get_template("homepage/posts.html").render({
+            **context,
+            "post_cards": [self.render_card(post) for post in posts.items] if posts else [],
+            "total_posts": posts.total if posts and posts.total is not None else 0,
+            "total_pages": total_pages,
+            "page_numbers": page_numbers,
+            "load_error": posts is None,
+        })
+
+    async def load_posts(self, context: dict, deadline: Optional[float]) -> Optional[PostsPage]:
+        try:
+            return await self.fetch_posts(context["page"], context["search_query"], deadline)
+        except (UpstreamUnavailable, httpx.HTTPError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning("Главная страница без постов: %r", e)
+            return None
+
+    async def stream(self, context: dict, deadline: Optional[float]) -> AsyncIterator[Tuple[str, bool]]:
+        # Части страницы и признак того, что ее можно кэшировать
+        posts_task = asyncio.ensure_future(self.load_posts(context, deadline))
+        try:
+            page = self.templates.get_template("homepage/main.html").render({
+                **context,
+                "posts_section": POSTS_MARKER,
+            })
+            head, _, tail = page.partition(POSTS_MARKER)
+            yield head, True
+            posts = await posts_task
+            yield self.render_posts(context, posts), posts is not None
+            yield tail, True
+        finally:
+            posts_task.cancel()
+
+    async def render(self, context: dict) -> Optional[str]:
+        parts = []
+        async for part, cacheable in self.stream(context, None):
+            if not cacheable:
+                return None
+            parts.append(part)
+        return "".join(parts)
+
+    @staticmethod
+    def _refresh_context(request: Request, context: dict) -> dict:
+        # Фоновое обновление переживает запрос: в контексте только то, от чего
+        # зависит анонимная страница, и запрос без cookies и состояния клиента -
+        # его хватает для url_for
+        scope = {
+            "type": "http",
+            "scheme": request.url.scheme,
+            "server": request.scope.get("server"),
+            "root_path": request.scope.get("root_path", ""),
+            "path": "/",
+            "query_string": b"",
+            "headers": [(b"host", request.headers["host"].encode("latin-1"))] if "host" in request.headers else [],
+        }
+        for name in ("app", "router", "app_root_path"):
+            if name in request.scope:
+                scope[name] = request.scope[name]
+        return {
+            "request": Request(scope),
+            "user": None,
+            "has_search": context["has_search"],
+            "search_query": context["search_query"],
+            "page": context["page"],
+        }
+
+    async def _refresh(self, key: Tuple, context: dict) -> None:
+        try:
+            html = await self.render(context)
+            if html is not None:
+                self.pages.set(key, (html, time.monotonic()))
+        except Exception:
+            logger.exception("Не удалось обновить главную страницу в кэше")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def respond(self, request: Request, context: dict) -> Tuple[Optional[str], Optional[AsyncIterator[bytes]]]:
+        # Готовый HTML из кэша или поток частей страницы
+        deadline = getattr(request.state, "deadline", None)
+        if context["user"] is not None:
+            return None, self._encode(self.stream(context, deadline), None)
+
+        # Ссылки url_for абсолютные: адрес сайта - часть ключа
+        key = (str(request.base_url), context["page"], context["search_query"])
+        cached = self.pages.get(key)
+        if cached is not None:
+            html, rendered_at = cached
+            age = time.monotonic() - rendered_at
+            if age < self.cache_ttl:
+                return html, None
+            if age < self.cache_ttl + self.stale_ttl:
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(
+                        self._refresh(key, self._refresh_context(request, context))
+                    )
+                return html, None
+        return None, self._encode(self.stream(context, deadline), key)
+
+    async def _encode(self, parts: AsyncIterator[Tuple[str, bool]], key: Optional[Tuple]) -> AsyncIterator[bytes]:
+        # Страница, отданная потоком целиком и без ошибок, сохраняется в кэш
+        rendered = []
+        cacheable = key is not None
+        async for part, part_cacheable in parts:
+            cacheable = cacheable and part_cacheable
+            if cacheable:
+                rendered.append(part)
+            yield part.encode("utf-8")
+        if cacheable:
+            self.pages.set(key, ("".join(rendered), time.monotonic()))
@@ -0,0 +1,163 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import anyio
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Префикс IPv4-адреса в IPv6 (::ffff:a.b.c.d)
+V4_MAPPED_PREFIX = bytes(10) + b"\xff\xff"
+
+
+def parse_address(value: str) -> Optional[Tuple[int, int]]:
+    # (версия, адрес числом). inet_pton заметно быстрее ipaddress на каждом запросе.
+    value = value.strip()
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big")
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, value)
+    except OSError:
+        return None
+    # IPv4 через IPv6-сокет сравнивается как IPv4
+    if packed[:12] == V4_MAPPED_PREFIX:
+        return 4, int.from_bytes(packed[12:], "big")
+    return 6, int.from_bytes(packed, "big")
+
+
+class IPRangeSet:
+    # Адреса и подсети CIDR как отсортированные непересекающиеся интервалы:
+    # поиск - бинарный, O(log n) от числа интервалов
+
+    def __init__(self, entries: Iterable[str] = ()):
+        ranges: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for entry in entries:
+            entry = entry.strip()
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                logger.warning("Некорректный адрес в списке IP: %r", entry)
+                continue
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        for version, items in ranges.items():
+            items.sort()
+            starts: List[int] = []
+            ends: List[int] = []
+            for start, end in items:
+                # Пересекающиеся и смежные интервалы объединяются
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[version] = starts
+            self._ends[version] = ends
+
+    def __len__(self) -> int:
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def __contains__(self, address: str) -> bool:
+        parsed = parse_address(address)
+        if parsed is None:
+            return False
+        version, value = parsed
+        i = bisect_right(self._starts[version], value) - 1
+        return i >= 0 and value <= self._ends[version][i]
+
+
+def read_entries(path: str) -> List[str]:
+    # Одна запись на строке, после # - комментарий
+    with open(path, encoding="utf-8") as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+
+def client_address(scope, trusted: IPRangeSet) -> Optional[str]:
+    # Адрес клиента: X-Forwarded-For учитывается, только если запрос пришел
+    # от доверенного прокси, и читается справа до первого недоверенного адреса
+    client = scope.get("client")
+    if client is None:
+        return None
+    host = client[0]
+    if host not in trusted:
+        return host
+
+    forwarded = [
+        value.decode("latin-1")
+        for name, value in scope["headers"]
+        if name == b"x-forwarded-for"
+    ]
+    for hop in reversed(",".join(forwarded).split(",")):
+        hop = hop.strip()
+        if not hop:
+            continue
+        if parse_address(hop) is None:
+            break
+        host = hop
+        if hop not in trusted:
+            break
+    return host
+
+
+class IPBlocklist:
+    # Список из настроек и файла IP_BLOCKLIST_FILE. Файл перечитывается в фоне
+    # при изменении: запросы до конца загрузки проверяются по старому списку.
+
+    def __init__(self, entries: Iterable[str], path: Optional[str] = None, reload_interval: float = 5.0):
+        self.entries = list(entries)
+        self.path = path
+        self.reload_interval = reload_interval
+        self.ranges = IPRangeSet(self.entries)
+        # (inode, размер, mtime в нс): замена файла через rename или запись
+        # в ту же секунду не теряется из-за грубого mtime
+        self._identity: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._reloading: Optional[asyncio.Task] = None
+
+    def __contains__(self, address: str) -> bool:
+        if self.path and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.reload_interval
+            if self._reloading is None:
+                self._reloading = asyncio.create_task(self.reload())
+        return address in self.ranges
+
+    def _load(self) -> Optional[IPRangeSet]:
+        try:
+            st = os.stat(self.path)
+            identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            identity = None
+        if identity == self._identity:
+            return None
+        entries = read_entries(self.path) if identity is not None else []
+        self._identity = identity
+        return IPRangeSet(self.entries + entries)
+
+    async def reload(self) -> None:
+        if not self.path:
+            return
+        try:
+            ranges = await anyio.to_thread.run_sync(self._load)
+            if ranges is not None:
+                self.ranges = ranges
+                logger.info("Список блокировки IP загружен: %d интервалов", len(ranges))
+        except Exception as e:
+            logger.warning("Не удалось загрузить список блокировки IP: %r", e)
+        finally:
+            self._reloading = None
+
+
+trusted_proxies = IPRangeSet(settings.TRUSTED_PROXIES)
+ip_blocklist = IPBlocklist(settings.IP_BLOCKLIST, settings.IP_BLOCKLIST_FILE, settings.IP_BLOCKLIST_RELOAD_INTERVAL)
@@ -2,12 +2,23 @@ from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-import httpx
-from .routes import main, posts, users, comments
+from .routes import main, auth, posts, users, comments, media, metrics
+from .proxy import upstreams
 from .middleware.auth import AuthMiddleware
+from .middleware.rate_limit import RateLimitMiddleware
+from .middleware.ip_blocklist import IPBlocklistMiddleware
+from .middleware.request_limits import RequestLimitsMiddleware
+from .ipfilter import ip_blocklist
 
 app = FastAPI(title="WebSite Gateway")
 
+app.add_middleware(AuthMiddleware)
+app.add_middleware(RequestLimitsMiddleware)
+# Лимит проверяется до токена: перебор токенов тоже ограничен
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(IPBlocklistMiddleware)
+
+# Добавленный позже middleware - внешний: ответы 401 тоже получают заголовки CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,20 +27,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(AuthMiddleware)
-
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 @app.on_event("startup")
 async def startup():
-    app.state.http_client = httpx.AsyncClient()
+    await ip_blocklist.reload()
+    await media.image_resizer.load()
 
 @app.on_event("shutdown")
 async def shutdown():
-    await app.state.http_client.aclose()
+    await upstreams.close()
+    media.media_files.close()
+    media.image_resizer.close()
 
 app.include_router(main.router)
+app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(posts.router, prefix="/posts", tags=["posts"])
 app.include_router(users.router, prefix="/users", tags=["users"])
-app.include_router(comments.router, prefix="/comments", tags=["comments"])
\ No newline at end of file
+app.include_router(comments.router, prefix="/comments", tags=["comments"])
+app.include_router(media.router, prefix="/media", tags=["media"])
+app.include_router(metrics.router, tags=["metrics"])
\ No newline at end of file
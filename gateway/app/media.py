@@ -0,0 +1,300 @@
+import os
+import re
+import stat
+import time
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Файлы хранилища по содержимому: blobs/objects/<ab>/<sha256>/<имя>
+CONTENT_ADDRESSED = re.compile(r"(?:^|/)objects/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})/")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class MediaFile:
+    # Открытый файл из кэша дескрипторов. Файл закрывается, когда он вытеснен
+    # из кэша и его больше не отдает ни один ответ.
+    __slots__ = (
+        "path", "file", "identity", "size", "etag", "last_modified",
+        "content_type", "immutable", "refs", "retired", "checked_at",
+    )
+
+    def __init__(self, path: str, file, st: os.stat_result, content_type: str, etag: str, immutable: bool):
+        self.path = path
+        self.file = file
+        self.identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        self.size = st.st_size
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.etag = etag
+        self.immutable = immutable
+        self.refs = 0
+        self.retired = False
+        self.checked_at = time.monotonic()
+
+
+class MediaFileCache:
+    # LRU открытых дескрипторов: повторные запросы не делают open/fstat.
+    # Файлы сверяются с диском по stat: обычные - на каждом запросе, файлы по
+    # содержимому - раз в recheck_interval секунд (их удаляет сборщик мусора).
+
+    def __init__(self, root: str, max_size: int = 256, recheck_interval: float = 30.0, private_prefixes=()):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        self.recheck_interval = recheck_interval
+        self.private_prefixes = tuple(prefix.strip("/") + "/" for prefix in private_prefixes)
+        self._entries: "OrderedDict[str, MediaFile]" = OrderedDict()
+
+    def resolve(self, key: str) -> Optional[str]:
+        # Скрытые файлы и каталоги (.tmp, .touch), служебные каталоги хранилища
+        # и выход из корня не отдаются
+        parts = key.split("/")
+        if not key or any(not part or part.startswith(".") for part in parts):
+            return None
+        if (key + "/").startswith(self.private_prefixes):
+            return None
+        path = os.path.normpath(os.path.join(self.root, *parts))
+        if os.path.commonpath([path, self.root]) != self.root:
+            return None
+        return path
+
+    def describe(self, key: str, st: os.stat_result) -> Tuple[str, str, bool]:
+        # Content-Type, ETag и неизменяемость файла
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        match = CONTENT_ADDRESSED.search(key)
+        if match is None:
+            return content_type, f'"{st.st_size:x}-{st.st_mtime_ns:x}"', False
+
+        # Сильный ETag из хэша содержимого: одинаков на всех серверах
+        name = key.rsplit("/", 1)[-1]
+        digest = match.group("digest")
+        etag = f'"{digest}"' if name.startswith("original.") else f'"{digest}-{name}"'
+        return content_type, etag, True
+
+    def _open(self, path: str, key: str) -> Optional[MediaFile]:
+        try:
+            file = open(path, "rb", buffering=0)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError):
+            return None
+        st = os.fstat(file.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            file.close()
+            return None
+        return MediaFile(path, file, st, *self.describe(key, st))
+
+    @staticmethod
+    def _identity(path: str) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    async def acquire(self, key: str) -> Optional[MediaFile]:
+        path = self.resolve(key)
+        if path is None:
+            return None
+
+        entry = self._entries.get(path)
+        now = time.monotonic()
+        if entry is not None and (not entry.immutable or now - entry.checked_at >= self.recheck_interval):
+            identity = await anyio.to_thread.run_sync(self._identity, path)
+            if identity != entry.identity:
+                # Удаленный (ENOENT) или замененный файл больше не отдается
+                self._retire(entry)
+                entry = None
+            else:
+                entry.checked_at = now
+
+        if entry is None:
+            entry = await anyio.to_thread.run_sync(self._open, path, key)
+            if entry is None:
+                return None
+            # Пока файл открывался, его мог добавить параллельный запрос
+            previous = self._entries.get(path)
+            if previous is not None:
+                self._retire(previous)
+            self._entries[path] = entry
+            while len(self._entries) > self.max_size:
+                self._retire(next(iter(self._entries.values())))
+
+        self._entries.move_to_end(path)
+        entry.refs += 1
+        return entry
+
+    def release(self, entry: MediaFile) -> None:
+        entry.refs -= 1
+        if entry.retired and entry.refs == 0:
+            entry.file.close()
+
+    def _retire(self, entry: MediaFile) -> None:
+        if self._entries.get(entry.path) is entry:
+            del self._entries[entry.path]
+        entry.retired = True
+        if entry.refs == 0:
+            entry.file.close()
+
+    def discard(self, key: str) -> None:
+        path = self.resolve(key)
+        entry = self._entries.get(path) if path else None
+        if entry is not None:
+            self._retire(entry)
+
+    def close(self) -> None:
+        for entry in list(self._entries.values()):
+            self._retire(entry)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # Слабое сравнение, как требует If-None-Match
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Один диапазон bytes=a-b, bytes=a- или bytes=-n. Несколько диапазонов
+    # и нераспознанные значения игнорируются: отдается весь файл.
+    # (-1, -1) - диапазон вне файла.
+    unit, _, value = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in value:
+        return None
+    start, sep, end = value.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start:
+            first = int(start)
+            last = int(end) if end else size - 1
+        else:
+            first = size - int(end)
+            last = size - 1
+    except ValueError:
+        return None
+    if first < 0:
+        first = 0
+    if first > last or first >= size:
+        return -1, -1
+    return first, min(last, size - 1)
+
+
+class MediaResponse(Response):
+    # Ответ из открытого файла: Range, условные запросы, zero-copy отправка.
+    # Если сервер поддерживает расширение ASGI http.response.zerocopy, байты
+    # отдает sendfile ядра; иначе чтение через pread чанками из пула потоков.
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+            self,
+            media_file: MediaFile,
+            cache: MediaFileCache,
+            method: str,
+            headers,
+            max_age: int,
+            immutable: Optional[bool] = None,
+            vary: Optional[str] = None,
+    ):
+        super().__init__()
+        self.media_file = media_file
+        self.cache = cache
+        self.send_body = method != "HEAD"
+        self.start = 0
+        self.end = media_file.size - 1
+
+        if immutable is None:
+            immutable = media_file.immutable
+        self.raw_headers = []
+        self._set("etag", media_file.etag)
+        self._set("last-modified", media_file.last_modified)
+        self._set("cache-control", IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={max_age}")
+        self._set("accept-ranges", "bytes")
+        if vary:
+            self._set("vary", vary)
+
+        if self._not_modified(headers):
+            self.status_code = 304
+            self.send_body = False
+            return
+
+        self._set("content-type", media_file.content_type)
+        self._set("x-content-type-options", "nosniff")
+
+        byte_range = self._requested_range(headers)
+        if byte_range == (-1, -1):
+            self.status_code = 416
+            self.send_body = False
+            self._set("content-range", f"bytes */{media_file.size}")
+            self._set("content-length", "0")
+            return
+        if byte_range is not None:
+            self.status_code = 206
+            self.start, self.end = byte_range
+            self._set("content-range", f"bytes {self.start}-{self.end}/{media_file.size}")
+        self._set("content-length", str(self.end - self.start + 1))
+
+    def _set(self, name: str, value: str) -> None:
+        self.raw_headers.append((name.encode("latin-1"), value.encode("latin-1")))
+
+    def _not_modified(self, headers) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.media_file.etag)
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                modified = parsedate_to_datetime(self.media_file.last_modified)
+            except (TypeError, ValueError):
+                return False
+            return modified <= since
+        return False
+
+    def _requested_range(self, headers) -> Optional[Tuple[int, int]]:
+        range_header = headers.get("range")
+        if not range_header or self.media_file.size == 0:
+            return None
+        # If-Range: диапазон только для той же версии файла
+        if_range = headers.get("if-range")
+        if if_range and if_range.strip() not in (self.media_file.etag, self.media_file.last_modified):
+            return None
+        return parse_range(range_header, self.media_file.size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            count = self.end - self.start + 1
+            if not self.send_body or count <= 0:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": self.media_file.file,
+                    "offset": self.start,
+                    "count": count,
+                })
+            else:
+                await self._send_chunks(send, count)
+        finally:
+            self.cache.release(self.media_file)
+
+    async def _send_chunks(self, send: Send, count: int) -> None:
+        # pread не двигает позицию файла: один дескриптор читают параллельные ответы
+        fd = self.media_file.file.fileno()
+        offset = self.start
+        while count > 0:
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, count), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            count -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+        if count > 0:
+            # Файл укоротили во время отдачи: закрываем тело
+            await send({"type": "http.response.body", "body": b""})
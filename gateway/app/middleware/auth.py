@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+import jwt
+from pydantic import BaseModel, ValidationError
+from starlette.responses import JSONResponse
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ подписи из настроек (без kid в заголовке токена)
+DEFAULT_KID = ""
+
+
+class TokenData(BaseModel):
+    user_id: int
+    username: str
+    email: str
+    is_superuser: bool = False
+    exp: Optional[datetime] = None
+
+
+class AuthError(Exception):
+    pass
+
+
+class KeyStore:
+    # Ключи проверки подписи по kid. С JWT_JWKS_URL набор ключей периодически
+    # перечитывается в фоне: запросы до конца загрузки проверяются по текущим ключам.
+    # Токен с неизвестным kid ждет загрузки - он может быть подписан новым ключом.
+
+    def __init__(
+            self,
+            secret: str,
+            algorithm: str,
+            jwks_url: Optional[str],
+            ttl: float,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.transport = transport
+        self.keys: Dict[str, object] = {DEFAULT_KID: secret} if secret else {}
+        self.version = 0
+        self._loaded_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def get(self, kid: Optional[str]) -> object:
+        kid = kid or DEFAULT_KID
+        if self.jwks_url:
+            if kid not in self.keys:
+                await self.refresh(force=True)
+            elif time.monotonic() - self._loaded_at > self.ttl and self._refreshing is None:
+                self._refreshing = asyncio.create_task(self._refresh_in_background())
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise AuthError("Неизвестный ключ подписи")
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self.refresh()
+        finally:
+            self._refreshing = None
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._get_lock():
+            # Неизвестный kid перечитывает ключи не чаще раза в секунду
+            elapsed = time.monotonic() - self._loaded_at
+            if elapsed < (1.0 if force else self.ttl):
+                return
+            self._loaded_at = time.monotonic()
+            try:
+                async with httpx.AsyncClient(timeout=settings.UPSTREAM_CONNECT_TIMEOUT, transport=self.transport) as client:
+                    response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                keys = jwt.PyJWKSet.from_dict(response.json()).keys
+            except (httpx.HTTPError, ValueError, jwt.PyJWTError) as e:
+                logger.warning("Не удалось загрузить ключи JWKS: %r", e)
+                return
+            new_keys = {key.key_id or DEFAULT_KID: key.key for key in keys}
+            if DEFAULT_KID not in new_keys and self.secret:
+                new_keys[DEFAULT_KID] = self.secret
+            if new_keys.keys() != self.keys.keys():
+                self.version += 1
+            self.keys = new_keys
+
+
+class TokenCache:
+    # Проверенные токены -> данные до истечения срока: подпись каждого токена
+    # проверяется один раз, а не на каждом запросе
+
+    def __init__(self, max_size: int, max_ttl: float):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # Токен -> (данные, момент истечения по time.time(), версия ключей)
+        self._entries: "OrderedDict[str, Tuple[TokenData, float, int]]" = OrderedDict()
+
+    def get(self, token: str, key_version: int) -> Optional[TokenData]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        data, expires_at, version = entry
+        # После смены ключей токен проверяется заново: ключ мог быть отозван
+        if expires_at <= time.time() or version != key_version:
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return data
+
+    def put(self, token: str, data: TokenData, key_version: int) -> None:
+        expires_at = time.time() + self.max_ttl
+        if data.exp is not None:
+            expires_at = min(expires_at, data.exp.timestamp())
+        self._entries[token] = (data, expires_at, key_version)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class TokenVerifier:
+    def __init__(self, key_store: KeyStore, cache: TokenCache, audience: Optional[str] = None):
+        self.key_store = key_store
+        self.cache = cache
+        self.audience = audience
+        self.required_claims = ["exp", "aud"] if audience else ["exp"]
+
+    async def verify(self, token: str) -> TokenData:
+        cached = self.cache.get(token, self.key_store.version)
+        if cached is not None:
+            return cached
+        try:
+            header = jwt.get_unverified_header(token)
+            key = await self.key_store.get(header.get("kid"))
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[self.key_store.algorithm],
+                audience=self.audience,
+                options={"require": self.required_claims},
+            )
+            data = TokenData.model_validate(claims)
+        except jwt.ExpiredSignatureError:
+            raise AuthError("Срок действия токена истек")
+        except (jwt.PyJWTError, ValidationError):
+            raise AuthError("Недействительный токен")
+        self.cache.put(token, data, self.key_store.version)
+        return data
+
+
+class PathAllowlist:
+    # Пути без обязательного токена: точные пути (токен проверяется, если есть)
+    # и первые сегменты пути (без проверки). Оба случая - поиск в множестве.
+
+    def __init__(self, paths: Iterable[str], prefixes: Iterable[str]):
+        self.paths = frozenset(path.rstrip("/") or "/" for path in paths)
+        self.prefixes = frozenset(prefix.strip("/") for prefix in prefixes)
+
+    def __contains__(self, path: str) -> bool:
+        return self.matches_path(path) or self.matches_prefix(path)
+
+    def matches_path(self, path: str) -> bool:
+        return (path.rstrip("/") or "/") in self.paths
+
+    def matches_prefix(self, path: str) -> bool:
+        return path.split("/", 2)[1] in self.prefixes if path.startswith("/") else False
+
+
+def get_token(headers: Dict[str, str], cookies: Dict[str, str]) -> Optional[str]:
+    authorization = headers.get("authorization", "")
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials.strip()
+    return cookies.get(settings.ACCESS_TOKEN_COOKIE_NAME)
+
+
+def parse_cookies(header: str) -> Dict[str, str]:
+    cookies = {}
+    for item in header.split(";"):
+        name, sep, value = item.partition("=")
+        if sep:
+            cookies[name.strip()] = value.strip().strip('"')
+    return cookies
+
+
+class AuthMiddleware:
+    # Проверка JWT в шлюзе без обращения к auth-service: данные токена
+    # доступны обработчикам как request.state.user
+
+    def __init__(self, app, verifier: Optional[TokenVerifier] = None, allowlist: Optional[PathAllowlist] = None):
+        self.app = app
+        self.verifier = verifier or TokenVerifier(
+            KeyStore(
+                settings.JWT_SECRET_KEY,
+                settings.JWT_ALGORITHM,
+                settings.JWT_JWKS_URL,
+                settings.JWT_JWKS_CACHE_TTL,
+            ),
+            TokenCache(settings.JWT_TOKEN_CACHE_SIZE, settings.JWT_TOKEN_CACHE_TTL),
+            settings.JWT_AUDIENCE,
+        )
+        self.allowlist = allowlist or PathAllowlist(settings.AUTH_PUBLIC_PATHS, settings.AUTH_PUBLIC_PREFIXES)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["user"] = None
+        # Предварительные CORS-запросы приходят без токена
+        if scope["method"] == "OPTIONS" or self.allowlist.matches_prefix(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        # На публичных путях (AUTH_PUBLIC_PATHS) токен необязателен, но если он
+        # есть, страница строится для пользователя
+        public = self.allowlist.matches_path(scope["path"])
+
+        headers = {}
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1")
+            if name in ("authorization", "cookie"):
+                headers[name] = value.decode("latin-1")
+        token = get_token(headers, parse_cookies(headers.get("cookie", "")))
+        if not token:
+            if public:
+                await self.app(scope, receive, send)
+            else:
+                await self._unauthorized("Требуется авторизация")(scope, receive, send)
+            return
+        try:
+            state["user"] = await self.verifier.verify(token)
+        except AuthError as e:
+            if not public:
+                await self._unauthorized(str(e))(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _unauthorized(detail: str) -> JSONResponse:
+        return JSONResponse({"detail": detail}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
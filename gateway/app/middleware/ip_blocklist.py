@@ -0,0 +1,25 @@
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+from ..config import settings
+from ..ipfilter import IPBlocklist, IPRangeSet, client_address, ip_blocklist, trusted_proxies
+
+
+class IPBlocklistMiddleware:
+    def __init__(self, app, blocklist: Optional[IPBlocklist] = None, trusted: Optional[IPRangeSet] = None):
+        self.app = app
+        self.blocklist = blocklist or ip_blocklist
+        self.trusted = trusted if trusted is not None else trusted_proxies
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.IP_BLOCKLIST_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        address = client_address(scope, self.trusted)
+        if address is not None and address in self.blocklist:
+            response = JSONResponse({"detail": "Доступ запрещен"}, status_code=403)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,69 @@
+import logging
+import math
+from typing import Dict, Iterable, Optional
+
+from starlette.responses import JSONResponse
+
+from ..config import settings
+from ..ipfilter import client_address, trusted_proxies
+from ..ratelimit import Rate, create_store, parse_rate
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitMiddleware:
+    # Лимиты запросов на клиента: для /auth - RATE_LIMIT_AUTH, для API сервисов -
+    # RATE_LIMIT_API, для остального - RATE_LIMIT_DEFAULT. Группа определяется
+    # по первому сегменту пути.
+
+    def __init__(
+            self,
+            app,
+            store=None,
+            rates: Optional[Dict[str, Rate]] = None,
+            exempt: Optional[Iterable[str]] = None,
+    ):
+        self.app = app
+        self.store = store or create_store()
+        self.default_rate = parse_rate(settings.RATE_LIMIT_DEFAULT)
+        if rates is None:
+            auth_rate = parse_rate(settings.RATE_LIMIT_AUTH)
+            api_rate = parse_rate(settings.RATE_LIMIT_API)
+            rates = {"auth": auth_rate}
+            rates.update((prefix.strip("/"), api_rate) for prefix in settings.RATE_LIMIT_API_PREFIXES)
+        self.rates = rates
+        self.exempt = frozenset(
+            prefix.strip("/") for prefix in (settings.RATE_LIMIT_EXEMPT_PREFIXES if exempt is None else exempt)
+        )
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        group = scope["path"].split("/", 2)[1]
+        address = client_address(scope, trusted_proxies) if group not in self.exempt else None
+        if address is None:
+            await self.app(scope, receive, send)
+            return
+
+        rate = self.rates.get(group)
+        if rate is None:
+            rate, group = self.default_rate, ""
+        try:
+            result = await self.store.hit(f"{group}:{address}", rate)
+        except Exception as e:
+            # Недоступное хранилище лимитов не останавливает шлюз
+            logger.warning("Ошибка хранилища лимитов запросов: %r", e)
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
+            response = JSONResponse(
+                {"detail": "Слишком много запросов"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
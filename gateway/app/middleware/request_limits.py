@@ -0,0 +1,114 @@
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from ..config import settings
+
+
+class RequestBodyError(Exception):
+    status_code = 400
+    detail = ""
+
+
+class RequestTooLarge(RequestBodyError):
+    status_code = 413
+    detail = "Слишком большой запрос"
+
+
+class RequestBodyTimeout(RequestBodyError):
+    status_code = 408
+    detail = "Тело запроса не получено вовремя"
+
+
+def compile_route(pattern: str) -> "re.Pattern":
+    # "/posts/*/images": * - один сегмент пути, совпадение по префиксу
+    parts = [re.escape(part) if part != "*" else "[^/]+" for part in pattern.rstrip("/").split("/")]
+    return re.compile("/".join(parts) + "(?:/|$)")
+
+
+class RequestLimitsMiddleware:
+    # Размер тела считается по мере получения, без буферизации: запрос больше
+    # лимита прерывается 413 на первом лишнем байте. Срок REQUEST_TIMEOUT
+    # отсчитывается от начала запроса и общий для получения тела и ожидания
+    # ответа сервиса (request.state.deadline).
+
+    def __init__(self, app, max_size: Optional[int] = None, routes: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_size = settings.MAX_REQUEST_SIZE if max_size is None else max_size
+        self.routes: List[Tuple["re.Pattern", int]] = [
+            (compile_route(pattern), limit)
+            for pattern, limit in (settings.MAX_REQUEST_SIZE_ROUTES if routes is None else routes).items()
+        ]
+
+    def limit_for(self, path: str) -> int:
+        for pattern, limit in self.routes:
+            if pattern.match(path):
+                return limit
+        return self.max_size
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + settings.REQUEST_TIMEOUT
+        scope.setdefault("state", {})["deadline"] = deadline
+        limit = self.limit_for(scope["path"])
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > limit:
+                    await self._reject(RequestTooLarge(), scope, receive, send)
+                    return
+                break
+
+        received = 0
+        body_done = False
+        response_started = False
+
+        async def receive_limited():
+            nonlocal received, body_done
+            if body_done:
+                # После тела - только ожидание http.disconnect, без срока
+                return await receive()
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                message = await asyncio.wait_for(receive(), timeout)
+            except asyncio.TimeoutError:
+                raise RequestBodyTimeout()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise RequestTooLarge()
+                body_done = not message.get("more_body", False)
+            else:
+                body_done = True
+            return message
+
+        async def send_tracked(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_tracked)
+        except RequestBodyError as e:
+            if response_started:
+                raise
+            await self._reject(e, scope, receive, send)
+
+    @staticmethod
+    async def _reject(error: RequestBodyError, scope, receive, send) -> None:
+        # Соединение закрывается: непрочитанный остаток тела не нужен
+        response = JSONResponse(
+            {"detail": error.detail},
+            status_code=error.status_code,
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import math
+import time
+from http.cookiejar import CookieJar
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import StreamingResponse
+
+from .config import settings
+from .ipfilter import trusted_proxies
+from .middleware.request_limits import RequestBodyTimeout
+from .resilience import Bulkhead, CircuitBreaker, RetryBudget, UpstreamGuard, UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Заголовки соединения (RFC 9110, 7.6.1): не передаются через прокси
+HOP_BY_HOP_HEADERS = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"proxy-connection",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+})
+PROXY_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+# Повторять и дублировать можно только эти запросы (и только без тела)
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+
+def filter_headers(headers: Iterable[Tuple[bytes, bytes]], drop: FrozenSet[bytes] = frozenset()) -> RawHeaders:
+    # Заголовки как в ASGI: имена в нижнем регистре, байты. Кроме стандартных,
+    # убираются заголовки, перечисленные в Connection
+    headers = list(headers)
+    hop_by_hop = HOP_BY_HOP_HEADERS | drop
+    for name, value in headers:
+        if name == b"connection":
+            hop_by_hop = hop_by_hop | {token.strip().lower() for token in value.split(b",")}
+    return [(name, value) for name, value in headers if name not in hop_by_hop]
+
+
+class DiscardCookieJar(CookieJar):
+    # Cookie из ответов сервисов адресованы клиентам шлюза: общий клиент
+    # не хранит их и не подставляет в запросы других пользователей
+
+    def extract_cookies(self, response, request) -> None:
+        pass
+
+    def set_cookie(self, cookie) -> None:
+        pass
+
+
+class Upstream:
+    # Сервис за шлюзом: свой пул соединений, keep-alive и HTTP/2 (мультиплексирование
+    # запросов в одном TLS-соединении, если сервис его поддерживает)
+
+    def __init__(
+            self,
+            name: str,
+            base_url: str,
+            limits: httpx.Limits,
+            timeout: httpx.Timeout,
+            http2: bool,
+            guard: UpstreamGuard,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.limits = limits
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.guard = guard
+        self.timeouts = timeout.as_dict()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                follow_redirects=False,
+                cookies=DiscardCookieJar(),
+                transport=self.transport,
+            )
+        return self._client
+
+    def build_request(self, method: str, url: str, headers: RawHeaders, content, deadline: float) -> httpx.Request:
+        # Запрос собирается без client.build_request: путь уже готов, а заголовки
+        # по умолчанию (Accept-Encoding, User-Agent) не подмешиваются к заголовкам
+        # клиента шлюза. Таймауты операций (и ожидание соединения из пула) - не
+        # дольше остатка срока запроса
+        remaining = max(deadline - time.monotonic(), 0.0)
+        timeouts = {
+            name: remaining if value is None else min(value, remaining)
+            for name, value in self.timeouts.items()
+        }
+        return httpx.Request(
+            method,
+            self.base_url + url,
+            headers=headers,
+            content=content,
+            extensions={"timeout": timeouts},
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class UpstreamPool:
+    def __init__(self, upstreams: Dict[str, Upstream]):
+        self.upstreams = upstreams
+
+    def __getitem__(self, name: str) -> Upstream:
+        return self.upstreams[name]
+
+    async def close(self) -> None:
+        await asyncio.gather(*(upstream.close() for upstream in self.upstreams.values()))
+
+
+def _create_pool() -> UpstreamPool:
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.REQUEST_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+    if settings.UPSTREAM_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("Пакет h2 не установлен: соединения с сервисами по HTTP/1.1")
+    urls = {
+        "auth": settings.AUTH_SERVICE_URL,
+        "user": settings.USER_SERVICE_URL,
+        "post": settings.POST_SERVICE_URL,
+        "comment": settings.COMMENT_SERVICE_URL,
+    }
+    return UpstreamPool({
+        name: Upstream(name, str(url), limits, timeout, settings.UPSTREAM_HTTP2, _create_guard(name))
+        for name, url in urls.items()
+    })
+
+
+def _create_guard(name: str) -> UpstreamGuard:
+    return UpstreamGuard(
+        name,
+        CircuitBreaker(settings.UPSTREAM_BREAKER_FAILURES, settings.UPSTREAM_BREAKER_RESET_TIMEOUT),
+        RetryBudget(settings.UPSTREAM_RETRY_BUDGET_RATIO, settings.UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND),
+        Bulkhead(
+            settings.UPSTREAM_MAX_CONCURRENT,
+            settings.UPSTREAM_MAX_WAITING,
+            settings.UPSTREAM_QUEUE_TIMEOUT,
+        ),
+        max_retries=settings.UPSTREAM_MAX_RETRIES,
+        backoff=settings.UPSTREAM_RETRY_BACKOFF,
+        hedge_delay=settings.UPSTREAM_HEDGE_DELAYS.get(name),
+    )
+
+
+upstreams = _create_pool()
+
+
+def _forwarded_headers(scope) -> RawHeaders:
+    # Заголовки берутся из scope как есть, без разбора в Request.headers
+    client = scope.get("client")
+    client_host = client[0] if client else None
+    # Цепочка X-Forwarded-For от клиента, а не от доверенного прокси, не передается
+    trusted = client_host is not None and client_host in trusted_proxies
+    headers = []
+    forwarded_for = None
+    host = b""
+    for name, value in filter_headers(scope["headers"]):
+        if name == b"host":
+            host = value
+        elif name.startswith(b"x-forwarded-"):
+            if trusted and name == b"x-forwarded-for":
+                forwarded_for = value if forwarded_for is None else forwarded_for + b", " + value
+        else:
+            headers.append((name, value))
+    if client_host:
+        address = client_host.encode("latin-1")
+        forwarded_for = forwarded_for + b", " + address if forwarded_for else address
+    if forwarded_for:
+        headers.append((b"x-forwarded-for", forwarded_for))
+    headers.append((b"x-forwarded-proto", scope["scheme"].encode("latin-1")))
+    headers.append((b"x-forwarded-host", host))
+    return headers
+
+
+class ProxyResponse(StreamingResponse):
+    # Тело ответа сервиса потоком. Соединение возвращается в пул, а слот
+    # bulkhead освобождается и при обрыве клиентом. Ответ с Content-Length
+    # до buffer_size читается целиком и отправляется одним сообщением: без
+    # задачи, которая следит за отключением клиента во время передачи
+
+    buffer_size = 64 * 1024
+
+    def __init__(self, response: httpx.Response, on_close: Callable[[], None]):
+        super().__init__(response.aiter_raw(), status_code=response.status_code)
+        self.upstream_response = response
+        self.on_close = on_close
+        # Повторяющиеся заголовки (Set-Cookie) сохраняются
+        self.raw_headers = filter_headers((name.lower(), value) for name, value in response.headers.raw)
+
+    def _buffered(self) -> bool:
+        length = self.upstream_response.headers.get("content-length")
+        return length is not None and length.isdigit() and int(length) <= self.buffer_size
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            if self._buffered():
+                body = b"".join([chunk async for chunk in self.body_iterator])
+                await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+                await send({"type": "http.response.body", "body": body})
+            else:
+                await super().__call__(scope, receive, send)
+        finally:
+            await self.upstream_response.aclose()
+            self.on_close()
+
+
+async def proxy_request(request: Request, upstream: Upstream) -> StreamingResponse:
+    # Путь и строка запроса передаются без перекодирования, тела запроса и ответа -
+    # потоком, без буферизации в шлюзе
+    scope = request.scope
+    url = (scope.get("raw_path") or scope["path"].encode()).decode("latin-1")
+    if scope["query_string"]:
+        url = f"{url}?{scope['query_string'].decode('latin-1')}"
+
+    has_body = any(name in (b"content-length", b"transfer-encoding") for name, _ in scope["headers"])
+    headers = _forwarded_headers(scope)
+    # REQUEST_TIMEOUT - и на каждую операцию с сокетом, и на весь запрос: срок
+    # отсчитывается с начала запроса (RequestLimitsMiddleware), все попытки - в нем
+    deadline = scope.get("state", {}).get("deadline") or time.monotonic() + settings.REQUEST_TIMEOUT
+    body_pending = has_body
+
+    async def body():
+        nonlocal body_pending
+        async for chunk in request.stream():
+            yield chunk
+        body_pending = False
+
+    def send():
+        upstream_request = upstream.build_request(
+            request.method,
+            url,
+            headers,
+            body() if has_body else None,
+            deadline,
+        )
+        return upstream.client.send(upstream_request, stream=True)
+
+    guard = upstream.guard
+    try:
+        await guard.acquire()
+    except UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Сервис {upstream.name} временно недоступен",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+
+    try:
+        response = await guard.call(
+            send,
+            idempotent=request.method in IDEMPOTENT_METHODS and not has_body,
+            deadline=deadline,
+            client_stalled=lambda: body_pending,
+        )
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        guard.release()
+        if body_pending:
+            # Клиент не прислал тело до срока: 408, а не 504
+            raise RequestBodyTimeout()
+        raise HTTPException(status_code=504, detail=f"Сервис {upstream.name} не ответил вовремя")
+    except httpx.TransportError as e:
+        guard.release()
+        logger.warning("Ошибка соединения с сервисом %s: %r", upstream.name, e)
+        raise HTTPException(status_code=502, detail=f"Сервис {upstream.name} недоступен")
+    except BaseException:
+        guard.release()
+        raise
+
+    return ProxyResponse(response, guard.release)
+
+
+async def fetch_json(upstream: Upstream, path: str, params: Optional[dict] = None, deadline: Optional[float] = None):
+    # GET к сервису из самого шлюза: тот же пул соединений и те же bulkhead,
+    # circuit breaker и повторы, что у проксируемых запросов
+    guard = upstream.guard
+    await guard.acquire()
+    try:
+        def send():
+            return upstream.client.send(upstream.client.build_request("GET", path, params=params), stream=True)
+
+        response = await guard.call(
+            send,
+            idempotent=True,
+            deadline=deadline or time.monotonic() + settings.REQUEST_TIMEOUT,
+        )
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+    finally:
+        guard.release()
+    response.raise_for_status()
+    return response.json()
+
+
+def proxy_router(upstream_name: str) -> APIRouter:
+    # Маршруты шлюза передаются сервису по тому же пути
+    router = APIRouter()
+
+    @router.api_route("", methods=PROXY_METHODS, include_in_schema=False)
+    @router.api_route("/{path:path}", methods=PROXY_METHODS, include_in_schema=False)
+    async def proxy(request: Request):
+        return await proxy_request(request, upstreams[upstream_name])
+
+    return router
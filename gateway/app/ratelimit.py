@@ -0,0 +1,121 @@
+import re
+import time
+from typing import Dict, List, NamedTuple
+
+from .config import settings
+
+PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+RATE_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+class Rate(NamedTuple):
+    limit: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        # Интервал между запросами при равномерном потоке
+        return self.period / self.limit
+
+
+def parse_rate(value: str) -> Rate:
+    # "60/minute", "1000/hour", "10/5 minutes"
+    match = RATE_PATTERN.match(value.lower())
+    if match is None:
+        raise ValueError(f"Некорректный лимит: {value!r}")
+    limit, multiplier, unit = match.groups()
+    if int(limit) < 1:
+        raise ValueError(f"Некорректный лимит: {value!r}")
+    return Rate(int(limit), int(multiplier or 1) * PERIODS[unit])
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float
+
+
+class MemoryRateLimitStore:
+    # GCRA: на ключ хранится одно число - теоретическое время следующего запроса (TAT).
+    # Ключи разбиты на шарды: истекшие записи удаляются по одному шарду за раз,
+    # стоимость очистки не растет с числом клиентов скачком.
+
+    def __init__(self, shards: int = 16, sweep_interval: float = 60.0):
+        self._shards: List[Dict[str, float]] = [{} for _ in range(shards)]
+        self._sweep_step = sweep_interval / shards
+        self._next_sweep = time.monotonic() + self._sweep_step
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    async def hit(self, key: str, rate: Rate) -> RateLimitResult:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        shard = self._shards[hash(key) % len(self._shards)]
+        tat = shard.get(key, now)
+        if tat < now:
+            tat = now
+        new_tat = tat + rate.interval
+        # Допускается всплеск до limit запросов, дальше - не чаще interval
+        allow_at = new_tat - rate.period
+        if allow_at > now:
+            return RateLimitResult(False, allow_at - now)
+        shard[key] = new_tat
+        return RateLimitResult(True, 0.0)
+
+    def _sweep(self, now: float) -> None:
+        # TAT в прошлом равносилен отсутствию записи
+        shard = self._shards[self._cursor]
+        for key in [key for key, tat in shard.items() if tat <= now]:
+            del shard[key]
+        self._cursor = (self._cursor + 1) % len(self._shards)
+        self._next_sweep = now + self._sweep_step
+
+
+# Тот же GCRA атомарно на сервере: общие лимиты для всех экземпляров шлюза.
+# Время - часы Redis, а не экземпляров шлюза.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if allow_at > now then
+    return {0, tostring(allow_at - now)}
+end
+redis.call("SET", KEYS[1], tostring(new_tat), "PX", math.ceil((new_tat - now) * 1000))
+return {1, "0"}
+"""
+
+
+class RedisRateLimitStore:
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("Для RATE_LIMIT_BACKEND=redis нужен пакет redis") from e
+        self.prefix = prefix
+        self._client = redis.from_url(url, decode_responses=True)
+        # EVALSHA с повторной загрузкой скрипта при NOSCRIPT
+        self._script = self._client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, rate: Rate) -> RateLimitResult:
+        allowed, retry_after = await self._script(keys=[self.prefix + key], args=[rate.interval, rate.period])
+        return RateLimitResult(bool(int(allowed)), float(retry_after))
+
+
+def create_store():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryRateLimitStore(settings.RATE_LIMIT_SHARDS)
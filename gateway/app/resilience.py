@@ -0,0 +1,341 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Границы гистограммы времени ответа сервиса, в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Send = Callable[[], Awaitable[httpx.Response]]
+
+
+class UpstreamUnavailable(Exception):
+    # Запрос не отправлен: ответ 503 с Retry-After
+    def __init__(self, upstream: str, reason: str, retry_after: float):
+        super().__init__(f"{upstream}: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # После failure_threshold ошибок подряд сервис не вызывается reset_timeout секунд,
+    # затем пропускается один пробный запрос: успех закрывает цепь, ошибка - снова открывает
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+        # Пробный запрос, результат которого не пришел, не блокирует цепь навсегда
+        if now - self._probe_at < self.reset_timeout:
+            return False
+        self._probe_at = now
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_at = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probe_at = 0.0
+
+
+class RetryBudget:
+    # Повторы (и дублирующие запросы) - не больше ratio от числа запросов,
+    # плюс min_per_second при малом трафике. Бюджет не дает повторам умножить
+    # нагрузку на сервис, который и так не справляется.
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class Bulkhead:
+    # Ограничение одновременных запросов к сервису: медленный сервис
+    # не занимает все соединения и задачи шлюза
+
+    def __init__(self, max_concurrent: int, max_waiting: int, timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        semaphore = self._get_semaphore()
+        if not semaphore.locked():
+            # Свободный слот: без wait_for (он создает задачу на каждый вызов)
+            await semaphore.acquire()
+            self.in_flight += 1
+            return True
+        if self.waiting >= self.max_waiting:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+
+class UpstreamMetrics:
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latency_sum += seconds
+        self.latency_count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_buckets[i] += 1
+
+
+def is_failure(response: httpx.Response) -> bool:
+    return response.status_code in (500, 502, 503, 504)
+
+
+class UpstreamGuard:
+    # Вызовы одного сервиса: bulkhead, circuit breaker, повторы идемпотентных
+    # запросов в пределах бюджета и дублирование медленных чтений (hedging)
+
+    def __init__(
+            self,
+            name: str,
+            breaker: CircuitBreaker,
+            budget: RetryBudget,
+            bulkhead: Bulkhead,
+            max_retries: int = 2,
+            backoff: float = 0.05,
+            hedge_delay: Optional[float] = None,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self.bulkhead = bulkhead
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_delay = hedge_delay
+        self.metrics = UpstreamMetrics()
+
+    async def acquire(self) -> None:
+        # Слот держится до конца передачи тела ответа (см. release)
+        if not self.breaker.allow():
+            self.metrics.counters["shed_circuit_open"] += 1
+            raise UpstreamUnavailable(self.name, "circuit_open", self.breaker.retry_after())
+        if not await self.bulkhead.acquire():
+            self.metrics.counters["shed_bulkhead"] += 1
+            raise UpstreamUnavailable(self.name, "bulkhead", self.bulkhead.timeout)
+
+    def release(self) -> None:
+        self.bulkhead.release()
+
+    async def call(
+            self,
+            send: Send,
+            idempotent: bool,
+            deadline: float,
+            client_stalled: Optional[Callable[[], bool]] = None,
+    ) -> httpx.Response:
+        # send строит и отправляет новый запрос при каждом вызове.
+        # client_stalled() - срок вышел, пока ждали тело запроса от клиента
+        self.budget.deposit()
+        self.metrics.counters["requests"] += 1
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            response: Optional[httpx.Response] = None
+            error: Optional[BaseException] = None
+            try:
+                hedge_delay = self.hedge_delay if idempotent else None
+                response = await asyncio.wait_for(self._attempt(send, hedge_delay), timeout=deadline - started)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error = e
+            self.metrics.observe(time.monotonic() - started)
+
+            if error is not None and client_stalled is not None and client_stalled():
+                # Сервис не виноват: не сбой для circuit breaker, повтор бессмыслен
+                raise error
+            if response is not None and not is_failure(response):
+                self.breaker.record_success()
+                return response
+
+            self.breaker.record_failure()
+            self.metrics.counters["failures"] += 1
+
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            can_retry = (
+                idempotent
+                and attempt < self.max_retries
+                and time.monotonic() + delay < deadline
+                and self.breaker.allow()
+                and self.budget.withdraw()
+            )
+            if not can_retry:
+                if response is not None:
+                    return response
+                raise error
+            if response is not None:
+                await response.aclose()
+
+            attempt += 1
+            self.metrics.counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, send: Send, hedge_delay: Optional[float]) -> httpx.Response:
+        if hedge_delay is None:
+            return await send()
+
+        first = asyncio.ensure_future(send())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done or not self.budget.withdraw():
+            return await first
+
+        # Первый запрос задерживается: второй такой же, побеждает первый успешный ответ
+        self.metrics.counters["hedges"] += 1
+        second = asyncio.ensure_future(send())
+        winner = await self._first_success([first, second])
+        if winner is second:
+            self.metrics.counters["hedge_wins"] += 1
+        return winner.result()
+
+    @staticmethod
+    async def _first_success(tasks: List[asyncio.Future]) -> asyncio.Future:
+        pending = set(tasks)
+        last = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    last = task
+                    if task.exception() is None and not is_failure(task.result()):
+                        return task
+            return last
+        finally:
+            for task in tasks:
+                if task is last:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif task.exception() is None:
+                    await task.result().aclose()
+
+    def render_metrics(self) -> List[str]:
+        labels = f'upstream="{self.name}"'
+        counters = self.metrics.counters
+        lines = [
+            f"gateway_upstream_requests_total{{{labels}}} {counters['requests']}",
+            f"gateway_upstream_failures_total{{{labels}}} {counters['failures']}",
+            f"gateway_upstream_retries_total{{{labels}}} {counters['retries']}",
+            f"gateway_upstream_hedges_total{{{labels}}} {counters['hedges']}",
+            f"gateway_upstream_hedge_wins_total{{{labels}}} {counters['hedge_wins']}",
+            f'gateway_upstream_shed_total{{{labels},reason="circuit_open"}} {counters["shed_circuit_open"]}',
+            f'gateway_upstream_shed_total{{{labels},reason="bulkhead"}} {counters["shed_bulkhead"]}',
+            f"gateway_upstream_in_flight{{{labels}}} {self.bulkhead.in_flight}",
+            f"gateway_upstream_waiting{{{labels}}} {self.bulkhead.waiting}",
+            f"gateway_upstream_circuit_state{{{labels}}} {CIRCUIT_STATES[self.breaker.state]}",
+            f"gateway_upstream_retry_budget_tokens{{{labels}}} {self.budget.tokens:.3f}",
+        ]
+        # Счетчики корзин уже накопительные (см. UpstreamMetrics.observe)
+        for bound, count in zip(LATENCY_BUCKETS, self.metrics.latency_buckets):
+            lines.append(f'gateway_upstream_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'gateway_upstream_latency_seconds_bucket{{{labels},le="+Inf"}} {self.metrics.latency_count}')
+        lines.append(f"gateway_upstream_latency_seconds_sum{{{labels}}} {self.metrics.latency_sum:.6f}")
+        lines.append(f"gateway_upstream_latency_seconds_count{{{labels}}} {self.metrics.latency_count}")
+        return lines
+
+
+METRIC_TYPES = {
+    "gateway_upstream_requests_total": "counter",
+    "gateway_upstream_failures_total": "counter",
+    "gateway_upstream_retries_total": "counter",
+    "gateway_upstream_hedges_total": "counter",
+    "gateway_upstream_hedge_wins_total": "counter",
+    "gateway_upstream_shed_total": "counter",
+    "gateway_upstream_in_flight": "gauge",
+    "gateway_upstream_waiting": "gauge",
+    "gateway_upstream_circuit_state": "gauge",
+    "gateway_upstream_retry_budget_tokens": "gauge",
+    "gateway_upstream_latency_seconds": "histogram",
+}
+
+
+def render_metrics(guards: List[UpstreamGuard]) -> str:
+    # Формат Prometheus text exposition
+    lines = []
+    samples = [guard.render_metrics() for guard in guards]
+    for name, metric_type in METRIC_TYPES.items():
+        lines.append(f"# TYPE {name} {metric_type}")
+        for guard_lines in samples:
+            lines.extend(
+                line for line in guard_lines
+                if line.split("{", 1)[0] == name
+                or (metric_type == "histogram" and line.startswith(name + "_"))
+            )
+    return "\n".join(lines) + "\n"
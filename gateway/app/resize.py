@@ -0,0 +1,290 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import anyio
+from PIL import Image, ImageOps
+
+from .media import CONTENT_ADDRESSED, MediaFile, MediaFileCache
+
+try:
+    # AVIF: Pillow со встроенным libavif или плагин pillow-avif-plugin
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+OUTPUT_FORMATS = {
+    "AVIF": ("avif", "image/avif"),
+    "WEBP": ("webp", "image/webp"),
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+}
+SAVE_OPTIONS = {
+    "AVIF": {"quality": 60},
+    "WEBP": {"quality": 80, "method": 4},
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+}
+FIT_MODES = ("contain", "cover")
+
+
+def avif_supported() -> bool:
+    return ".avif" in Image.registered_extensions()
+
+
+def accepted_types(accept: Optional[str]) -> Dict[str, float]:
+    # MIME-тип -> q из заголовка Accept
+    types = {}
+    for item in (accept or "").split(","):
+        mime, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if mime:
+            types[mime.lower()] = q
+    return types
+
+
+def negotiate_format(accept: Optional[str], source_key: str) -> str:
+    types = accepted_types(accept)
+    candidates = (["AVIF"] if avif_supported() else []) + ["WEBP"]
+    for fmt in candidates:
+        if types.get(OUTPUT_FORMATS[fmt][1], 0) > 0:
+            return fmt
+    # Без поддержки современных форматов - формат оригинала (GIF - как PNG)
+    return "JPEG" if source_key.lower().endswith((".jpg", ".jpeg")) else "PNG"
+
+
+def render_resized(source_path: str, target_path: str, size: Tuple[int, int], fit: str, fmt: str) -> int:
+    # Выполняется в пуле потоков: PIL отпускает GIL на декодировании и ресайзе
+    with Image.open(source_path) as image:
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            # Прозрачность - на белом фоне
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+
+        if fit == "cover":
+            image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+
+        temp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            image.save(temp_path, fmt, **SAVE_OPTIONS[fmt])
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return os.path.getsize(target_path)
+
+
+class DerivedFileCache(MediaFileCache):
+    # Уменьшенные копии не меняются: имя файла - хэш оригинала и параметров
+
+    def describe(self, key: str, st: os.stat_result) -> Tuple[str, str, bool]:
+        name = key.rsplit("/", 1)[-1]
+        digest, _, extension = name.partition(".")
+        content_type = next(
+            (mime for ext, mime in OUTPUT_FORMATS.values() if ext == extension),
+            "application/octet-stream",
+        )
+        return content_type, f'"{digest}"', True
+
+
+class ImageResizer:
+    # Уменьшенные копии по запросу с дисковым кэшем. Одновременные промахи по
+    # одной копии ждут одного декодирования.
+    #
+    # Каталог кэша общий для всех воркеров, поэтому предел max_bytes держится
+    # по файловой системе, а не по счетчикам процесса: записав sweep_bytes
+    # новых копий, воркер под файловой блокировкой обходит каталог и удаляет
+    # давно не запрошенные файлы (по atime) до 90% предела. Пока блокировку
+    # держит другой воркер, обход пропускается. Между обходами кэш может
+    # превысить предел не больше чем на sweep_bytes на воркер.
+
+    lock_name = ".evict.lock"
+    # atime при попадании обновляется не чаще, чем раз в touch_interval секунд
+    touch_interval = 60.0
+    # Временный файл старше этого - остаток упавшего ресайза
+    stale_temp_age = 3600.0
+
+    def __init__(
+            self,
+            media_files: MediaFileCache,
+            cache_dir: str,
+            max_bytes: int,
+            sizes: Iterable[str],
+            workers: int = 4,
+            fd_cache_size: int = 256,
+            sweep_bytes: Optional[int] = None,
+    ):
+        self.media_files = media_files
+        self.cache_files = DerivedFileCache(cache_dir, fd_cache_size)
+        self.max_bytes = max_bytes
+        self.sweep_bytes = sweep_bytes if sweep_bytes is not None else max(max_bytes // 16, 1)
+        self.sizes = set(sizes)
+        self.workers = workers
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Байт записано с последнего обхода
+        self._written = 0
+        self._sweep: Optional[asyncio.Task] = None
+        # Ключ -> когда этот процесс последний раз обновил atime
+        self._touched: "OrderedDict[str, float]" = OrderedDict()
+
+    def _get_limiter(self) -> anyio.CapacityLimiter:
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        return self._limiter
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        # (atime, ключ, размер) файлов кэша, от давно запрошенных к недавним
+        files = []
+        now = time.time()
+        for directory, _, names in os.walk(self.cache_files.root):
+            for name in names:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                    if name.endswith(".tmp"):
+                        # Чужой ресайз еще может писать этот файл
+                        if now - st.st_mtime > self.stale_temp_age:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.cache_files.root).replace(os.sep, "/")
+                files.append((st.st_atime, key, st.st_size))
+        return sorted(files)
+
+    def _evict_files(self) -> List[str]:
+        # Выполняется в пуле потоков. Возвращает удаленные ключи
+        with open(os.path.join(self.cache_files.root, self.lock_name), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return []
+            files = self._scan()
+            total = sum(size for _, _, size in files)
+            if total <= self.max_bytes:
+                return []
+            target = self.max_bytes * 9 // 10
+            removed = []
+            # Последний запрошенный файл не удаляется, даже если он больше предела
+            for _, key, size in files[:-1]:
+                if total <= target:
+                    break
+                try:
+                    os.remove(self.cache_files.resolve(key))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.append(key)
+            return removed
+
+    async def _evict(self) -> None:
+        self._written = 0
+        for key in await anyio.to_thread.run_sync(self._evict_files):
+            self.cache_files.discard(key)
+            self._touched.pop(key, None)
+
+    def _schedule_sweep(self) -> None:
+        # Обход в фоне: ответ с готовой копией его не ждет
+        if self._sweep is None or self._sweep.done():
+            self._sweep = asyncio.create_task(self._evict())
+
+    async def load(self) -> None:
+        # Кэш переживает перезапуск: сразу приводим его к пределу
+        os.makedirs(self.cache_files.root, exist_ok=True)
+        await self._evict()
+
+    def _touch(self, cached: MediaFile) -> None:
+        # atime - порядок вытеснения. relatime обновляет его не чаще раза в
+        # сутки, поэтому попадания отмечаются явно; mtime остается прежним,
+        # иначе кэш дескрипторов счел бы файл замененным
+        try:
+            os.utime(cached.path, ns=(time.time_ns(), cached.identity[3]))
+        except FileNotFoundError:
+            pass
+
+    def allowed_size(self, size: str) -> Optional[Tuple[int, int]]:
+        if size not in self.sizes:
+            return None
+        width, _, height = size.partition("x")
+        return int(width), int(height)
+
+    @staticmethod
+    def cache_key(source: MediaFile, size: Tuple[int, int], fit: str, fmt: str) -> str:
+        # ETag оригинала в ключе: копия измененного файла строится заново
+        digest = hashlib.sha256(f"{source.etag}|{size[0]}x{size[1]}|{fit}|{fmt}".encode()).hexdigest()
+        return f"{digest[:2]}/{digest}.{OUTPUT_FORMATS[fmt][0]}"
+
+    async def get(
+            self,
+            source_key: str,
+            size: Tuple[int, int],
+            fit: str,
+            fmt: str,
+    ) -> Optional[Tuple[MediaFile, bool]]:
+        # Копия и признак неизменяемости ссылки (оригинал хранится по содержимому)
+        source = await self.media_files.acquire(source_key)
+        if source is None:
+            return None
+        try:
+            key = self.cache_key(source, size, fit, fmt)
+            cached = await self.cache_files.acquire(key)
+            if cached is None:
+                task = self._inflight.get(key)
+                if task is None:
+                    task = asyncio.create_task(self._render(source.path, key, size, fit, fmt))
+                    self._inflight[key] = task
+                    task.add_done_callback(lambda _: self._inflight.pop(key, None))
+                # Отмена одного запроса не прерывает построение для остальных
+                await asyncio.shield(task)
+                cached = await self.cache_files.acquire(key)
+                if cached is None:
+                    return None
+            else:
+                now = time.monotonic()
+                if now - self._touched.get(key, float("-inf")) >= self.touch_interval:
+                    self._touched[key] = now
+                    self._touched.move_to_end(key)
+                    while len(self._touched) > self.cache_files.max_size * 4:
+                        self._touched.popitem(last=False)
+                    await anyio.to_thread.run_sync(self._touch, cached)
+            return cached, CONTENT_ADDRESSED.search(source_key) is not None
+        finally:
+            self.media_files.release(source)
+
+    async def _render(self, source_path: str, key: str, size: Tuple[int, int], fit: str, fmt: str) -> None:
+        target_path = self.cache_files.resolve(key)
+        await anyio.to_thread.run_sync(os.makedirs, os.path.dirname(target_path), 0o755, True)
+        file_size = await anyio.to_thread.run_sync(
+            render_resized, source_path, target_path, size, fit, fmt,
+            limiter=self._get_limiter(),
+        )
+        self._written += file_size
+        if self._written >= self.sweep_bytes:
+            self._schedule_sweep()
+
+    def close(self) -> None:
+        self.cache_files.close()
@@ -0,0 +1,4 @@
+from ..proxy import proxy_router
+
+# Запросы к comment-service
+router = proxy_router("comment")
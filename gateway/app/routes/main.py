@@ -1,10 +1,38 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from ..config import settings
+from ..homepage import HomepageRenderer
+
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+homepage_renderer = HomepageRenderer(
+    templates,
+    per_page=settings.HOMEPAGE_PER_PAGE,
+    cache_ttl=settings.HOMEPAGE_CACHE_TTL,
+    stale_ttl=settings.HOMEPAGE_CACHE_STALE_TTL,
+    page_cache_size=settings.HOMEPAGE_PAGE_CACHE_SIZE,
+    fragment_cache_size=settings.HOMEPAGE_FRAGMENT_CACHE_SIZE,
+)
 
 @router.get("/", response_class=HTMLResponse)
-async def homepage(request: Request):
-    return templates.TemplateResponse("homepage/main.html", {"request": request})
+async def homepage(
+        request: Request,
+        page: int = Query(1, ge=1),
+        q: Optional[str] = Query(None, max_length=200),
+):
+    search_query = q.strip() if q else ""
+    context = {
+        "request": request,
+        "user": getattr(request.state, "user", None),
+        "has_search": bool(search_query),
+        "search_query": search_query,
+        "page": page,
+    }
+    html, parts = await homepage_renderer.respond(request, context)
+    if html is not None:
+        return HTMLResponse(html)
+    return StreamingResponse(parts, media_type="text/html; charset=utf-8")
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Request
+from PIL import Image
+
+from ..config import settings
+from ..media import MediaFileCache, MediaResponse
+from ..resize import ImageResizer, FIT_MODES, negotiate_format
+
+router = APIRouter()
+media_files = MediaFileCache(
+    settings.MEDIA_ROOT,
+    settings.MEDIA_FD_CACHE_SIZE,
+    settings.MEDIA_RECHECK_INTERVAL,
+    settings.MEDIA_PRIVATE_PREFIXES,
+)
+image_resizer = ImageResizer(
+    media_files,
+    settings.MEDIA_RESIZE_CACHE_DIR,
+    settings.MEDIA_RESIZE_CACHE_MAX_BYTES,
+    settings.MEDIA_RESIZE_SIZES,
+    workers=settings.MEDIA_RESIZE_WORKERS,
+    fd_cache_size=settings.MEDIA_FD_CACHE_SIZE,
+)
+
+
+@router.api_route("/resize/{size}/{path:path}", methods=["GET", "HEAD"])
+async def resized_media(size: str, path: str, request: Request, fit: str = "contain"):
+    # Уменьшенная копия изображения; формат выбирается по Accept
+    dimensions = image_resizer.allowed_size(size)
+    if dimensions is None:
+        raise HTTPException(status_code=400, detail="Недопустимый размер изображения")
+    if fit not in FIT_MODES:
+        raise HTTPException(status_code=400, detail="Недопустимый режим масштабирования")
+
+    fmt = negotiate_format(request.headers.get("accept"), path)
+    try:
+        result = await image_resizer.get(path, dimensions, fit, fmt)
+    except (OSError, Image.DecompressionBombError):
+        raise HTTPException(status_code=415, detail="Файл не является изображением")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+    resized, immutable = result
+    return MediaResponse(
+        resized,
+        image_resizer.cache_files,
+        request.method,
+        request.headers,
+        settings.MEDIA_CACHE_MAX_AGE,
+        immutable=immutable,
+        vary="Accept",
+    )
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def media(path: str, request: Request):
+    # Файлы хранилища медиа (STORAGE_BACKEND=local у сервисов)
+    media_file = await media_files.acquire(path)
+    if media_file is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return MediaResponse(
+        media_file,
+        media_files,
+        request.method,
+        request.headers,
+        settings.MEDIA_CACHE_MAX_AGE,
+    )
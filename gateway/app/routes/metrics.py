@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from ..proxy import upstreams
+from ..resilience import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    # Состояние сервисов за шлюзом в формате Prometheus. Токен проверяет
+    # AuthMiddleware; сборщику метрик нужен токен суперпользователя.
+    user = request.state.user
+    if user is None or not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return PlainTextResponse(
+        render_metrics([upstream.guard for upstream in upstreams.upstreams.values()]),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,4 @@
+from ..proxy import proxy_router
+
+# Запросы к post-service
+router = proxy_router("post")
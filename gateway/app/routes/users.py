@@ -0,0 +1,4 @@
+from ..proxy import proxy_router
+
+# Запросы к user-service
+router = proxy_router("user")
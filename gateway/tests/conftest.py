@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+GATEWAY_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(GATEWAY_DIR))
+
+# Настройки до импорта app.config: каталоги во временной папке, HTTP/1.1 к
+# сервисам-заглушкам, без файла .env
+WORK_DIR = tempfile.mkdtemp(prefix="gateway-tests-")
+os.environ["MEDIA_ROOT"] = os.path.join(WORK_DIR, "media")
+os.environ["MEDIA_RESIZE_CACHE_DIR"] = os.path.join(WORK_DIR, "media-cache")
+os.environ["UPSTREAM_HTTP2"] = "false"
+os.environ["JWT_SECRET_KEY"] = "test-secret"
+os.makedirs(os.environ["MEDIA_ROOT"])
+
+import httpx
+from fastapi import FastAPI
+
+from app import proxy
+from app.resilience import Bulkhead, CircuitBreaker, RetryBudget, UpstreamGuard
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def reply(status_code: int, **options) -> httpx.Response:
+    # Ответ сервиса-заглушки как из сети: тело еще не прочитано
+    response = httpx.Response(status_code, **options)
+    return httpx.Response(status_code, headers=response.headers, stream=httpx.ByteStream(response.content))
+
+
+@pytest.fixture
+def proxy_app(monkeypatch):
+    # Приложение с прокси /posts на сервис-заглушку: handler(httpx.Request) -> httpx.Response
+    def create(handler):
+        guard = UpstreamGuard("post", CircuitBreaker(), RetryBudget(), Bulkhead(4, 4, 1.0), backoff=0)
+        upstream = proxy.Upstream(
+            "post",
+            "http://post:8000",
+            httpx.Limits(),
+            httpx.Timeout(5.0, connect=1.0),
+            False,
+            guard,
+            transport=httpx.MockTransport(handler),
+        )
+        monkeypatch.setattr(proxy, "upstreams", proxy.UpstreamPool({"post": upstream}))
+        app = FastAPI()
+        app.include_router(proxy.proxy_router("post"), prefix="/posts")
+        return app, upstream
+
+    return create
@@ -0,0 +1,237 @@
+import base64
+import time
+
+import httpx
+import jwt
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.middleware import auth
+from app.middleware.auth import AuthError, AuthMiddleware, KeyStore, PathAllowlist, TokenCache, TokenVerifier
+from conftest import run
+
+SECRET = "gateway-test-secret-key-0123456789"
+JWKS_URL = "http://auth-service/.well-known/jwks.json"
+CLAIMS = {"user_id": 7, "username": "ivan", "email": "ivan@example.com"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_800_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth, "time", clock)
+    return clock
+
+
+def make_token(key: str = SECRET, algorithm: str = "HS256", kid=None, expires_in: float = 60, **claims) -> str:
+    payload = {**CLAIMS, "exp": int(time.time() + expires_in), **claims}
+    return jwt.encode(payload, key, algorithm=algorithm, headers={"kid": kid} if kid else None)
+
+
+def verifier(audience=None, key_store=None) -> TokenVerifier:
+    return TokenVerifier(key_store or KeyStore(SECRET, "HS256", None, 300), TokenCache(100, 300), audience)
+
+
+def oct_key(kid: str, secret: str) -> dict:
+    encoded = base64.urlsafe_b64encode(secret.encode()).decode().rstrip("=")
+    return {"kty": "oct", "kid": kid, "alg": "HS256", "k": encoded}
+
+
+class JWKSServer:
+    # JWKS auth-service: набор ключей меняется между запросами
+    def __init__(self, *keys):
+        self.keys = list(keys)
+        self.requests = 0
+        self.status_code = 200
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        return httpx.Response(self.status_code, json={"keys": self.keys})
+
+    def key_store(self) -> KeyStore:
+        return KeyStore("", "HS256", JWKS_URL, ttl=300, transport=httpx.MockTransport(self))
+
+
+def verify(token_verifier: TokenVerifier, token: str):
+    return run(token_verifier.verify(token))
+
+
+def test_valid_token_is_verified_once():
+    token_verifier = verifier()
+    token = make_token()
+
+    data = verify(token_verifier, token)
+
+    assert (data.user_id, data.username, data.is_superuser) == (7, "ivan", False)
+    assert verify(token_verifier, token) is data
+
+
+@pytest.mark.parametrize("token", [
+    make_token(key="another-secret-key-0123456789abcdef"),
+    make_token() + "x",
+    "not-a-token",
+    jwt.encode({**CLAIMS, "exp": int(time.time()) + 60}, None, algorithm="none"),
+    jwt.encode({**CLAIMS, "exp": int(time.time()) + 60}, SECRET, algorithm="HS512"),
+])
+def test_bad_signature_or_algorithm_is_rejected(token):
+    with pytest.raises(AuthError, match="Недействительный токен"):
+        verify(verifier(), token)
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(AuthError, match="Срок действия токена истек"):
+        verify(verifier(), make_token(expires_in=-10))
+
+
+def test_token_without_exp_is_rejected():
+    token = jwt.encode(CLAIMS, SECRET, algorithm="HS256")
+
+    with pytest.raises(AuthError, match="Недействительный токен"):
+        verify(verifier(), token)
+
+
+def test_cached_token_expires_with_exp(clock):
+    token_verifier = verifier()
+    expires_at = int(time.time()) + 30
+    token = make_token(exp=expires_at)
+    clock.now = time.time()
+    verify(token_verifier, token)
+
+    # Кэш не продлевает токен дальше exp
+    clock.now = expires_at - 1
+    assert token_verifier.cache.get(token, token_verifier.key_store.version) is not None
+    clock.now = expires_at + 1
+    assert token_verifier.cache.get(token, token_verifier.key_store.version) is None
+
+
+def test_audience_is_checked():
+    token_verifier = verifier(audience="website")
+
+    assert verify(token_verifier, make_token(aud="website")).user_id == 7
+    assert verify(token_verifier, make_token(aud=["admin", "website"])).user_id == 7
+    for token in (make_token(aud="admin"), make_token()):
+        with pytest.raises(AuthError):
+            verify(token_verifier, token)
+
+
+def test_token_for_audience_is_rejected_without_configured_audience():
+    with pytest.raises(AuthError):
+        verify(verifier(), make_token(aud="admin"))
+
+
+def test_unknown_kid_loads_jwks(clock):
+    server = JWKSServer(oct_key("k1", "first-secret-0123456789abcdef"))
+    token_verifier = verifier(key_store=server.key_store())
+
+    data = verify(token_verifier, make_token(key="first-secret-0123456789abcdef", kid="k1"))
+
+    assert data.user_id == 7
+    assert server.requests == 1
+
+
+def test_rotated_key_is_picked_up_and_removed_key_revoked(clock):
+    server = JWKSServer(oct_key("k1", "first-secret-0123456789abcdef"))
+    key_store = server.key_store()
+    token_verifier = verifier(key_store=key_store)
+    old_token = make_token(key="first-secret-0123456789abcdef", kid="k1")
+    verify(token_verifier, old_token)
+
+    server.keys = [oct_key("k2", "second-secret-0123456789abcdef")]
+    clock.now += 2
+    new_token = make_token(key="second-secret-0123456789abcdef", kid="k2")
+
+    assert verify(token_verifier, new_token).user_id == 7
+    assert server.requests == 2
+    # Ключи сменились: токен из кэша проверяется заново, а его ключа больше нет
+    with pytest.raises(AuthError, match="Неизвестный ключ"):
+        verify(token_verifier, old_token)
+
+
+def test_unknown_kid_refresh_is_throttled(clock):
+    server = JWKSServer(oct_key("k1", "first-secret-0123456789abcdef"))
+    token_verifier = verifier(key_store=server.key_store())
+    verify(token_verifier, make_token(key="first-secret-0123456789abcdef", kid="k1"))
+
+    for kid in ("forged-1", "forged-2", "forged-3"):
+        with pytest.raises(AuthError):
+            verify(token_verifier, make_token(kid=kid))
+
+    assert server.requests == 1
+
+
+def test_stale_jwks_is_refreshed_in_background(clock):
+    server = JWKSServer(oct_key("k1", "first-secret-0123456789abcdef"))
+    key_store = server.key_store()
+    token = make_token(key="first-secret-0123456789abcdef", kid="k1")
+
+    async def scenario():
+        assert await key_store.get("k1")
+        clock.now += key_store.ttl + 1
+        server.status_code = 503
+        # Запрос не ждет загрузки: проверка по текущим ключам
+        key = await key_store.get("k1")
+        refreshing = key_store._refreshing
+        await refreshing
+        return key, refreshing
+
+    key, refreshing = run(scenario())
+
+    assert key == b"first-secret-0123456789abcdef"
+    assert refreshing is not None
+    assert server.requests == 2
+    # Ошибка загрузки оставляет прежние ключи
+    assert verify(verifier(key_store=key_store), token).user_id == 7
+
+
+def make_app(token_verifier: TokenVerifier) -> AuthMiddleware:
+    async def whoami(request):
+        user = request.state.user
+        return JSONResponse({"user_id": user.user_id if user else None})
+
+    app = Starlette(routes=[Route("/", whoami), Route("/posts/", whoami), Route("/auth/login", whoami)])
+    return AuthMiddleware(app, token_verifier, PathAllowlist(["/"], ["/auth"]))
+
+
+def get(app, path: str, **options) -> httpx.Response:
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as client:
+            return await client.get(path, **options)
+
+    return run(send())
+
+
+def test_middleware_requires_token_on_private_paths():
+    app = make_app(verifier())
+    token = make_token()
+
+    missing = get(app, "/posts/")
+    invalid = get(app, "/posts/", headers={"authorization": "Bearer broken"})
+    bearer = get(app, "/posts/", headers={"authorization": f"Bearer {token}"})
+    cookie = get(app, "/posts/", headers={"cookie": f"theme=dark; access_token={token}"})
+
+    assert missing.status_code == 401
+    assert missing.headers["www-authenticate"] == "Bearer"
+    assert invalid.status_code == 401
+    assert bearer.json() == {"user_id": 7}
+    assert cookie.json() == {"user_id": 7}
+
+
+def test_middleware_public_paths():
+    app = make_app(verifier())
+
+    assert get(app, "/").json() == {"user_id": None}
+    assert get(app, "/", headers={"authorization": "Bearer broken"}).json() == {"user_id": None}
+    assert get(app, "/", headers={"authorization": f"Bearer {make_token()}"}).json() == {"user_id": 7}
+    assert get(app, "/auth/login").status_code == 200
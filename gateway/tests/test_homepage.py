@@ -0,0 +1,224 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+
+from app import homepage, proxy
+from app.homepage import HomepageRenderer
+from app.routes import main
+from conftest import GATEWAY_DIR, reply, run
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(homepage, "time", clock)
+    return clock
+
+
+def post(post_id: int, name: str, updated: str = "2026-10-01T12:00:00", thumbnail_url=None) -> dict:
+    return {
+        "id": post_id,
+        "name": name,
+        "created": "2026-10-01T12:00:00",
+        "updated": updated,
+        "preview_text": "Текст поста",
+        "thumbnail_url": thumbnail_url,
+    }
+
+
+class PostService:
+    # post-service для главной: отдает текущий список постов, считает запросы
+    def __init__(self):
+        self.posts = [post(1, "Первый пост")]
+        self.status_code = 200
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.status_code != 200:
+            return reply(self.status_code)
+        return reply(200, json={"items": self.posts, "total": len(self.posts), "page": 1, "total_pages": 1})
+
+
+@pytest.fixture
+def site(proxy_app, monkeypatch):
+    # Главная страница шлюза с post-service-заглушкой: create(**renderer_options)
+    def create(**options):
+        service = PostService()
+        proxy_app(service)
+        monkeypatch.setattr(homepage, "upstreams", proxy.upstreams)
+        renderer = HomepageRenderer(Jinja2Templates(directory=str(GATEWAY_DIR / "app" / "templates")), **options)
+        monkeypatch.setattr(main, "homepage_renderer", renderer)
+
+        app = FastAPI()
+        app.mount("/static", StaticFiles(directory=str(GATEWAY_DIR / "app" / "static")), name="static")
+        app.include_router(main.router)
+        return app, renderer, service
+
+    return create
+
+
+def client(app, user=None) -> httpx.AsyncClient:
+    async def with_user(scope, receive, send):
+        # Пользователь, как его оставляет AuthMiddleware
+        scope.setdefault("state", {})["user"] = user
+        await app(scope, receive, send)
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=with_user), base_url="http://site.example")
+
+
+def test_page_is_cached_per_url(site, clock):
+    app, _, service = site(cache_ttl=10.0, stale_ttl=0.0)
+
+    async def scenario():
+        async with client(app) as http:
+            first = await http.get("/")
+            cached = await http.get("/")
+            service.posts = [post(2, "Второй пост")]
+            other_page = await http.get("/", params={"page": 2})
+            search = await http.get("/", params={"q": "кот"})
+            return first, cached, other_page, search
+
+    first, cached, other_page, search = run(scenario())
+
+    assert first.status_code == 200
+    assert "Первый пост" in first.text
+    assert cached.text == first.text
+    assert "Второй пост" in other_page.text
+    assert "Второй пост" in search.text
+    assert len(service.requests) == 3
+    assert service.requests[2].url.params["search"] == "кот"
+
+
+def test_expired_page_is_rendered_again(site, clock):
+    app, _, service = site(cache_ttl=10.0, stale_ttl=5.0)
+
+    async def scenario():
+        async with client(app) as http:
+            await http.get("/")
+            service.posts = [post(1, "Новое название", updated="2026-10-02T08:00:00")]
+            clock.now += 15.0
+            return await http.get("/")
+
+    response = run(scenario())
+
+    assert "Новое название" in response.text
+    assert "Первый пост" not in response.text
+    assert len(service.requests) == 2
+
+
+def test_stale_page_is_served_while_refreshing(site, clock):
+    app, renderer, service = site(cache_ttl=10.0, stale_ttl=60.0)
+
+    async def scenario():
+        async with client(app) as http:
+            await http.get("/")
+            service.posts = [post(1, "Новое название", updated="2026-10-02T08:00:00")]
+            clock.now += 11.0
+            stale = await asyncio.gather(http.get("/"), http.get("/"))
+            # Обновление одно на ключ, даже если устаревшую копию запросили дважды
+            refreshing = list(renderer._refreshing.values())
+            await asyncio.gather(*refreshing)
+            fresh = await http.get("/")
+            return stale, len(refreshing), fresh
+
+    stale, refreshes, fresh = run(scenario())
+
+    assert all("Первый пост" in response.text for response in stale)
+    assert refreshes == 1
+    assert "Новое название" in fresh.text
+    assert len(service.requests) == 2
+    assert not renderer._refreshing
+
+
+def test_failed_refresh_keeps_stale_page(site, clock):
+    app, renderer, service = site(cache_ttl=10.0, stale_ttl=60.0)
+
+    async def scenario():
+        async with client(app) as http:
+            await http.get("/")
+            service.status_code = 500
+            clock.now += 11.0
+            await http.get("/")
+            await asyncio.gather(*renderer._refreshing.values())
+            return await http.get("/")
+
+    response = run(scenario())
+
+    # Страница без постов не заменяет в кэше страницу с постами
+    assert "Первый пост" in response.text
+
+
+def test_load_error_is_not_cached(site, clock):
+    app, _, service = site(cache_ttl=10.0, stale_ttl=60.0)
+    service.status_code = 503
+
+    async def scenario():
+        async with client(app) as http:
+            failed = await http.get("/")
+            service.status_code = 200
+            return failed, await http.get("/")
+
+    failed, recovered = run(scenario())
+
+    assert "Не удалось загрузить посты" in failed.text
+    assert "Первый пост" in recovered.text
+
+
+def test_page_for_user_is_not_cached(site, clock):
+    app, renderer, service = site(cache_ttl=10.0, stale_ttl=60.0)
+
+    async def scenario():
+        async with client(app, user={"id": 7}) as http:
+            await http.get("/")
+            await http.get("/")
+
+    run(scenario())
+
+    assert len(service.requests) == 2
+    assert renderer.pages.get(("http://site.example/", 1, "")) is None
+
+
+def test_post_card_is_rendered_once_per_version(site, clock, monkeypatch):
+    app, renderer, service = site(cache_ttl=0.0, stale_ttl=0.0)
+    rendered = []
+    get_template = renderer.templates.get_template
+
+    def counting_get_template(name):
+        if name == "includes/post_card.html":
+            rendered.append(name)
+        return get_template(name)
+
+    monkeypatch.setattr(renderer.templates, "get_template", counting_get_template)
+    service.posts = [post(1, "Первый пост"), post(2, "Второй пост")]
+
+    async def scenario():
+        async with client(app) as http:
+            responses = [await http.get("/")]
+            responses.append(await http.get("/"))
+            # Изменен пост 1, у поста 2 готова миниатюра
+            service.posts = [
+                post(1, "Первый пост, правка", updated="2026-10-02T08:00:00"),
+                post(2, "Второй пост", thumbnail_url="/media/objects/ab/thumb.webp"),
+            ]
+            responses.append(await http.get("/"))
+            return responses
+
+    first, second, updated = run(scenario())
+
+    assert len(rendered) == 4
+    assert second.text == first.text
+    assert "Первый пост, правка" in updated.text
+    assert "/media/objects/ab/thumb.webp" in updated.text
@@ -0,0 +1,171 @@
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.ipfilter import IPBlocklist, IPRangeSet, client_address, parse_address, read_entries
+from app.middleware.ip_blocklist import IPBlocklistMiddleware
+from conftest import run
+
+TRUSTED = IPRangeSet(["10.0.0.0/8", "fd00::/8"])
+
+
+def scope(client, *forwarded):
+    return {
+        "type": "http",
+        "client": client,
+        "headers": [(b"x-forwarded-for", value.encode()) for value in forwarded],
+    }
+
+
+def test_overlapping_and_adjacent_networks_are_merged():
+    ranges = IPRangeSet([
+        "10.0.0.0/25",
+        "10.0.0.128/25",
+        "10.0.0.7",
+        "10.0.1.0/24",
+        "192.168.0.0/16",
+        "192.168.10.0/24",
+        "2001:db8::/32",
+        "2001:db8:1::/48",
+    ])
+
+    assert len(ranges) == 3
+    assert "10.0.1.255" in ranges
+    assert "10.0.2.0" not in ranges
+    assert "9.255.255.255" not in ranges
+    assert "2001:db8:ffff::1" in ranges
+    assert "2001:db9::" not in ranges
+
+
+def test_address_forms():
+    ranges = IPRangeSet(["10.0.0.1", "2001:db8::/64", "not-an-ip", "300.1.1.1/8"])
+
+    assert len(ranges) == 2
+    assert "10.0.0.1" in ranges
+    assert "::ffff:10.0.0.1" in ranges
+    assert " 10.0.0.1 " in ranges
+    assert "10.0.0.2" not in ranges
+    assert "2001:DB8::abcd" in ranges
+    assert "garbage" not in ranges
+    assert parse_address("::ffff:10.0.0.1") == parse_address("10.0.0.1")
+
+
+def test_empty_set_contains_nothing():
+    assert len(IPRangeSet()) == 0
+    assert "127.0.0.1" not in IPRangeSet()
+
+
+def test_read_entries_skips_comments_and_blank_lines(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# спам-сети\n203.0.113.0/24  # подсеть\n\n   \n198.51.100.7\n", encoding="utf-8")
+
+    assert read_entries(str(path)) == ["203.0.113.0/24", "198.51.100.7"]
+
+
+@pytest.mark.parametrize("client, forwarded, expected", [
+    # Недоверенный клиент: X-Forwarded-For не учитывается
+    (("198.51.100.1", 1), ["203.0.113.9"], "198.51.100.1"),
+    # Доверенный прокси: справа налево до первого недоверенного адреса
+    (("10.0.0.2", 1), ["203.0.113.9, 10.1.1.1"], "203.0.113.9"),
+    (("10.0.0.2", 1), ["1.1.1.1, 203.0.113.9, 10.1.1.1"], "203.0.113.9"),
+    # Несколько заголовков - одна цепочка
+    (("10.0.0.2", 1), ["1.1.1.1", "203.0.113.9"], "203.0.113.9"),
+    # Вся цепочка из доверенных адресов - самый левый
+    (("10.0.0.2", 1), ["10.3.3.3, 10.1.1.1"], "10.3.3.3"),
+    # Мусор в цепочке останавливает разбор
+    (("10.0.0.2", 1), ["203.0.113.9, unknown, 10.1.1.1"], "10.1.1.1"),
+    (("10.0.0.2", 1), [], "10.0.0.2"),
+    (("fd00::2", 1), ["2001:db8::9"], "2001:db8::9"),
+])
+def test_client_address_with_trusted_proxies(client, forwarded, expected):
+    assert client_address(scope(client, *forwarded), TRUSTED) == expected
+
+
+def test_client_address_without_client():
+    assert client_address(scope(None, "203.0.113.9"), TRUSTED) is None
+
+
+def test_blocklist_file_is_reloaded_on_change(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("203.0.113.0/24\n", encoding="utf-8")
+    blocklist = IPBlocklist(["198.51.100.7"], str(path), reload_interval=0)
+
+    async def scenario():
+        await blocklist.reload()
+        before = ("203.0.113.5" in blocklist, "192.0.2.1" in blocklist)
+        if blocklist._reloading is not None:
+            await blocklist._reloading
+
+        # Новый файл через rename с тем же mtime: изменение замечено по inode и размеру
+        stat = os.stat(path)
+        replacement = tmp_path / "blocklist.new"
+        replacement.write_text("192.0.2.0/24\n192.0.2.0/28\n", encoding="utf-8")
+        os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(replacement, path)
+
+        # Проверка до окончания фоновой загрузки - по старому списку
+        during = "192.0.2.1" in blocklist
+        await blocklist._reloading
+        after = ("203.0.113.5" in blocklist, "192.0.2.1" in blocklist, "198.51.100.7" in blocklist)
+
+        os.remove(path)
+        "198.51.100.7" in blocklist
+        await blocklist._reloading
+        removed = ("192.0.2.1" in blocklist, "198.51.100.7" in blocklist)
+        return before, during, after, removed
+
+    before, during, after, removed = run(scenario())
+
+    assert before == (True, False)
+    assert during is False
+    assert after == (False, True, True)
+    assert removed == (False, True)
+
+
+def test_blocklist_checks_file_at_most_once_per_interval(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("203.0.113.0/24\n", encoding="utf-8")
+    blocklist = IPBlocklist([], str(path), reload_interval=3600)
+
+    async def scenario():
+        "192.0.2.1" in blocklist
+        await blocklist._reloading
+        path.write_text("192.0.2.0/24\n", encoding="utf-8")
+        return "192.0.2.1" in blocklist, blocklist._reloading
+
+    blocked, reloading = run(scenario())
+
+    assert blocked is False
+    assert reloading is None
+
+
+def test_middleware_rejects_blocked_clients():
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    app = IPBlocklistMiddleware(
+        Starlette(routes=[Route("/", ok)]),
+        IPBlocklist(["203.0.113.0/24"]),
+        TRUSTED,
+    )
+
+    def get(client, **headers):
+        async def send():
+            transport = httpx.ASGITransport(app=app, client=client)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gw") as http:
+                return await http.get("/", headers=headers)
+
+        return run(send())
+
+    blocked = get(("203.0.113.5", 1))
+
+    assert blocked.status_code == 403
+    assert blocked.json() == {"detail": "Доступ запрещен"}
+    assert get(("198.51.100.1", 1)).status_code == 200
+    assert get(("10.0.0.2", 1), **{"x-forwarded-for": "203.0.113.5"}).status_code == 403
+    # Подделка X-Forwarded-For от недоверенного клиента не помогает обойти блокировку
+    assert get(("203.0.113.5", 1), **{"x-forwarded-for": "198.51.100.1"}).status_code == 403
@@ -0,0 +1,81 @@
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.config import Settings
+from app.media import MediaFileCache, MediaResponse
+from conftest import run
+
+FILES = {
+    "css/site.css": b"body {}",
+    "blobs/objects/ab/" + "ab" * 32 + "/original.jpg": b"jpeg",
+    "blobs/refs/ab/" + "ab" * 32 + "/profile-7": b"",
+    "blobs/trash/1700000000-run/ab/" + "ab" * 32 + "/original.jpg": b"jpeg",
+    ".tmp/upload": b"partial",
+}
+
+
+@pytest.fixture
+def media_root(tmp_path):
+    for key, content in FILES.items():
+        path = tmp_path / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    return str(tmp_path)
+
+
+def get(cache: MediaFileCache, path: str, headers=None) -> httpx.Response:
+    async def media(request: Request) -> Response:
+        media_file = await cache.acquire(request.path_params["path"])
+        if media_file is None:
+            return Response(status_code=404)
+        return MediaResponse(media_file, cache, request.method, request.headers, 3600)
+
+    app = Starlette(routes=[Route("/media/{path:path}", media)])
+
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as client:
+            return await client.get(f"/media/{path}", headers=headers)
+
+    return run(request())
+
+
+def test_default_media_root_is_not_gateway_static():
+    default = Settings.model_fields["MEDIA_ROOT"].default
+
+    assert os.path.isabs(default)
+    assert os.path.basename(default) != "static"
+
+
+def test_private_prefixes_are_not_served(media_root):
+    cache = MediaFileCache(media_root, private_prefixes=Settings.model_fields["MEDIA_PRIVATE_PREFIXES"].default)
+
+    assert get(cache, "css/site.css").content == b"body {}"
+    assert get(cache, "blobs/objects/ab/" + "ab" * 32 + "/original.jpg").status_code == 200
+    for key in (
+        "blobs/refs/ab/" + "ab" * 32 + "/profile-7",
+        "blobs/trash/1700000000-run/ab/" + "ab" * 32 + "/original.jpg",
+        "blobs/refs",
+        ".tmp/upload",
+        "css/../blobs/refs/ab/" + "ab" * 32 + "/profile-7",
+    ):
+        assert get(cache, key).status_code == 404, key
+
+
+def test_content_addressed_files_are_immutable(media_root):
+    cache = MediaFileCache(media_root)
+    key = "blobs/objects/ab/" + "ab" * 32 + "/original.jpg"
+
+    response = get(cache, key)
+    revalidated = get(cache, key, {"if-none-match": response.headers["etag"]})
+    ranged = get(cache, "css/site.css", {"range": "bytes=0-3"})
+
+    assert response.headers["etag"] == f'"{"ab" * 32}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert revalidated.status_code == 304
+    assert (ranged.status_code, ranged.content) == (206, b"body")
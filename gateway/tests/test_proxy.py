@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import proxy
+from app.ipfilter import IPRangeSet
+from app.proxy import filter_headers
+from conftest import reply, run
+
+CLIENT = ("203.0.113.7", 40000)
+
+
+def request(app, method: str, path: str, **options) -> httpx.Response:
+    async def send():
+        transport = httpx.ASGITransport(app=app, client=CLIENT)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gw.example") as client:
+            return await client.request(method, path, **options)
+
+    return run(send())
+
+
+def asgi_messages(app, path: str, state=None):
+    # Сообщения ответа как их видит ASGI-сервер
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"gw.example")],
+        "client": CLIENT,
+        "server": ("gw.example", 80),
+        "state": state or {},
+    }
+    run(app(scope, receive, send))
+    return messages
+
+
+def test_filter_headers_drops_hop_by_hop_and_connection_tokens():
+    headers = [
+        (b"connection", b"keep-alive, X-Trace"),
+        (b"keep-alive", b"timeout=5"),
+        (b"x-trace", b"1"),
+        (b"transfer-encoding", b"chunked"),
+        (b"set-cookie", b"a=1"),
+        (b"set-cookie", b"b=2"),
+        (b"content-type", b"text/plain"),
+    ]
+
+    assert filter_headers(headers) == [
+        (b"set-cookie", b"a=1"),
+        (b"set-cookie", b"b=2"),
+        (b"content-type", b"text/plain"),
+    ]
+    assert filter_headers(headers, drop=frozenset({b"content-type"}))[-1] == (b"set-cookie", b"b=2")
+
+
+def test_request_headers_and_path_are_forwarded(proxy_app):
+    seen = []
+
+    def handler(upstream_request: httpx.Request):
+        seen.append(upstream_request)
+        return reply(200, json={"ok": True})
+
+    app, _ = proxy_app(handler)
+    response = request(app, "GET", "/posts/a%2Fb?q=%D0%BA%D0%BE%D1%82&page=2", headers={
+        "authorization": "Bearer token",
+        "connection": "x-hop",
+        "x-hop": "1",
+        "te": "trailers",
+        "x-forwarded-for": "198.51.100.1",
+        "x-forwarded-host": "evil.example",
+    })
+
+    assert response.status_code == 200
+    upstream_request = seen[0]
+    assert str(upstream_request.url) == "http://post:8000/posts/a%2Fb?q=%D0%BA%D0%BE%D1%82&page=2"
+    headers = upstream_request.headers
+    assert headers["authorization"] == "Bearer token"
+    assert headers["host"] == "post:8000"
+    assert "x-hop" not in headers and "te" not in headers
+    # Цепочка от недоверенного клиента отбрасывается
+    assert headers["x-forwarded-for"] == CLIENT[0]
+    assert headers["x-forwarded-host"] == "gw.example"
+    assert headers["x-forwarded-proto"] == "http"
+
+
+def test_client_defaults_are_not_added(proxy_app):
+    seen = []
+
+    def handler(upstream_request: httpx.Request):
+        seen.append(upstream_request.headers)
+        return reply(200, json={})
+
+    app, _ = proxy_app(handler)
+    asgi_messages(app, "/posts/")
+
+    # Без Accept-Encoding от клиента сервис не должен сжимать ответ
+    assert "accept-encoding" not in seen[0]
+    assert "user-agent" not in seen[0]
+
+
+def test_forwarded_for_chain_from_trusted_proxy(proxy_app, monkeypatch):
+    seen = []
+
+    def handler(upstream_request: httpx.Request):
+        seen.append(upstream_request.headers["x-forwarded-for"])
+        return reply(204)
+
+    monkeypatch.setattr(proxy, "trusted_proxies", IPRangeSet(["203.0.113.0/24"]))
+    app, _ = proxy_app(handler)
+    request(app, "GET", "/posts/", headers={"x-forwarded-for": "198.51.100.1"})
+
+    assert seen == [f"198.51.100.1, {CLIENT[0]}"]
+
+
+def test_response_headers_keep_repeated_values(proxy_app):
+    def handler(upstream_request: httpx.Request):
+        return reply(201, headers=[
+            ("set-cookie", "a=1"),
+            ("set-cookie", "b=2"),
+            ("connection", "close"),
+            ("x-request-id", "abc"),
+        ], json={"id": 1})
+
+    app, upstream = proxy_app(handler)
+    response = request(app, "POST", "/posts/", json={"name": "Пост"})
+
+    assert response.status_code == 201
+    assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+    assert response.headers["x-request-id"] == "abc"
+    assert "connection" not in response.headers
+    assert upstream.guard.bulkhead.in_flight == 0
+
+
+def test_upstream_cookies_are_not_shared_between_clients(proxy_app):
+    cookies = []
+
+    def handler(upstream_request: httpx.Request):
+        cookies.append(upstream_request.headers.get("cookie"))
+        return reply(200, headers={"set-cookie": "refresh=secret; Path=/"}, json={})
+
+    app, _ = proxy_app(handler)
+    request(app, "POST", "/posts/", content=b"{}")
+    request(app, "GET", "/posts/")
+
+    assert cookies == [None, None]
+
+
+def test_small_response_is_sent_in_one_message(proxy_app):
+    app, upstream = proxy_app(lambda upstream_request: reply(200, json={"items": []}))
+
+    messages = asgi_messages(app, "/posts/")
+
+    assert [message["type"] for message in messages] == ["http.response.start", "http.response.body"]
+    assert messages[1]["body"] == b'{"items":[]}'
+    assert upstream.guard.bulkhead.in_flight == 0
+
+
+def test_large_or_chunked_response_is_streamed(proxy_app):
+    chunks = [b"x" * 1024, b"y" * 1024, b"z" * 1024]
+
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    app, upstream = proxy_app(lambda upstream_request: httpx.Response(200, content=body()))
+
+    messages = asgi_messages(app, "/posts/export")
+
+    sent = [message["body"] for message in messages if message["type"] == "http.response.body"]
+    assert b"".join(sent) == b"".join(chunks)
+    assert len([chunk for chunk in sent if chunk]) == len(chunks)
+    assert upstream.guard.bulkhead.in_flight == 0
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (httpx.ConnectError("connection refused"), 502),
+    (httpx.ReadTimeout("timed out"), 504),
+])
+def test_upstream_failure_maps_to_gateway_error(proxy_app, error, status_code):
+    def handler(upstream_request: httpx.Request):
+        raise error
+
+    app, upstream = proxy_app(handler)
+    response = request(app, "GET", "/posts/")
+
+    assert response.status_code == status_code
+    assert "post" in response.json()["detail"]
+    assert upstream.guard.bulkhead.in_flight == 0
+
+
+def test_timeouts_do_not_outlive_request_deadline(proxy_app):
+    timeouts = []
+
+    def handler(upstream_request: httpx.Request):
+        timeouts.append(upstream_request.extensions["timeout"])
+        return reply(200, json={})
+
+    app, _ = proxy_app(handler)
+    asgi_messages(app, "/posts/", state={"deadline": time.monotonic() + 0.5})
+
+    assert set(timeouts[0]) == {"connect", "read", "write", "pool"}
+    assert all(0 < value <= 0.5 for value in timeouts[0].values())
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import uuid
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app import ratelimit
+from app.middleware import rate_limit
+from app.ratelimit import MemoryRateLimitStore, Rate, RateLimitResult, RedisRateLimitStore, parse_rate
+from conftest import run
+
+# Скрипт GCRA проверяется на настоящем Redis: его адрес задается в TEST_REDIS_URL
+REDIS_URL = os.environ.get("TEST_REDIS_URL")
+redis_only = pytest.mark.skipif(not REDIS_URL, reason="Нужен Redis (TEST_REDIS_URL)")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("60/minute", Rate(60, 60)),
+    ("1000 / hour", Rate(1000, 3600)),
+    ("10/5 minutes", Rate(10, 300)),
+    ("2/Seconds", Rate(2, 1)),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0/minute", "60", "60/week", "minute/60", ""])
+def test_parse_rate_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_rate(value)
+
+
+def hits(store, key: str, rate: Rate, count: int):
+    async def scenario():
+        return [await store.hit(key, rate) for _ in range(count)]
+
+    return run(scenario())
+
+
+def test_gcra_allows_burst_then_spaces_requests(clock):
+    store = MemoryRateLimitStore()
+    rate = Rate(5, 10)
+
+    results = hits(store, "a", rate, 6)
+
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert results[-1].retry_after == pytest.approx(2.0)
+
+    clock.now += 1.9
+    assert not hits(store, "a", rate, 1)[0].allowed
+    clock.now += 0.1
+    assert [result.allowed for result in hits(store, "a", rate, 2)] == [True, False]
+
+
+def test_gcra_rejected_requests_do_not_consume_quota(clock):
+    store = MemoryRateLimitStore()
+    rate = Rate(1, 10)
+    hits(store, "a", rate, 1)
+
+    for _ in range(100):
+        hits(store, "a", rate, 1)
+        clock.now += 0.05
+
+    assert hits(store, "a", rate, 1)[0].retry_after == pytest.approx(5.0)
+
+
+def test_gcra_keys_are_independent_and_quota_recovers(clock):
+    store = MemoryRateLimitStore()
+    rate = Rate(2, 1)
+    hits(store, "a", rate, 2)
+
+    assert hits(store, "b", rate, 1)[0].allowed
+    assert not hits(store, "a", rate, 1)[0].allowed
+
+    clock.now += 10
+    assert [result.allowed for result in hits(store, "a", rate, 3)] == [True, True, False]
+
+
+def test_expired_keys_are_swept_one_shard_at_a_time(clock):
+    store = MemoryRateLimitStore(shards=4, sweep_interval=4.0)
+    rate = Rate(10, 1)
+    for i in range(100):
+        hits(store, f"client-{i}", rate, 1)
+    assert len(store) == 100
+
+    sizes = []
+    for _ in range(4):
+        clock.now += 1
+        hits(store, "probe", rate, 1)
+        sizes.append(len(store))
+
+    # Каждый шаг очищает один шард; после полного круга остаются только свежие ключи
+    assert sizes == sorted(sizes, reverse=True)
+    assert sizes[0] > sizes[-1]
+    assert len(store) <= 4
+
+
+def test_redis_store_passes_rate_and_parses_result():
+    store = RedisRateLimitStore.__new__(RedisRateLimitStore)
+    store.prefix = "ratelimit:"
+    calls = []
+
+    async def script(keys, args):
+        calls.append((keys, args))
+        return [0, "1.25"] if len(calls) > 1 else [1, "0"]
+
+    store._script = script
+
+    first = run(store.hit("auth:203.0.113.7", Rate(10, 60)))
+    second = run(store.hit("auth:203.0.113.7", Rate(10, 60)))
+
+    assert calls[0] == (["ratelimit:auth:203.0.113.7"], [6.0, 60])
+    assert first == RateLimitResult(True, 0.0)
+    assert second == RateLimitResult(False, 1.25)
+
+
+@redis_only
+def test_redis_gcra_script():
+    store = RedisRateLimitStore(REDIS_URL, prefix=f"test-{uuid.uuid4().hex}:")
+    rate = Rate(3, 60)
+
+    async def scenario():
+        # Одновременные запросы: скрипт атомарен, лимит не превышается
+        results = await asyncio.gather(*(store.hit("client", rate) for _ in range(10)))
+        ttl = await store._client.pttl(store.prefix + "client")
+        other = await store.hit("other", rate)
+        await store._client.delete(store.prefix + "client", store.prefix + "other")
+        await store._client.aclose()
+        return results, ttl, other
+
+    results, ttl, other = run(scenario())
+
+    assert sum(result.allowed for result in results) == 3
+    assert all(0 < result.retry_after <= 20 for result in results if not result.allowed)
+    # Запись живет, пока TAT в будущем: не дольше периода
+    assert 0 < ttl <= 60_000
+    assert other.allowed
+
+
+class FailingStore:
+    async def hit(self, key, rate):
+        raise ConnectionError("redis down")
+
+
+def make_app(store, monkeypatch, trusted=None):
+    if trusted is not None:
+        monkeypatch.setattr(rate_limit, "trusted_proxies", trusted)
+
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[
+        Route("/auth/login", ok),
+        Route("/posts/", ok),
+        Route("/health", ok),
+        Route("/", ok),
+    ])
+    rates = {"auth": Rate(1, 60), "posts": Rate(3, 60)}
+    return rate_limit.RateLimitMiddleware(app, store, rates=rates, exempt=["health"])
+
+
+def statuses(app, path: str, count: int, client=("203.0.113.7", 40000), headers=None):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app, client=client)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gw") as http:
+            return [await http.get(path, headers=headers) for _ in range(count)]
+
+    return run(scenario())
+
+
+def test_middleware_limits_per_group(monkeypatch):
+    app = make_app(MemoryRateLimitStore(), monkeypatch)
+
+    auth = statuses(app, "/auth/login", 2)
+    posts = statuses(app, "/posts/", 4)
+    health = statuses(app, "/health", 100)
+
+    assert [response.status_code for response in auth] == [200, 429]
+    assert auth[1].headers["retry-after"] == "60"
+    assert auth[1].json() == {"detail": "Слишком много запросов"}
+    assert [response.status_code for response in posts] == [200, 200, 200, 429]
+    assert all(response.status_code == 200 for response in health)
+
+
+def test_middleware_keys_by_forwarded_client_from_trusted_proxy(monkeypatch):
+    from app.ipfilter import IPRangeSet
+
+    app = make_app(MemoryRateLimitStore(), monkeypatch, trusted=IPRangeSet(["10.0.0.0/8"]))
+    proxy = ("10.0.0.2", 40000)
+
+    first = statuses(app, "/auth/login", 2, client=proxy, headers={"x-forwarded-for": "198.51.100.1"})
+    second = statuses(app, "/auth/login", 1, client=proxy, headers={"x-forwarded-for": "198.51.100.2"})
+
+    assert [response.status_code for response in first] == [200, 429]
+    assert second[0].status_code == 200
+
+
+def test_middleware_passes_requests_when_store_fails(monkeypatch):
+    app = make_app(FailingStore(), monkeypatch)
+
+    assert all(response.status_code == 200 for response in statuses(app, "/auth/login", 5))
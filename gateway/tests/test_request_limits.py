@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.middleware.request_limits import RequestLimitsMiddleware, RequestTooLarge, compile_route
+from conftest import reply, run
+
+
+def call(app, method: str, path: str, chunks=(), headers=(), stall: bool = False):
+    # Запрос напрямую через ASGI: тело частями, как от клиента с chunked,
+    # stall - клиент замолкает после переданных частей
+    messages = []
+    pending = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    if not stall:
+        pending.append({"type": "http.request", "body": b"", "more_body": False})
+    if chunks:
+        headers = [(b"transfer-encoding", b"chunked"), *headers]
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"gw.example"), *headers],
+        "client": ("203.0.113.7", 40000),
+        "server": ("gw.example", 80),
+    }
+    run(app(scope, receive, send))
+    return messages
+
+
+def status(messages) -> int:
+    return next(message["status"] for message in messages if message["type"] == "http.response.start")
+
+
+def header(messages, name: bytes) -> bytes:
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    return dict(start["headers"]).get(name)
+
+
+def test_content_length_over_limit_is_rejected_before_upstream(proxy_app):
+    calls = []
+    app, _ = proxy_app(lambda request: calls.append(request) or reply(200))
+    app.add_middleware(RequestLimitsMiddleware, max_size=100, routes={})
+
+    messages = call(app, "POST", "/posts/", headers=[(b"content-length", b"101")])
+
+    assert status(messages) == 413
+    assert header(messages, b"connection") == b"close"
+    assert calls == []
+
+
+def test_chunked_body_over_limit_is_cut_mid_stream(proxy_app):
+    received = []
+
+    def handler(request: httpx.Request):
+        received.append(request.read())
+        return reply(201)
+
+    app, upstream = proxy_app(handler)
+    app.add_middleware(RequestLimitsMiddleware, max_size=100, routes={})
+
+    messages = call(app, "POST", "/posts/", chunks=[b"x" * 60, b"x" * 60, b"x" * 60])
+
+    assert status(messages) == 413
+    assert received == []
+    # Слот bulkhead освобожден, сбой клиента не считается сбоем сервиса
+    assert upstream.guard.bulkhead.in_flight == 0
+    assert upstream.guard.breaker.failures == 0
+
+    messages = call(app, "POST", "/posts/", chunks=[b"x" * 60, b"x" * 40])
+
+    assert status(messages) == 201
+    assert received == [b"x" * 100]
+
+
+def test_route_limit_overrides_default(proxy_app):
+    app, _ = proxy_app(lambda request: reply(201))
+    app.add_middleware(RequestLimitsMiddleware, max_size=100, routes={"/posts/*/images": 1000})
+
+    assert status(call(app, "POST", "/posts/7/images", chunks=[b"x" * 500])) == 201
+    assert status(call(app, "POST", "/posts/7/images/", chunks=[b"x" * 500])) == 201
+    assert status(call(app, "POST", "/posts/7", chunks=[b"x" * 500])) == 413
+    assert status(call(app, "POST", "/posts/7/imagesx", chunks=[b"x" * 500])) == 413
+
+
+def test_compile_route_matches_one_segment_prefix():
+    pattern = compile_route("/posts/*/images")
+
+    assert pattern.match("/posts/1/images")
+    assert pattern.match("/posts/1/images/2")
+    assert not pattern.match("/posts/1/2/images")
+    assert not pattern.match("/posts//images")
+
+
+def test_stalled_body_gets_408(proxy_app, monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_TIMEOUT", 0.2)
+    app, upstream = proxy_app(lambda request: reply(201))
+    app.add_middleware(RequestLimitsMiddleware, max_size=100, routes={})
+
+    started = time.monotonic()
+    messages = call(app, "POST", "/posts/", chunks=[b"x" * 10], stall=True)
+
+    assert status(messages) == 408
+    assert header(messages, b"connection") == b"close"
+    assert time.monotonic() - started < 2
+    # Медленный клиент не открывает circuit breaker сервиса
+    assert upstream.guard.bulkhead.in_flight == 0
+    assert upstream.guard.breaker.failures == 0
+
+
+def test_deadline_is_propagated_to_upstream_timeouts(proxy_app, monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_TIMEOUT", 3)
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request.extensions["timeout"])
+        return reply(200, json={"items": []})
+
+    app, _ = proxy_app(handler)
+    app.add_middleware(RequestLimitsMiddleware)
+
+    assert status(call(app, "GET", "/posts/")) == 200
+
+    # Timeout(5.0, connect=1.0) сужен до оставшихся 3 секунд запроса
+    timeouts = seen[0]
+    assert 2 < timeouts["read"] <= 3
+    assert 2 < timeouts["write"] <= 3
+    assert 2 < timeouts["pool"] <= 3
+    assert timeouts["connect"] == 1.0
+
+
+def test_error_after_response_started_is_reraised():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        while True:
+            message = await receive()
+            if not message.get("more_body"):
+                break
+
+    limited = RequestLimitsMiddleware(app, max_size=10, routes={})
+
+    with pytest.raises(RequestTooLarge):
+        call(limited, "POST", "/echo", chunks=[b"x" * 20])
@@ -0,0 +1,278 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import resilience
+from app.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    Bulkhead,
+    CircuitBreaker,
+    RetryBudget,
+    UpstreamGuard,
+    UpstreamUnavailable,
+)
+from conftest import run
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def make_guard(budget=None, **options) -> UpstreamGuard:
+    return UpstreamGuard(
+        "post",
+        CircuitBreaker(failure_threshold=3, reset_timeout=10.0),
+        budget or RetryBudget(),
+        Bulkhead(2, 2, 1.0),
+        **{"backoff": 0, **options},
+    )
+
+
+def sender(*outcomes):
+    # send для UpstreamGuard.call: по очереди отдает ответы или бросает ошибки
+    calls = []
+
+    async def send():
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(outcome)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return httpx.Response(outcome)
+
+    return send, calls
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+
+    breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 4
+    assert breaker.retry_after() == pytest.approx(6.0)
+
+
+def test_breaker_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # Неудачная проба снова размыкает цепь на reset_timeout
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 9
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_lost_probe_does_not_block_forever(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+
+    # Результат пробы так и не пришел: через reset_timeout - новая проба
+    clock.now += 5
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
+
+
+def test_retry_budget_is_exhausted_and_refilled(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=1.0, max_tokens=2.0)
+
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    clock.now += 100
+    budget._refill()
+    assert budget.tokens == 2.0
+
+
+def test_retries_stop_when_budget_is_exhausted():
+    guard = make_guard(RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0), max_retries=5)
+    send, calls = sender(httpx.ConnectError("refused"))
+
+    with pytest.raises(httpx.ConnectError):
+        run(guard.call(send, idempotent=True, deadline=time.monotonic() + 5))
+
+    assert len(calls) == 2
+    assert guard.metrics.counters["retries"] == 1
+    assert guard.metrics.counters["failures"] == 2
+
+
+def test_failed_response_is_retried_and_success_closes_breaker():
+    guard = make_guard()
+    send, calls = sender(503, 200)
+
+    response = run(guard.call(send, idempotent=True, deadline=time.monotonic() + 5))
+
+    assert response.status_code == 200
+    assert calls == [503, 200]
+    assert guard.breaker.state == CLOSED and guard.breaker.failures == 0
+
+
+def test_non_idempotent_request_is_not_retried():
+    guard = make_guard()
+    send, calls = sender(503, 200)
+
+    response = run(guard.call(send, idempotent=False, deadline=time.monotonic() + 5))
+
+    assert response.status_code == 503
+    assert calls == [503]
+
+
+def test_open_breaker_stops_retries():
+    guard = make_guard(max_retries=10)
+    send, calls = sender(httpx.ConnectError("refused"))
+
+    with pytest.raises(httpx.ConnectError):
+        run(guard.call(send, idempotent=True, deadline=time.monotonic() + 5))
+
+    assert len(calls) == 3
+    assert guard.breaker.state == OPEN
+    with pytest.raises(UpstreamUnavailable) as error:
+        run(guard.acquire())
+    assert error.value.reason == "circuit_open"
+    assert guard.metrics.counters["shed_circuit_open"] == 1
+
+
+def test_hedge_wins_and_slow_request_is_cancelled():
+    guard = make_guard(hedge_delay=0.01)
+    cancelled = []
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return httpx.Response(200)
+
+    async def scenario():
+        started = time.monotonic()
+        response = await guard.call(send, idempotent=True, deadline=started + 5)
+        await asyncio.sleep(0)
+        return response, time.monotonic() - started
+
+    response, elapsed = run(scenario())
+
+    assert response.status_code == 200
+    assert elapsed < 1
+    assert cancelled == [True]
+    assert guard.metrics.counters["hedges"] == 1
+    assert guard.metrics.counters["hedge_wins"] == 1
+
+
+def test_fast_response_is_not_hedged():
+    guard = make_guard(hedge_delay=0.5)
+    send, calls = sender(200)
+
+    run(guard.call(send, idempotent=True, deadline=time.monotonic() + 5))
+
+    assert calls == [200]
+    assert guard.metrics.counters["hedges"] == 0
+
+
+def test_failed_hedge_response_is_closed():
+    guard = make_guard(hedge_delay=0.01)
+    responses = []
+
+    async def send():
+        # Первый запрос отвечает 503 уже после запуска дублирующего, второй - успехом позже
+        index = len(responses)
+        response = httpx.Response(503 if index == 0 else 200, stream=httpx.ByteStream(b""))
+        responses.append(response)
+        await asyncio.sleep(0.02 if index == 0 else 0.05)
+        return response
+
+    winner = run(guard.call(send, idempotent=True, deadline=time.monotonic() + 5))
+
+    assert winner is responses[1]
+    assert responses[0].is_closed
+    assert not winner.is_closed
+
+
+def test_bulkhead_rejects_when_queue_is_full():
+    async def scenario():
+        bulkhead = Bulkhead(max_concurrent=1, max_waiting=0, timeout=1.0)
+        assert await bulkhead.acquire()
+        rejected = await bulkhead.acquire()
+        bulkhead.release()
+        return rejected, bulkhead.in_flight
+
+    assert run(scenario()) == (False, 0)
+
+
+def test_bulkhead_waiter_times_out_and_then_gets_slot():
+    async def scenario():
+        bulkhead = Bulkhead(max_concurrent=1, max_waiting=1, timeout=0.05)
+        await bulkhead.acquire()
+        timed_out = await bulkhead.acquire()
+        waiting_after_timeout = bulkhead.waiting
+
+        waiter = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        assert bulkhead.waiting == 1
+        bulkhead.release()
+        return timed_out, waiting_after_timeout, await waiter, bulkhead.in_flight
+
+    assert run(scenario()) == (False, 0, True, 1)
+
+
+def test_guard_sheds_on_full_bulkhead():
+    guard = UpstreamGuard("post", CircuitBreaker(), RetryBudget(), Bulkhead(1, 0, 1.0))
+
+    async def scenario():
+        await guard.acquire()
+        try:
+            await guard.acquire()
+        finally:
+            guard.release()
+
+    with pytest.raises(UpstreamUnavailable) as error:
+        run(scenario())
+
+    assert error.value.reason == "bulkhead"
+    assert guard.metrics.counters["shed_bulkhead"] == 1
+    assert guard.bulkhead.in_flight == 0
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app import resize
+from app.media import MediaFileCache
+from app.resize import ImageResizer, negotiate_format
+from conftest import run
+
+SIZES = ["50x50", "150x150", "300x300"]
+
+
+@pytest.fixture
+def media_root(tmp_path):
+    root = tmp_path / "media"
+    root.mkdir()
+    Image.effect_noise((400, 300), 64).convert("RGB").save(root / "photo.jpg", "JPEG")
+    return str(root)
+
+
+def make_resizer(media_root, cache_dir, **options) -> ImageResizer:
+    return ImageResizer(MediaFileCache(media_root), str(cache_dir), sizes=SIZES, **options)
+
+
+def cache_files(cache_dir):
+    return sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(cache_dir)
+        for name in names
+        if not name.startswith(".")
+    )
+
+
+def cache_bytes(cache_dir) -> int:
+    return sum(os.path.getsize(path) for path in cache_files(cache_dir))
+
+
+def test_concurrent_misses_render_once(media_root, tmp_path, monkeypatch):
+    calls = []
+    render = resize.render_resized
+
+    def counting_render(*args):
+        calls.append(args)
+        time.sleep(0.05)
+        return render(*args)
+
+    monkeypatch.setattr(resize, "render_resized", counting_render)
+    resizer = make_resizer(media_root, tmp_path / "cache", max_bytes=10 ** 8)
+
+    async def scenario():
+        await resizer.load()
+        results = await asyncio.gather(*(resizer.get("photo.jpg", (150, 150), "contain", "JPEG") for _ in range(8)))
+        for cached, _ in results:
+            resizer.cache_files.release(cached)
+        return results
+
+    results = run(scenario())
+
+    assert len(calls) == 1
+    assert len({cached.path for cached, _ in results}) == 1
+    assert not resizer._inflight
+    with Image.open(results[0][0].path) as image:
+        assert max(image.size) == 150
+
+
+def test_eviction_keeps_shared_cache_under_limit(media_root, tmp_path):
+    cache_dir = tmp_path / "cache"
+    # Два воркера с общим каталогом: у каждого свой процессный учет
+    first = make_resizer(media_root, cache_dir, max_bytes=10 ** 8)
+    probe = run(first.get("photo.jpg", (300, 300), "cover", "PNG"))[0]
+    first.cache_files.release(probe)
+    max_bytes = probe.size * 2 + probe.size // 2
+    os.remove(probe.path)
+
+    workers = [make_resizer(media_root, cache_dir, max_bytes=max_bytes, sweep_bytes=1) for _ in range(2)]
+
+    async def scenario():
+        for worker in workers:
+            await worker.load()
+        for i, size in enumerate([(300, 300), (300, 299), (300, 298), (300, 297), (300, 296)]):
+            worker = workers[i % 2]
+            cached, _ = await worker.get("photo.jpg", size, "cover", "PNG")
+            worker.cache_files.release(cached)
+            await worker._sweep
+        return cached.path
+
+    last = run(scenario())
+
+    assert cache_bytes(cache_dir) <= max_bytes
+    assert last in cache_files(cache_dir)
+
+
+def test_eviction_order_follows_access_time(media_root, tmp_path):
+    cache_dir = tmp_path / "cache"
+    resizer = make_resizer(media_root, cache_dir, max_bytes=10 ** 8)
+
+    async def scenario():
+        paths = []
+        for size in [(50, 50), (150, 150), (300, 300)]:
+            cached, _ = await resizer.get("photo.jpg", size, "contain", "JPEG")
+            resizer.cache_files.release(cached)
+            paths.append(cached.path)
+        # Самая старая копия запрошена снова: вытесняется следующая по давности
+        past = time.time() - 3600
+        for i, path in enumerate(paths):
+            os.utime(path, (past + i, past + i))
+        cached, _ = await resizer.get("photo.jpg", (50, 50), "contain", "JPEG")
+        resizer.cache_files.release(cached)
+
+        resizer.max_bytes = cache_bytes(cache_dir) - 1
+        await resizer._evict()
+        return paths
+
+    small, medium, large = run(scenario())
+
+    assert os.path.exists(small)
+    assert not os.path.exists(medium)
+    assert os.path.exists(large)
+
+
+def test_stale_temp_files_are_removed_on_load(media_root, tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    fresh = cache_dir / "ab.png.1.tmp"
+    stale = cache_dir / "ab.png.2.tmp"
+    fresh.write_bytes(b"x")
+    stale.write_bytes(b"x")
+    past = time.time() - ImageResizer.stale_temp_age - 60
+    os.utime(stale, (past, past))
+
+    run(make_resizer(media_root, cache_dir, max_bytes=1).load())
+
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+@pytest.mark.parametrize("accept, avif, expected", [
+    ("image/avif,image/webp,*/*", True, "AVIF"),
+    ("image/avif,image/webp,*/*", False, "WEBP"),
+    ("image/avif;q=0,image/webp", True, "WEBP"),
+    ("image/avif;q=0,image/webp;q=0", True, "JPEG"),
+    ("image/webp;q=0.5", True, "WEBP"),
+    ("image/webp;q=oops", True, "JPEG"),
+    ("*/*", True, "JPEG"),
+    (None, True, "JPEG"),
+])
+def test_accept_negotiation(accept, avif, expected, monkeypatch):
+    monkeypatch.setattr(resize, "avif_supported", lambda: avif)
+
+    assert negotiate_format(accept, "photo.jpg") == expected
+
+
+def test_non_jpeg_source_falls_back_to_png(monkeypatch):
+    monkeypatch.setattr(resize, "avif_supported", lambda: False)
+
+    assert negotiate_format("image/png,*/*", "animation.gif") == "PNG"
+    assert negotiate_format("image/avif", "photo.JPEG") == "JPEG"
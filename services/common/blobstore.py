@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common.storage import ObjectNotFound, StorageBackend
+
+ORIGINAL_NAME = "original"
+# Объект, который обновляется при повторной загрузке того же содержимого
+TOUCH_NAME = ".touch"
+
+
+class BlobStore:
+    # Файлы по содержимому поверх хранилища медиа, общие для всех сервисов:
+    #   <prefix>/objects/<ab>/<sha256>/original.<ext> - оригинал, рядом его уменьшенные копии
+    #   <prefix>/refs/<ab>/<sha256>/<owner>           - ссылка владельца (пустой объект)
+    #   <prefix>/trash/<run>/<ab>/<sha256>/...         - объекты на время удаления сборщиком
+    # Число ссылок - число объектов под refs/<ab>/<sha256>/. Создание и удаление ссылки
+    # атомарны и в каталоге, и в S3, поэтому блокировки между процессами не нужны.
+
+    def __init__(self, storage: StorageBackend, prefix: str = "blobs", gc_grace: int = 3600):
+        self.storage = storage
+        self.prefix = prefix.strip("/")
+        self.gc_grace = gc_grace
+        self.objects_prefix = f"{self.prefix}/objects/"
+        self.refs_prefix = f"{self.prefix}/refs/"
+        self.trash_prefix = f"{self.prefix}/trash/"
+
+    @staticmethod
+    def _shard(digest: str) -> str:
+        return f"{digest[:2]}/{digest}"
+
+    def blob_prefix(self, digest: str) -> str:
+        return f"{self.objects_prefix}{self._shard(digest)}/"
+
+    def original_key(self, digest: str, extension: str) -> str:
+        return f"{self.blob_prefix(digest)}{ORIGINAL_NAME}{extension}"
+
+    def digest_from_key(self, key: str) -> Optional[str]:
+        # Обратное преобразование для ключей, сохраненных в БД
+        if not key.startswith(self.objects_prefix):
+            return None
+        parts = key[len(self.objects_prefix):].split("/")
+        return parts[1] if len(parts) >= 3 else None
+
+    def temp_path(self) -> str:
+        return os.path.join(self.storage.temp_dir(), uuid.uuid4().hex)
+
+    async def put(self, temp_path: str, digest: str, extension: str) -> bool:
+        # Возвращает False, если такой файл уже хранится: временный файл удаляется
+        key = self.original_key(digest, extension)
+        if await self.storage.exists(key):
+            # Свежая метка не даст сборщику мусора удалить объект до появления ссылки.
+            # Объект проверяется еще раз после метки: если сборщик уже перенес его
+            # в корзину, файл загружается заново (см. collect_garbage).
+            await self.storage.write(self.blob_prefix(digest) + TOUCH_NAME, b"")
+            if await self.storage.exists(key):
+                await asyncio.to_thread(os.remove, temp_path)
+                return False
+
+        await self.storage.write_file(key, temp_path)
+        return True
+
+    async def put_bytes(self, data: bytes, extension: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        temp_path = self.temp_path()
+        await asyncio.to_thread(self._write_temp, temp_path, data)
+        await self.put(temp_path, digest, extension)
+        return digest
+
+    @staticmethod
+    def _write_temp(path: str, data: bytes) -> None:
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _ref_key(self, digest: str, owner: str) -> str:
+        return f"{self.refs_prefix}{self._shard(digest)}/{owner}"
+
+    async def add_ref(self, digest: str, owner: str) -> None:
+        await self.storage.write(self._ref_key(digest, owner), b"")
+
+    async def remove_ref(self, digest: str, owner: str) -> None:
+        await self.storage.delete(self._ref_key(digest, owner))
+
+    async def refcount(self, digest: str) -> int:
+        return len(await self.storage.list(f"{self.refs_prefix}{self._shard(digest)}/"))
+
+    def _parse_ref(self, key: str) -> Tuple[str, str]:
+        # (sha256, владелец) по ключу ссылки
+        _, digest, owner = key[len(self.refs_prefix):].split("/", 2)
+        return digest, owner
+
+    async def prune_refs(self, owner_prefix: str, live_refs: Iterable[Tuple[str, str]]) -> int:
+        # Удаляет ссылки владельцев с данным префиксом, которых нет в БД сервиса:
+        # удаленных владельцев и замененные файлы. live_refs - пары (sha256, владелец).
+        # Свежие ссылки не трогаем: их владелец может быть еще не закоммичен.
+        live_refs = set(live_refs)
+        deadline = time.time() - self.gc_grace
+        removed = 0
+        for ref in await self.storage.list(self.refs_prefix):
+            digest, owner = self._parse_ref(ref.key)
+            if (
+                owner.startswith(owner_prefix)
+                and (digest, owner) not in live_refs
+                and ref.last_modified.timestamp() < deadline
+            ):
+                await self.storage.delete(ref.key)
+                removed += 1
+        return removed
+
+    async def _in_use(self, digest: str, deadline: float) -> bool:
+        # Есть ссылка или объект, измененный после deadline (в том числе метка TOUCH_NAME)
+        if await self.refcount(digest):
+            return True
+        objects = await self.storage.list(self.blob_prefix(digest))
+        return any(item.last_modified.timestamp() > deadline for item in objects)
+
+    def _trash_key(self, key: str, run: str) -> str:
+        return f"{self.trash_prefix}{run}/{key[len(self.objects_prefix):]}"
+
+    async def _restore(self, moved: List[str], run: str) -> None:
+        for key in moved:
+            # Загруженный заново файл новее копии в корзине
+            if await self.storage.exists(key):
+                await self.storage.delete(self._trash_key(key, run))
+            else:
+                await self.storage.move(self._trash_key(key, run), key)
+
+    async def _collect(self, digest: str, keys: List[str], deadline: float, run: str) -> bool:
+        # Файлы переносятся в корзину, и ссылки с меткой проверяются еще раз: загрузка
+        # того же содержимого пишет метку до проверки объекта, поэтому либо сборщик
+        # увидит метку и вернет файлы, либо загрузка не найдет объект и запишет его заново
+        if await self._in_use(digest, deadline):
+            return False
+        moved = []
+        try:
+            for key in keys:
+                try:
+                    await self.storage.move(key, self._trash_key(key, run))
+                except ObjectNotFound:
+                    continue
+                moved.append(key)
+            in_use = await self._in_use(digest, deadline)
+        except BaseException:
+            await self._restore(moved, run)
+            raise
+        if in_use:
+            await self._restore(moved, run)
+            return False
+        for key in moved:
+            await self.storage.delete(self._trash_key(key, run))
+        return True
+
+    def _remove_stale_temp(self, deadline: float) -> None:
+        # Временные файлы прерванных загрузок
+        for entry in os.scandir(self.storage.temp_dir()):
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+
+    async def collect_garbage(self) -> List[str]:
+        # Удаляет объекты без ссылок, к которым не обращались дольше gc_grace секунд.
+        # Общий список - только кандидаты: каждый объект проверяется заново перед удалением.
+        deadline = time.time() - self.gc_grace
+
+        referenced = set()
+        for ref in await self.storage.list(self.refs_prefix):
+            referenced.add(self._parse_ref(ref.key)[0])
+
+        blobs: Dict[str, List[str]] = defaultdict(list)
+        touched: Dict[str, float] = defaultdict(float)
+        for item in await self.storage.list(self.objects_prefix):
+            digest = self.digest_from_key(item.key)
+            if digest is None:
+                continue
+            blobs[digest].append(item.key)
+            touched[digest] = max(touched[digest], item.last_modified.timestamp())
+
+        # Корзина каждой сборки - отдельный каталог с моментом начала в имени:
+        # параллельные сборки в других процессах не трогают чужие файлы
+        run = f"{int(time.time())}-{uuid.uuid4().hex}"
+        removed = []
+        for digest, keys in blobs.items():
+            if digest in referenced or touched[digest] > deadline:
+                continue
+            if await self._collect(digest, keys, deadline, run):
+                removed.append(digest)
+
+        # Корзины прерванных сборок
+        for item in await self.storage.list(self.trash_prefix):
+            started = item.key[len(self.trash_prefix):].split("-", 1)[0]
+            if started.isdigit() and int(started) < deadline:
+                await self.storage.delete(item.key)
+
+        await asyncio.to_thread(self._remove_stale_temp, deadline)
+        return removed
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 85, "optimize": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 4},
+}
+
+
+class ImageQueueFull(Exception):
+    # Очередь пула переполнена: сервис отвечает 503 или откладывает задачу
+    def __init__(self, retry_after: int):
+        super().__init__("Сервер обработки изображений перегружен, повторите позже")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class ImageVariant:
+    # Уменьшенная копия: максимальный размер, формат (None - как у оригинала);
+    # crop - обрезка по центру до точного размера вместо вписывания
+    size: Tuple[int, int]
+    format: Optional[str] = None
+    crop: bool = False
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    # Прозрачность - на белом фоне
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode == "P":
+        return _flatten(image.convert("RGBA"))
+    return image.convert("RGB") if image.mode not in ("RGB", "L") else image
+
+
+def _prepare(image: Image.Image, fmt: str) -> Image.Image:
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        return _flatten(image)
+    if fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    return image
+
+
+def crop_center(image: Image.Image, width: int, height: int) -> Image.Image:
+    img_width, img_height = image.size
+
+    target_ratio = width / height
+    img_ratio = img_width / img_height
+
+    if img_ratio > target_ratio:
+        new_width = int(img_height * target_ratio)
+        left = (img_width - new_width) // 2
+        box = (left, 0, left + new_width, img_height)
+    else:
+        new_height = int(img_width / target_ratio)
+        top = (img_height - new_height) // 2
+        box = (0, top, img_width, top + new_height)
+
+    return image.crop(box).resize((width, height), Image.Resampling.LANCZOS)
+
+
+def render_variants(source_path: str, outputs: List[Tuple[ImageVariant, str]]) -> Dict[str, Tuple[int, int]]:
+    # Выполняется в процессе пула: одно декодирование, все размеры от большего к меньшему.
+    # Возвращает размеры построенных копий по их путям.
+    with Image.open(source_path) as image:
+        source_format = image.format or "PNG"
+        largest = max(max(variant.size) for variant, _ in outputs)
+        # JPEG можно декодировать сразу в уменьшенном масштабе
+        image.draft("RGB", (largest, largest))
+        image.load()
+
+        sizes: Dict[str, Tuple[int, int]] = {}
+        resized: Dict[Tuple[Tuple[int, int], bool], Image.Image] = {}
+        fitted = cropped = image
+        for variant, path in sorted(outputs, key=lambda item: -max(item[0].size)):
+            key = (variant.size, variant.crop)
+            if key not in resized:
+                width, height = variant.size
+                if variant.crop:
+                    # Размер с тем же соотношением сторон уменьшается из предыдущего, а не из оригинала
+                    source = cropped if cropped.width * height == cropped.height * width else image
+                    cropped = resized[key] = crop_center(source, width, height)
+                else:
+                    fitted = fitted.copy()
+                    fitted.thumbnail(variant.size, Image.Resampling.LANCZOS)
+                    resized[key] = fitted
+            result = resized[key]
+
+            fmt = variant.format or source_format
+            # Копию может строить и другой воркер: файл появляется целиком или никак
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            _prepare(result, fmt).save(temp_path, fmt, **SAVE_OPTIONS.get(fmt, {}))
+            os.replace(temp_path, path)
+            sizes[path] = result.size
+        return sizes
+
+
+class ImageProcessor:
+    # Пул процессов для обработки изображений: событийный цикл не блокируется.
+    # Число задач в работе и в очереди ограничено: при переполнении - ImageQueueFull.
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = 32, queue_timeout: float = 5.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+        return self._slots
+
+    async def render(self, source_path: str, outputs: List[Tuple[ImageVariant, str]]) -> Dict[str, Tuple[int, int]]:
+        if not outputs:
+            return {}
+
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ImageQueueFull(retry_after=max(1, int(self.queue_timeout)))
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), render_variants, source_path, outputs)
+        finally:
+            slots.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,585 @@
+import asyncio
+import mimetypes
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+CHUNK_SIZE = 64 * 1024
+# Минимальный размер части multipart-загрузки в S3
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+Data = Union[bytes, AsyncIterable[bytes]]
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectNotFound(StorageError):
+    pass
+
+
+class RangeNotSatisfiable(StorageError):
+    def __init__(self, size: int):
+        super().__init__(f"Диапазон вне файла размером {size}")
+        self.size = size
+
+
+@dataclass
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str
+    last_modified: datetime
+    content_type: Optional[str] = None
+
+    @property
+    def last_modified_http(self) -> str:
+        return format_datetime(self.last_modified, usegmt=True)
+
+
+@dataclass
+class ReadResult:
+    # status: 200 - весь объект, 206 - диапазон [start, end], 304 - не изменился
+    info: ObjectInfo
+    status: int
+    body: Optional[AsyncIterator[bytes]] = None
+    start: int = 0
+    end: int = 0
+
+    @property
+    def content_length(self) -> int:
+        return self.end - self.start + 1 if self.status in (200, 206) and self.info.size else 0
+
+    @property
+    def content_range(self) -> Optional[str]:
+        if self.status != 206:
+            return None
+        return f"bytes {self.start}-{self.end}/{self.info.size}"
+
+
+def guess_content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    # Один диапазон bytes=a-b, a- или -n. Несколько диапазонов и мусор - весь объект.
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition("-")
+    try:
+        if not start_text:
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable(size)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    return start, min(end, size - 1)
+
+
+def is_not_modified(
+        info: ObjectInfo,
+        if_none_match: Optional[str] = None,
+        if_modified_since: Optional[str] = None,
+) -> bool:
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or info.etag in tags
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return info.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+async def _iter_data(data: Data) -> AsyncIterator[bytes]:
+    if isinstance(data, (bytes, bytearray)):
+        yield bytes(data)
+    else:
+        async for chunk in data:
+            yield chunk
+
+
+class StorageBackend:
+    # Интерфейс хранилища медиафайлов. Ключи - относительные пути через "/".
+
+    async def write(self, key: str, data: Data, content_type: Optional[str] = None) -> ObjectInfo:
+        raise NotImplementedError
+
+    async def write_file(self, key: str, path: str, content_type: Optional[str] = None) -> ObjectInfo:
+        # Переносит локальный файл в хранилище; исходный файл после этого не нужен
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        raise NotImplementedError
+
+    async def read(
+            self,
+            key: str,
+            range_header: Optional[str] = None,
+            if_none_match: Optional[str] = None,
+            if_modified_since: Optional[str] = None,
+    ) -> ReadResult:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def move(self, key: str, new_key: str) -> None:
+        # Переименование объекта; new_key перезаписывается
+        raise NotImplementedError
+
+    async def list(self, prefix: str) -> List[ObjectInfo]:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def resize_url(self, key: str, width: int, height: int, fit: str = "contain") -> Optional[str]:
+        # Ссылка на уменьшенную копию через /media/resize шлюза; None - копии строит сервис
+        return None
+
+    def temp_dir(self) -> str:
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def fetch(self, key: str) -> AsyncIterator[str]:
+        # Локальный путь к объекту на время обработки (например, декодирования в PIL)
+        raise NotImplementedError
+        yield
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def close(self) -> None:
+        pass
+
+    async def read_bytes(self, key: str) -> bytes:
+        result = await self.read(key)
+        return b"".join([chunk async for chunk in result.body])
+
+
+class LocalStorage(StorageBackend):
+    # Каталог на диске; ссылки вида <base_url><key>, файлы отдает шлюз
+
+    def __init__(self, root: str, base_url: str = "/media/", resize: bool = True):
+        self.root = root
+        self.base_url = base_url
+        self.resize = resize
+
+    def local_path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.commonpath([os.path.abspath(path), os.path.abspath(self.root)]) != os.path.abspath(self.root):
+            raise StorageError("Ключ вне корня хранилища")
+        return path
+
+    def _info(self, key: str, path: str) -> ObjectInfo:
+        stat = os.stat(path)
+        return ObjectInfo(
+            key=key,
+            size=stat.st_size,
+            etag=f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+            last_modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            content_type=guess_content_type(key),
+        )
+
+    def temp_dir(self) -> str:
+        # Внутри корня: перенос в хранилище - атомарный rename
+        path = os.path.join(self.root, ".tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _move(self, key: str, source: str) -> ObjectInfo:
+        path = self.local_path(key)
+        if os.path.abspath(source) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.replace(source, path)
+            except OSError:
+                # Другая файловая система: копия рядом и атомарная замена
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                shutil.copyfile(source, temp_path)
+                os.replace(temp_path, path)
+                os.remove(source)
+        return self._info(key, path)
+
+    async def write(self, key: str, data: Data, content_type: Optional[str] = None) -> ObjectInfo:
+        temp_path = os.path.join(self.temp_dir(), uuid.uuid4().hex)
+        try:
+            with open(temp_path, "wb") as f:
+                async for chunk in _iter_data(data):
+                    await asyncio.to_thread(f.write, chunk)
+            return await asyncio.to_thread(self._move, key, temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def write_file(self, key: str, path: str, content_type: Optional[str] = None) -> ObjectInfo:
+        return await asyncio.to_thread(self._move, key, path)
+
+    def _stat(self, key: str) -> Optional[ObjectInfo]:
+        path = self.local_path(key)
+        if not os.path.isfile(path):
+            return None
+        return self._info(key, path)
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        return await asyncio.to_thread(self._stat, key)
+
+    async def _iter_file(self, path: str, start: int, length: int) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            while length > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def read(
+            self,
+            key: str,
+            range_header: Optional[str] = None,
+            if_none_match: Optional[str] = None,
+            if_modified_since: Optional[str] = None,
+    ) -> ReadResult:
+        info = await self.stat(key)
+        if info is None:
+            raise ObjectNotFound(key)
+        if is_not_modified(info, if_none_match, if_modified_since):
+            return ReadResult(info=info, status=304)
+
+        byte_range = parse_range(range_header, info.size)
+        start, end = byte_range or (0, info.size - 1)
+        body = self._iter_file(self.local_path(key), start, end - start + 1)
+        return ReadResult(info=info, status=206 if byte_range else 200, body=body, start=start, end=end)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def move(self, key: str, new_key: str) -> None:
+        try:
+            await asyncio.to_thread(self._move, new_key, self.local_path(key))
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+
+    def _list(self, prefix: str) -> List[ObjectInfo]:
+        base = self.local_path(prefix.rstrip("/")) if prefix.strip("/") else self.root
+        objects = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                objects.append(self._info(key, path))
+        return objects
+
+    async def list(self, prefix: str) -> List[ObjectInfo]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    def url(self, key: str) -> str:
+        return self.base_url + quote(key)
+
+    def resize_url(self, key: str, width: int, height: int, fit: str = "contain") -> Optional[str]:
+        if not self.resize:
+            return None
+        url = f"{self.base_url}resize/{width}x{height}/{quote(key)}"
+        return url if fit == "contain" else f"{url}?fit={fit}"
+
+    @asynccontextmanager
+    async def fetch(self, key: str) -> AsyncIterator[str]:
+        if not await self.exists(key):
+            raise ObjectNotFound(key)
+        yield self.local_path(key)
+
+
+class S3Storage(StorageBackend):
+    # S3-совместимое хранилище (AWS, MinIO, Ceph) через aiobotocore
+
+    def __init__(
+            self,
+            bucket: str,
+            endpoint_url: Optional[str] = None,
+            region: Optional[str] = None,
+            access_key_id: Optional[str] = None,
+            secret_access_key: Optional[str] = None,
+            public_url: Optional[str] = None,
+            presign_ttl: int = 3600,
+    ):
+        try:
+            from aiobotocore.session import get_session
+        except ImportError as e:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет aiobotocore") from e
+
+        self.bucket = bucket
+        self.public_url = public_url
+        self.presign_ttl = presign_ttl
+        self._client_kwargs = {
+            "endpoint_url": endpoint_url,
+            "region_name": region,
+            "aws_access_key_id": access_key_id,
+            "aws_secret_access_key": secret_access_key,
+        }
+        self._session = get_session()
+        self._client = None
+        self._client_context = None
+        self._lock = asyncio.Lock()
+        self._signer = None
+
+    async def _get_client(self):
+        # Один клиент (и пул соединений) на процесс
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client_context = self._session.create_client("s3", **self._client_kwargs)
+                    self._client = await self._client_context.__aenter__()
+        return self._client
+
+    async def close(self) -> None:
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client = self._client_context = None
+
+    @staticmethod
+    def _error_code(error) -> str:
+        return str(error.response.get("Error", {}).get("Code", ""))
+
+    def _info(self, key: str, response: dict, size_field: str = "ContentLength") -> ObjectInfo:
+        last_modified = response["LastModified"]
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return ObjectInfo(
+            key=key,
+            size=response.get(size_field, 0),
+            etag=response["ETag"],
+            last_modified=last_modified,
+            content_type=response.get("ContentType"),
+        )
+
+    async def write(self, key: str, data: Data, content_type: Optional[str] = None) -> ObjectInfo:
+        client = await self._get_client()
+        content_type = content_type or guess_content_type(key)
+
+        # Маленький объект - одним PUT, большой - multipart без буферизации целиком
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in _iter_data(data):
+                buffer.extend(chunk)
+                if len(buffer) >= MULTIPART_PART_SIZE:
+                    if upload_id is None:
+                        response = await client.create_multipart_upload(
+                            Bucket=self.bucket, Key=key, ContentType=content_type
+                        )
+                        upload_id = response["UploadId"]
+                    response = await client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1, Body=bytes(buffer),
+                    )
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+                    buffer.clear()
+
+            if upload_id is None:
+                await client.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer), ContentType=content_type)
+            else:
+                if buffer:
+                    response = await client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1, Body=bytes(buffer),
+                    )
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+                await client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+        return await self.stat(key)
+
+    async def write_file(self, key: str, path: str, content_type: Optional[str] = None) -> ObjectInfo:
+        async def chunks():
+            with open(path, "rb") as f:
+                while chunk := await asyncio.to_thread(f.read, MULTIPART_PART_SIZE):
+                    yield chunk
+
+        info = await self.write(key, chunks(), content_type)
+        await asyncio.to_thread(os.remove, path)
+        return info
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        from botocore.exceptions import ClientError
+
+        client = await self._get_client()
+        try:
+            response = await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self._error_code(e) in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return self._info(key, response)
+
+    async def _iter_body(self, body) -> AsyncIterator[bytes]:
+        try:
+            while chunk := await body.read(CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def read(
+            self,
+            key: str,
+            range_header: Optional[str] = None,
+            if_none_match: Optional[str] = None,
+            if_modified_since: Optional[str] = None,
+    ) -> ReadResult:
+        from botocore.exceptions import ClientError
+
+        client = await self._get_client()
+        params = {"Bucket": self.bucket, "Key": key}
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
+        elif if_modified_since:
+            try:
+                params["IfModifiedSince"] = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                pass
+        if range_header and range_header.startswith("bytes=") and "," not in range_header:
+            params["Range"] = range_header
+
+        try:
+            response = await client.get_object(**params)
+        except ClientError as e:
+            code = self._error_code(e)
+            if code in ("304", "NotModified"):
+                info = await self.stat(key)
+                if info is None:
+                    raise ObjectNotFound(key)
+                return ReadResult(info=info, status=304)
+            if code in ("404", "NoSuchKey"):
+                raise ObjectNotFound(key) from e
+            if code in ("416", "InvalidRange"):
+                info = await self.stat(key)
+                raise RangeNotSatisfiable(info.size if info else 0) from e
+            raise
+
+        content_range = response.get("ContentRange")
+        if content_range:
+            # bytes start-end/size
+            span, _, size = content_range.removeprefix("bytes ").partition("/")
+            start, _, end = span.partition("-")
+            info = self._info(key, {**response, "ContentLength": int(size)})
+            return ReadResult(
+                info=info, status=206, body=self._iter_body(response["Body"]),
+                start=int(start), end=int(end),
+            )
+
+        info = self._info(key, response)
+        return ReadResult(
+            info=info, status=200, body=self._iter_body(response["Body"]),
+            start=0, end=info.size - 1,
+        )
+
+    async def delete(self, key: str) -> None:
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def move(self, key: str, new_key: str) -> None:
+        from botocore.exceptions import ClientError
+
+        client = await self._get_client()
+        try:
+            await client.copy_object(Bucket=self.bucket, Key=new_key, CopySource={"Bucket": self.bucket, "Key": key})
+        except ClientError as e:
+            if self._error_code(e) in ("404", "NoSuchKey"):
+                raise ObjectNotFound(key)
+            raise
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def list(self, prefix: str) -> List[ObjectInfo]:
+        client = await self._get_client()
+        paginator = client.get_paginator("list_objects_v2")
+        objects = []
+        async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                objects.append(self._info(item["Key"], item, size_field="Size"))
+        return objects
+
+    def _get_signer(self):
+        # Подпись ссылки - локальное вычисление, сеть не нужна: синхронный клиент botocore
+        if self._signer is None:
+            import botocore.session
+            from botocore.config import Config
+
+            self._signer = botocore.session.get_session().create_client(
+                "s3", config=Config(signature_version="s3v4"), **self._client_kwargs
+            )
+        return self._signer
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url.rstrip('/')}/{quote(key)}"
+        return self._get_signer().generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.presign_ttl
+        )
+
+    def temp_dir(self) -> str:
+        path = os.path.join(tempfile.gettempdir(), "media-storage")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @asynccontextmanager
+    async def fetch(self, key: str) -> AsyncIterator[str]:
+        directory = tempfile.mkdtemp(dir=self.temp_dir())
+        path = os.path.join(directory, os.path.basename(key))
+        try:
+            result = await self.read(key)
+            with open(path, "wb") as f:
+                async for chunk in result.body:
+                    await asyncio.to_thread(f.write, chunk)
+            yield path
+        finally:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+
+
+def storage_from_settings(settings) -> StorageBackend:
+    # Общие для сервисов настройки STORAGE_* и S3_*
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+            presign_ttl=settings.STORAGE_PRESIGN_TTL,
+        )
+    return LocalStorage(
+        settings.STORAGE_LOCAL_ROOT,
+        settings.STORAGE_BASE_URL,
+        settings.STORAGE_RESIZE,
+    )
@@ -0,0 +1,182 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import settings
+
+
+def _version_seed() -> int:
+    # Версия, потерянная при вытеснении, начинается заново с текущего времени,
+    # поэтому никогда не совпадет с версией уже закэшированных записей
+    return int(time.time() * 1000)
+
+
+class MemoryCache:
+    # LRU с TTL в памяти процесса. Версии тегов хранятся в отдельном LRU того же
+    # размера: вытесненная версия дает только промахи по старым записям.
+    # Сбрасывает кэш только своего процесса: для нескольких экземпляров
+    # сервиса нужен CACHE_BACKEND=redis.
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._last_version = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _set_version(self, tag: str) -> int:
+        # Каждая новая версия больше всех выданных раньше, в том числе вытесненных
+        version = self._last_version = max(self._last_version + 1, _version_seed())
+        self._versions[tag] = version
+        self._versions.move_to_end(tag)
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+        return version
+
+    async def get_version(self, tag: str) -> int:
+        version = self._versions.get(tag)
+        if version is None:
+            return self._set_version(tag)
+        self._versions.move_to_end(tag)
+        return version
+
+    async def bump_version(self, tag: str) -> int:
+        if tag not in self._versions:
+            # Под тегом без версии ничего не закэшировано
+            return self._last_version
+        return self._set_version(tag)
+
+
+class RedisCache:
+    # Бэкенд на протоколе Redis: общий кэш для всех экземпляров сервиса
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("Для CACHE_BACKEND=redis нужен пакет redis") from e
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        await self._client.set(key, value, ex=ttl)
+
+    async def get_version(self, tag: str) -> int:
+        version = await self._client.get(tag)
+        if version is None:
+            seed = _version_seed()
+            if await self._client.set(tag, seed, nx=True):
+                return seed
+            version = await self._client.get(tag)
+        return int(version)
+
+    async def bump_version(self, tag: str) -> int:
+        await self._client.set(tag, _version_seed(), nx=True)
+        return await self._client.incr(tag)
+
+
+class ResponseCache:
+    # Кэш сериализованных ответов с инвалидацией по версиям тегов:
+    # у каждого поста своя версия, у лент одного пользователя (фильтр user_id) -
+    # версия этого пользователя, у остальных лент - общая. Запись поста сбрасывает
+    # общие ленты и ленты его автора, ленты других пользователей остаются в кэше.
+
+    LISTING_TAG = "ver:posts:list"
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits: Dict[str, int] = {"post": 0, "listing": 0}
+        self.misses: Dict[str, int] = {"post": 0, "listing": 0}
+        self.invalidations = 0
+
+    @staticmethod
+    def _post_tag(post_id: int) -> str:
+        return f"ver:post:{post_id}"
+
+    async def _lookup(self, kind: str, key: str) -> Optional[str]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses[kind] += 1
+        else:
+            self.hits[kind] += 1
+        return value
+
+    async def _post_key(self, post_id: int) -> str:
+        version = await self.backend.get_version(self._post_tag(post_id))
+        return f"post:{post_id}:v{version}"
+
+    @classmethod
+    def _listing_tag(cls, user_id: Optional[int]) -> str:
+        if user_id is None:
+            return cls.LISTING_TAG
+        return f"{cls.LISTING_TAG}:user:{user_id}"
+
+    async def _listing_key(self, params: str, user_id: Optional[int]) -> str:
+        version = await self.backend.get_version(self._listing_tag(user_id))
+        digest = hashlib.sha1(params.encode()).hexdigest()
+        return f"posts:list:v{version}:{digest}"
+
+    async def get_post(self, post_id: int) -> Optional[str]:
+        return await self._lookup("post", await self._post_key(post_id))
+
+    async def set_post(self, post_id: int, payload: str) -> None:
+        await self.backend.set(await self._post_key(post_id), payload, self.ttl)
+
+    async def get_listing(self, params: str, user_id: Optional[int] = None) -> Optional[str]:
+        return await self._lookup("listing", await self._listing_key(params, user_id))
+
+    async def set_listing(self, params: str, payload: str, user_id: Optional[int] = None) -> None:
+        await self.backend.set(await self._listing_key(params, user_id), payload, self.ttl)
+
+    async def invalidate_posts(self, post_ids: Iterable[int], user_ids: Iterable[int]) -> None:
+        for post_id in post_ids:
+            await self.backend.bump_version(self._post_tag(post_id))
+        await self.invalidate_listings(user_ids)
+
+    async def invalidate_listings(self, user_ids: Iterable[int] = ()) -> None:
+        await self.backend.bump_version(self.LISTING_TAG)
+        for user_id in user_ids:
+            await self.backend.bump_version(self._listing_tag(user_id))
+        self.invalidations += 1
+
+    def metrics(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def _create_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.CACHE_REDIS_URL)
+    return MemoryCache(settings.CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(_create_backend(), settings.CACHE_TTL)
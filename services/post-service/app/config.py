@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import List, Optional
 from pydantic_settings import BaseSettings
-from pydantic import PostgresDsn, Field
+from pydantic import Field, model_validator
 import secrets
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,14 +13,8 @@ class Settings(BaseSettings):
     POSTGRES_SERVER: str = Field(default="localhost")
     POSTGRES_PORT: str = Field(default="5432")
     POSTGRES_DB: str = "post_db"
-    DATABASE_URL: str = PostgresDsn().build(
-        sheme="postgresql+psycopg2",
-        username=POSTGRES_USER,
-        password=POSTGRES_PASSWORD,
-        host=POSTGRES_SERVER,
-        port=POSTGRES_PORT,
-        path=POSTGRES_DB,
-    )
+    # Без DATABASE_URL адрес собирается из POSTGRES_*
+    DATABASE_URL: Optional[str] = Field(default=None)
     DATABASE_POOL_SIZE: int = Field(default=20, ge=1, le=100)
     DATABASE_MAX_OVERFLOW: int = Field(default=0, ge=0)
     DATABASE_ECHO: bool = Field(default=False)
@@ -37,6 +31,55 @@ class Settings(BaseSettings):
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = False
 
+    # Полнотекстовый поиск: auto, postgres или memory
+    SEARCH_BACKEND: str = Field(default="auto")
+
+    # Кэш ответов: memory (свой в каждом процессе) или redis (общий для экземпляров)
+    CACHE_BACKEND: str = Field(default="memory")
+    CACHE_REDIS_URL: str = Field(default="redis://localhost:6379/0")
+    CACHE_TTL: int = Field(default=60, ge=1)
+    CACHE_MAX_ENTRIES: int = Field(default=10000, ge=1)
+
+    # Сверка счетчиков статистики с таблицей Post, в секундах
+    STATS_RECONCILE_INTERVAL: int = Field(default=3600, ge=60)
+    # Число строк общих счетчиков статистики
+    STATS_SHARDS: int = Field(default=16, ge=1)
+
+    # Пул обработки изображений: число процессов (по умолчанию - по числу ядер),
+    # длина очереди и время ожидания места в ней, в секундах
+    IMAGE_WORKERS: Optional[int] = Field(default=None, ge=1)
+    IMAGE_QUEUE_SIZE: int = Field(default=32, ge=0)
+    IMAGE_QUEUE_TIMEOUT: float = Field(default=5.0, gt=0)
+
+    # Фоновые задачи построения уменьшенных копий: database или memory
+    IMAGE_JOB_BACKEND: str = Field(default="database")
+    IMAGE_JOB_WORKERS: Optional[int] = Field(default=None, ge=1)
+    IMAGE_JOB_MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    IMAGE_JOB_POLL_INTERVAL: float = Field(default=2.0, gt=0)
+    # Задача, взятая воркером раньше этого срока (в секундах), считается брошенной
+    IMAGE_JOB_LOCK_TIMEOUT: int = Field(default=300, ge=1)
+
+    # Хранилище медиафайлов: local (каталог STORAGE_LOCAL_ROOT) или s3
+    STORAGE_BACKEND: str = Field(default="local")
+    # Общий каталог с MEDIA_ROOT шлюза, файлы отдает его /media
+    STORAGE_LOCAL_ROOT: str = Field(default="/var/lib/website/media")
+    STORAGE_BASE_URL: str = Field(default="/media/")
+    STORAGE_PRESIGN_TTL: int = Field(default=3600, ge=1)
+    # Уменьшенные копии строит шлюз по /media/resize (только для local)
+    STORAGE_RESIZE: bool = Field(default=True)
+    S3_BUCKET: str = Field(default="media")
+    S3_ENDPOINT_URL: Optional[str] = Field(default=None)
+    S3_REGION: Optional[str] = Field(default=None)
+    S3_ACCESS_KEY_ID: Optional[str] = Field(default=None)
+    S3_SECRET_ACCESS_KEY: Optional[str] = Field(default=None)
+    # Публичный адрес бакета; без него ссылки на объекты подписываются
+    S3_PUBLIC_URL: Optional[str] = Field(default=None)
+
+    # Файлы по содержимому (общие с user-service) и сборка мусора в них, в секундах
+    BLOB_PREFIX: str = Field(default="blobs")
+    BLOB_GC_GRACE: int = Field(default=3600, ge=60)
+    BLOB_GC_INTERVAL: int = Field(default=3600, ge=60)
+
     # Path to SSL
     SSL_CERT_PATH: Optional[Path] = None
     SSL_KEY_PATH: Optional[Path] = None
@@ -46,6 +89,15 @@ class Settings(BaseSettings):
     ALLOWED_PORT: str = "8003"
     API_KEY_HEADER: str = "X-API-KEY"
 
+    @model_validator(mode="after")
+    def assemble_database_url(self):
+        if not self.DATABASE_URL:
+            self.DATABASE_URL = (
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+                f"@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        return self
+
     class Config:
         env_file = ".env"
         case_sensitive = True
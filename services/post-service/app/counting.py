@@ -0,0 +1,139 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from database import AsyncSession
+from models import Post
+from schemas import PostFilter
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATE = "estimate"
+COUNT_CACHED = "cached"
+
+# Ниже этого порога оценке планировщика не доверяем и считаем точно
+ESTIMATE_EXACT_THRESHOLD = 1000
+
+
+class PostCountCache:
+    # Кэш количества постов по нормализованному фильтру.
+    # Любая запись в Post сбрасывает кэш целиком через смену поколения.
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._generation = 0
+        self._entries: "OrderedDict[str, Tuple[int, float, int]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(filters: Optional[PostFilter]) -> str:
+        if not filters:
+            return "{}"
+
+        data = {}
+        if filters.search and filters.search.strip():
+            data["search"] = filters.search.strip().lower()
+        if filters.is_published is not None:
+            data["is_published"] = filters.is_published
+        if filters.user_id:
+            data["user_id"] = filters.user_id
+        # Границы дат округляются до дня при построении условий
+        if filters.date_from:
+            data["date_from"] = filters.date_from.date().isoformat()
+        if filters.date_to:
+            data["date_to"] = filters.date_to.date().isoformat()
+        return json.dumps(data, sort_keys=True)
+
+    def get(self, key: str) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at, generation = entry
+        if generation != self._generation or expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: int) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl, self._generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+
+post_count_cache = PostCountCache()
+
+
+class Explain(Executable, ClauseElement):
+    # EXPLAIN над select: параметры запроса передаются драйверу как обычно,
+    # а не подставляются в текст SQL
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def _exact_count(db: AsyncSession, conditions: list) -> int:
+    stmt = select(func.count(Post.id))
+    if conditions:
+        stmt = stmt.where(and_(*conditions))
+    result = await db.execute(stmt)
+    return result.scalar() or 0
+
+
+async def _estimated_count(db: AsyncSession, conditions: list) -> Optional[int]:
+    # Оценка по плану запроса PostgreSQL, без обхода таблицы
+    dialect = db.get_bind().dialect
+    if dialect.name != "postgresql":
+        return None
+
+    stmt = select(Post.id)
+    if conditions:
+        stmt = stmt.where(and_(*conditions))
+
+    result = await db.execute(Explain(stmt))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_posts(
+        db: AsyncSession,
+        conditions: list,
+        strategy: str = COUNT_EXACT,
+        filters: Optional[PostFilter] = None,
+) -> Tuple[int, bool]:
+    # Возвращает (количество, является ли оно оценкой)
+    if strategy == COUNT_ESTIMATE:
+        estimate = await _estimated_count(db, conditions)
+        if estimate is not None and estimate >= ESTIMATE_EXACT_THRESHOLD:
+            return estimate, True
+        return await _exact_count(db, conditions), False
+
+    if strategy == COUNT_CACHED:
+        key = post_count_cache.make_key(filters)
+        cached = post_count_cache.get(key)
+        if cached is not None:
+            return cached, False
+        total = await _exact_count(db, conditions)
+        post_count_cache.set(key, total)
+        return total, False
+
+    return await _exact_count(db, conditions), False
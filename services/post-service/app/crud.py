@@ -1,13 +1,78 @@
-from fastapi import HTTPException
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
+import logging
 
-from database import AsyncSession
-from sqlalchemy import select, update, delete, func, or_, and_
-from typing import Optional, List, Tuple, Dict, Any
-import models, schemas
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import AsyncSession, dialect_insert
+from sqlalchemy import select, update, delete, func, and_, values, column, Integer, String
+from typing import Optional, List, Tuple, Dict, Any, Iterable
+import models, schemas, pagination, counting, search, cache, stats, jobs
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+PREVIEW_TEXT_LENGTH = 300
+# Сколько вариантов имени с суффиксом проверять за один запрос
+RENAME_BATCH = 20
+
+INVALIDATED_POSTS_KEY = "invalidated_posts"
+INVALIDATED_USERS_KEY = "invalidated_users"
+INVALIDATED_COUNTS_KEY = "invalidated_counts"
+COMMITTED_INVALIDATIONS_KEY = "committed_invalidations"
+
+
+def invalidate_post_caches(
+        db: AsyncSession,
+        post_ids: Iterable[int],
+        user_ids: Iterable[int],
+        counts: bool = True,
+) -> None:
+    # Кэши сбрасываются после фиксации транзакции: до нее параллельный запрос
+    # прочитал бы из базы старые данные и снова положил их в кэш.
+    # user_ids - авторы постов: сбрасываются их ленты
+    db.info.setdefault(INVALIDATED_POSTS_KEY, set()).update(post_ids)
+    db.info.setdefault(INVALIDATED_USERS_KEY, set()).update(user_ids)
+    if counts:
+        db.info[INVALIDATED_COUNTS_KEY] = True
+
+
+async def flush_invalidations(db: AsyncSession) -> None:
+    # Вызывается после commit в обработчике запроса: версии кэша повышаются
+    # до ответа, и клиент сразу читает свою запись
+    committed = db.info.pop(COMMITTED_INVALIDATIONS_KEY, None)
+    if not committed:
+        return
+    post_ids, user_ids = committed
+    try:
+        await cache.response_cache.invalidate_posts(sorted(post_ids), sorted(user_ids))
+    except Exception:
+        logger.exception("Не удалось сбросить кэш постов %s", sorted(post_ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _caches_committed(session):
+    # Здесь только счетчики процесса и список зафиксированных постов:
+    # сам сброс кэша ответов - в flush_invalidations
+    if session.info.pop(INVALIDATED_COUNTS_KEY, False):
+        counting.post_count_cache.invalidate()
+    post_ids = session.info.pop(INVALIDATED_POSTS_KEY, None)
+    user_ids = session.info.pop(INVALIDATED_USERS_KEY, set())
+    if post_ids:
+        committed_posts, committed_users = session.info.setdefault(COMMITTED_INVALIDATIONS_KEY, (set(), set()))
+        committed_posts.update(post_ids)
+        committed_users.update(user_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _caches_rolled_back(session, previous_transaction):
+    session.info.pop(INVALIDATED_COUNTS_KEY, None)
+    session.info.pop(INVALIDATED_POSTS_KEY, None)
+    session.info.pop(INVALIDATED_USERS_KEY, None)
+
+
 class PostCRUD:
     @staticmethod
     async def create(db: AsyncSession, post: schemas.PostCreate, owner_id: int) -> models.Post:
@@ -25,6 +90,8 @@ class PostCRUD:
         try:
             db.add(db_post)
             await db.flush()
+            await stats.posts_created(db, [db_post])
+            invalidate_post_caches(db, [db_post.id], [owner_id])
             return db_post
         except Exception:
             await db.rollback()
@@ -52,13 +119,20 @@ class PostCRUD:
             await models.Post.validate_unique_normalized_name(db, normalized_name, post_id)
             update_data["normalized_name"] = normalized_name
 
+        publication_changed = (
+            "is_published" in update_data and update_data["is_published"] != db_post.is_published
+        )
+
         for field, value in update_data.items():
             setattr(db_post, field, value)
 
         db_post.updated = datetime.utcnow()
         try:
             await db.flush()
+            if publication_changed:
+                await stats.publication_changed(db, db_post.user_id, db_post.is_published)
             await db.refresh(db_post)
+            invalidate_post_caches(db, [post_id], [db_post.user_id])
             return db_post
         except SQLAlchemyError as e:
             await db.rollback()
@@ -70,14 +144,100 @@ class PostCRUD:
         if not db_post:
             return False
 
+        snapshot = await stats.snapshot_posts(db, [post_id])
         try:
             await db.delete(db_post)
             await db.flush()
+            await stats.posts_deleted(db, snapshot)
+            invalidate_post_caches(db, [post_id], [db_post.user_id])
             return True
         except SQLAlchemyError as e:
             await db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+    @staticmethod
+    def filter_conditions(filters: Optional[schemas.PostFilter]) -> list:
+        conditions = []
+        if not filters:
+            return conditions
+
+        if filters.search and filters.search.strip():
+            conditions.append(search.search_engine.condition(filters.search.strip()))
+
+        if filters.is_published is not None:
+            conditions.append(models.Post.is_published == filters.is_published)
+
+        if filters.user_id:
+            conditions.append(models.Post.user_id == filters.user_id)
+
+        if filters.date_from:
+            date_to_start = filters.date_from.replace(hour=0, minute=0, second=0)
+            conditions.append(models.Post.created >= date_to_start)
+
+        if filters.date_to:
+            date_to_end = filters.date_to.replace(hour=23, minute=59, second=59)
+            conditions.append(models.Post.created <= date_to_end)
+
+        return conditions
+
+    @staticmethod
+    def order_by(sort: Optional[schemas.PostSort], filters: Optional[schemas.PostFilter] = None) -> list:
+        if not sort:
+            return [models.Post.created.desc()]
+
+        if sort.sort_by == "relevance":
+            if not (filters and filters.search and filters.search.strip()):
+                return [models.Post.created.desc()]
+            rank = search.search_engine.rank(filters.search.strip())
+            if sort.sort_order == "asc":
+                return [rank.asc(), models.Post.id.asc()]
+            return [rank.desc(), models.Post.id.desc()]
+
+        if hasattr(models.Post, sort.sort_by):
+            sort_field = getattr(models.Post, sort.sort_by)
+            if sort.sort_order == "desc":
+                sort_field = sort_field.desc()
+            return [sort_field]
+
+        return [models.Post.created.desc()]
+
+    @staticmethod
+    def list_query():
+        # Только колонки карточки ленты: превью текста режется в SQL,
+        # из изображений берется одна первая миниатюра (по индексу post_id)
+        thumbnail_path = (
+            select(models.PostImage.thumbnail_path)
+            .where(models.PostImage.post_id == models.Post.id)
+            .order_by(models.PostImage.id)
+            .limit(1)
+            .correlate(models.Post)
+            .scalar_subquery()
+        )
+        return select(
+            models.Post.id,
+            models.Post.name,
+            models.Post.normalized_name,
+            models.Post.is_published,
+            models.Post.user_id,
+            models.Post.created,
+            models.Post.updated,
+            func.substr(models.Post.text, 1, PREVIEW_TEXT_LENGTH).label("preview_text"),
+            thumbnail_path.label("thumbnail_path"),
+        )
+
+    @staticmethod
+    def to_list_item(row) -> schemas.PostListResponse:
+        return schemas.PostListResponse(
+            id=row.id,
+            name=row.name,
+            normalized_name=row.normalized_name,
+            is_published=row.is_published,
+            created=row.created,
+            updated=row.updated,
+            preview_text=row.preview_text,
+            thumbnail_url=models.media_url(row.thumbnail_path),
+        )
+
     @staticmethod
     async def get_posts(
             db: AsyncSession,
@@ -88,173 +248,300 @@ class PostCRUD:
     ) -> List[models.Post]:
         stmt = select(models.Post).options(selectinload(models.Post.images))
 
-        if filters:
-            conditions = []
-
-            if filters.search and filters.search.strip():
-                search_pattern = f"%{filters.search.strip()}%"
-                search_conditions = or_(
-                    models.Post.name.ilike(search_pattern),
-                    models.Post.text.ilike(search_pattern),
-                )
-                conditions.append(search_conditions)
+        conditions = PostCRUD.filter_conditions(filters)
+        if conditions:
+            stmt = stmt.where(and_(*conditions))
 
-            if filters.is_published is not None:
-                conditions.append(models.Post.is_published == filters.is_published)
+        stmt = stmt.order_by(*PostCRUD.order_by(sort, filters))
 
-            if filters.user_id:
-                conditions.append(models.Post.user_id == filters.user_id)
+        stmt = stmt.offset(skip).limit(limit)
 
-            if filters.date_from:
-                date_to_start = filters.date_from.replace(hour=0, minute=0, second=0)
-                conditions.append(models.Post.created >= date_to_start)
+        result = await db.execute(stmt)
+        return list(result.scalars().all())
 
-            if filters.date_to:
-                date_to_end = filters.date_to.replace(hour=23, minute=59, second=59)
-                conditions.append(models.Post.created <= date_to_end)
+    @staticmethod
+    async def get_posts_by_cursor(
+            db: AsyncSession,
+            limit: int = 100,
+            filters: Optional[schemas.PostFilter] = None,
+            sort: Optional[schemas.PostSort] = None,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[models.Post], Optional[str], Optional[str]]:
+        sort = sort or schemas.PostSort()
+        page_cursor = pagination.decode_cursor(cursor, sort) if cursor else None
 
-            if conditions:
-                stmt = stmt.where(and_(*conditions))
+        stmt = select(models.Post).options(selectinload(models.Post.images))
 
-        if sort:
-            if hasattr(models.Post, sort.sort_by):
-                sort_field = getattr(models.Post, sort.sort_by)
-                if sort.sort_order == "desc":
-                    sort_field = sort_field.desc()
-                stmt = stmt.order_by(sort_field)
-            else:
-                stmt = stmt.order_by(models.Post.created.desc())
-        else:
-            stmt = stmt.order_by(models.Post.created.desc())
+        conditions = PostCRUD.filter_conditions(filters)
+        if conditions:
+            stmt = stmt.where(and_(*conditions))
 
-        stmt = stmt.offset(skip).limit(limit)
+        stmt = pagination.apply_keyset(stmt, sort, page_cursor, limit)
 
         result = await db.execute(stmt)
-        return list(result.scalars().all())
+        rows = list(result.scalars().all())
+        return pagination.split_page(rows, sort, page_cursor, limit)
 
     @staticmethod
-    async def post_count(db: AsyncSession, filters: Optional[schemas.PostFilter] = None) -> int:
-        stmt = select(func.count(models.Post.id))
+    async def post_count(
+            db: AsyncSession,
+            filters: Optional[schemas.PostFilter] = None,
+            strategy: str = counting.COUNT_EXACT,
+    ) -> int:
+        conditions = PostCRUD.filter_conditions(filters)
+        total, _ = await counting.count_posts(db, conditions, strategy, filters)
+        return total
 
-        if filters:
-            conditions = []
+    @staticmethod
+    async def _taken_normalized_names(db: AsyncSession, normalized_names: Iterable[str]) -> set:
+        # normalized_name IN (...) - поиск по уникальному индексу
+        names = set(normalized_names)
+        if not names:
+            return set()
+        result = await db.execute(select(models.Post.normalized_name).where(models.Post.normalized_name.in_(names)))
+        return set(result.scalars().all())
 
-            if filters.search and filters.search.strip():
-                search_pattern = f"%{filters.search.strip()}%"
-                search_conditions = or_(
-                    models.Post.name.ilike(search_pattern),
-                    models.Post.text.ilike(search_pattern),
-                )
-                conditions.append(search_conditions)
+    @staticmethod
+    def _suffixed_name(name: str, number: int) -> Tuple[str, str]:
+        suffix = f"_{number}"
+        candidate = name[:150 - len(suffix)] + suffix
+        return candidate, models.Post._generate_normalized_name(candidate)
 
-            if filters.is_published is not None:
-                conditions.append(models.Post.is_published == filters.is_published)
+    @staticmethod
+    async def _check_suffixes(db: AsyncSession, names: Iterable[str], taken: set, checked: Dict[str, int]) -> None:
+        # Следующие RENAME_BATCH вариантов name_N для каждого имени - одним запросом
+        candidates = []
+        for name in set(names):
+            start = checked.get(name, 0) + 1
+            candidates.extend(
+                PostCRUD._suffixed_name(name, number)[1] for number in range(start, start + RENAME_BATCH)
+            )
+            checked[name] = start + RENAME_BATCH - 1
+        taken.update(await PostCRUD._taken_normalized_names(db, candidates))
 
-            if filters.user_id:
-                conditions.append(models.Post.user_id == filters.user_id)
+    @staticmethod
+    async def _rename_unique(db: AsyncSession, name: str, taken: set, checked: Dict[str, int]) -> Tuple[str, str]:
+        number = 1
+        while True:
+            if number > checked.get(name, 0):
+                await PostCRUD._check_suffixes(db, [name], taken, checked)
+            candidate, normalized = PostCRUD._suffixed_name(name, number)
+            if normalized not in taken:
+                return candidate, normalized
+            number += 1
 
-            if filters.date_from:
-                date_to_start = filters.date_from.replace(hour=0, minute=0, second=0)
-                conditions.append(models.Post.created >= date_to_start)
+    @staticmethod
+    async def bulk_create(
+            db: AsyncSession,
+            posts: List[schemas.PostCreate],
+            owner_id: Optional[int] = None,
+            on_conflict: str = schemas.CONFLICT_FAIL,
+    ) -> List[models.Post]:
+        if not posts:
+            return []
+
+        normalized_names = [models.Post._generate_normalized_name(post.name) for post in posts]
+        taken = await PostCRUD._taken_normalized_names(db, normalized_names)
+        # Номера суффиксов, уже проверенные по базе для каждого имени
+        checked: Dict[str, int] = {}
+        if on_conflict == schemas.CONFLICT_RENAME:
+            conflicting = [post.name for post, name in zip(posts, normalized_names) if name in taken]
+            if conflicting:
+                await PostCRUD._check_suffixes(db, conflicting, taken, checked)
+
+        rows = []
+        conflicts = []
+        for post, normalized_name in zip(posts, normalized_names):
+            name = post.name
+            if normalized_name in taken:
+                if on_conflict == schemas.CONFLICT_SKIP:
+                    continue
+                if on_conflict == schemas.CONFLICT_RENAME:
+                    name, normalized_name = await PostCRUD._rename_unique(db, name, taken, checked)
+                else:
+                    conflicts.append(post.name)
+                    continue
 
-            if filters.date_to:
-                date_to_end = filters.date_to.replace(hour=23, minute=59, second=59)
-                conditions.append(models.Post.created <= date_to_end)
+            taken.add(normalized_name)
+            rows.append({
+                "name": name,
+                "text": post.text,
+                "is_published": True,
+                "user_id": owner_id if owner_id is not None else post.user_id,
+                "normalized_name": normalized_name,
+            })
 
-            if conditions:
-                stmt = stmt.where(and_(*conditions))
+        if conflicts:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Уже есть такие же элементы: {', '.join(conflicts)}"
+            )
+        if not rows:
+            return []
 
-        result = await db.execute(stmt)
-        return result.scalar()
+        # Один многострочный INSERT ... RETURNING вместо flush и refresh на каждый пост
+        stmt = dialect_insert(db, models.Post)
+        if on_conflict == schemas.CONFLICT_SKIP and hasattr(stmt, "on_conflict_do_nothing"):
+            stmt = stmt.on_conflict_do_nothing(index_elements=["normalized_name"])
+        stmt = stmt.returning(models.Post)
+
+        try:
+            result = await db.scalars(stmt, rows)
+            db_posts = list(result.all())
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Уже есть такой же элемент")
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        for db_post in db_posts:
+            # У новых постов изображений нет, отдельный запрос за ними не нужен
+            set_committed_value(db_post, "images", [])
+        search.index_posts(db, db_posts)
+
+        await stats.posts_created(db, db_posts)
+        invalidate_post_caches(db, [post.id for post in db_posts], {post.user_id for post in db_posts})
+        return db_posts
 
     @staticmethod
-    async def bulk_create(db: AsyncSession, posts: List[schemas.PostCreate], owner_id: int) -> List[models.Post]:
-        db_posts = []
+    async def bulk_rename(
+            db: AsyncSession,
+            post_ids: List[int],
+            update_data: schemas.PostUpdate,
+    ) -> Dict[int, str]:
+        # Переименование пачки постов: имена с суффиксами считаются в Python,
+        # конфликты проверяются одним запросом, запись — одним UPDATE
+        results = {post_id: schemas.BULK_NOT_FOUND for post_id in post_ids}
+
+        result = await db.execute(select(models.Post.id, models.Post.user_id).where(models.Post.id.in_(post_ids)))
+        owners = dict(result.all())
+        valid_ids = sorted(owners)
+        if not valid_ids:
+            return results
 
-        for post in posts:
-            temp_post = models.Post(name=post.name)
-            normalized_name = temp_post.normalized_name
-            await models.Post.validate_unique_normalized_name(db, normalized_name)
-
-            db_post = models.Post(
-                name=post.name,
-                text=post.text,
-                is_published=True,
-                user_id=owner_id,
-                normalized_name=normalized_name
+        data_dict = update_data.model_dump(exclude_unset=True)
+        base_name = data_dict.pop("name")
+        base_normalized = models.Post._generate_normalized_name(base_name)
+
+        renames = {}
+        for i, post_id in enumerate(valid_ids):
+            if len(valid_ids) == 1:
+                renames[post_id] = (base_name, base_normalized)
+                continue
+
+            suffix = f"_{i + 1}"
+            if len(base_name) + len(suffix) <= 150:
+                # Суффикс из цифр и "_" при нормализации не меняется
+                renames[post_id] = (base_name + suffix, base_normalized + suffix)
+            else:
+                name = base_name[:150 - len(suffix)] + suffix
+                renames[post_id] = (name, models.Post._generate_normalized_name(name))
+
+        # Посты из пачки сами освобождают свои текущие имена
+        conflict_stmt = select(models.Post.normalized_name).where(
+            models.Post.normalized_name.in_([normalized for _, normalized in renames.values()]),
+            models.Post.id.notin_(valid_ids),
+        )
+        conflict_result = await db.execute(conflict_stmt)
+        taken = set(conflict_result.scalars().all())
+
+        rows = []
+        for post_id, (name, normalized_name) in renames.items():
+            if normalized_name in taken:
+                results[post_id] = schemas.BULK_CONFLICT
+                continue
+            results[post_id] = schemas.BULK_UPDATED
+            rows.append({"id": post_id, "name": name, "normalized_name": normalized_name})
+
+        if not rows:
+            return results
+
+        common_values = {**data_dict, "updated": datetime.utcnow()}
+        publication_delta = None
+        if "is_published" in common_values:
+            publication_delta = await stats.publication_deltas(
+                db, [row["id"] for row in rows], common_values["is_published"]
             )
 
-            db_posts.append(db_post)
         try:
-            db.add_all(db_posts)
-            await db.flush()
-
-            for post in db_posts:
-                await db.refresh(post)
-
-            return db_posts
+            if db.get_bind().dialect.name == "postgresql":
+                renamed = values(
+                    column("id", Integer),
+                    column("name", String),
+                    column("normalized_name", String),
+                    name="renamed",
+                ).data([(row["id"], row["name"], row["normalized_name"]) for row in rows])
+                update_stmt = (
+                    update(models.Post)
+                    .where(models.Post.id == renamed.c.id)
+                    .values(name=renamed.c.name, normalized_name=renamed.c.normalized_name, **common_values)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(update_stmt)
+            else:
+                # Без UPDATE ... FROM VALUES: один executemany по первичному ключу
+                await db.execute(update(models.Post), [{**row, **common_values} for row in rows])
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Уже есть такой же элемент")
         except SQLAlchemyError as e:
             await db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+        if publication_delta is not None:
+            await publication_delta.apply(db)
+        await search.reindex_posts(db, [row["id"] for row in rows])
+        invalidate_post_caches(db, [row["id"] for row in rows], {owners[row["id"]] for row in rows})
+        return results
+
     @staticmethod
     async def bulk_update(db: AsyncSession, post_ids: List[int], update_data: schemas.PostUpdate) -> Tuple[int, int]:
         if not post_ids:
             return 0, 0
 
-        stmt = select(models.Post).where(models.Post.id.in_(post_ids))
-        result = await db.execute(stmt)
-        posts = result.scalars().all()
-
-        valid_ids = [post.id for post in posts]
-
-        if not valid_ids:
-            return 0, 0
-
         data_dict = update_data.model_dump(exclude_unset=True)
-        updated_count = 0
 
         if "name" in data_dict:
-            for i, post in enumerate(posts):
-                try:
-                    unique_name = f"{data_dict['name']}_{i + 1}" if len(posts) > 1 else data_dict['name']
-                    temp_post = models.Post(name=unique_name)
-                    normalized_name = temp_post.normalized_name
-
-                    await models.Post.validate_unique_normalized_name(db, normalized_name, post.id)
+            results = await PostCRUD.bulk_rename(db, post_ids, update_data)
+            matched = sum(1 for status in results.values() if status != schemas.BULK_NOT_FOUND)
+            updated_count = sum(1 for status in results.values() if status == schemas.BULK_UPDATED)
+            return matched, updated_count
 
-                    update_dict = data_dict.copy()
-                    update_dict["name"] = unique_name
-                    update_dict["normalized_name"] = normalized_name
-                    update_dict["updated"] = datetime.utcnow()
-
-                    for field, value in update_dict.items():
-                        setattr(post, field, value)
+        stmt = select(models.Post.id, models.Post.user_id).where(models.Post.id.in_(post_ids))
+        result = await db.execute(stmt)
+        owners = dict(result.all())
+        valid_ids = list(owners)
 
-                    updated_count += 1
-                except HTTPException:
-                    continue
-        else:
-            data_dict["updated"] = datetime.utcnow()
+        if not valid_ids:
+            return 0, 0
 
-            update_dict = {k: v for k, v in data_dict.items() if k not in ["name", "normalized_name"]}
+        data_dict["updated"] = datetime.utcnow()
+        update_dict = {k: v for k, v in data_dict.items() if k not in ["name", "normalized_name"]}
+        update_stmt = (
+            update(models.Post)
+            .where(models.Post.id.in_(valid_ids))
+            .values(**update_dict)
+        )
 
-            if update_dict:
-                update_stmt = (
-                    update(models.Post)
-                    .where(models.Post.id.in_(valid_ids))
-                    .values(**update_dict)
-                )
+        publication_delta = None
+        if "is_published" in update_dict:
+            publication_delta = await stats.publication_deltas(db, valid_ids, update_dict["is_published"])
 
-                try:
-                    result = await db.execute(update_stmt)
-                    updated_count = result.rowcount
-                except SQLAlchemyError as e:
-                    await db.rollback()
-                    raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        try:
+            result = await db.execute(update_stmt)
+            updated_count = result.rowcount
+            if publication_delta is not None:
+                await publication_delta.apply(db)
+            if "text" in update_dict:
+                await search.reindex_posts(db, valid_ids)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
         try:
             await db.flush()
+            invalidate_post_caches(db, valid_ids, set(owners.values()))
             return len(valid_ids), updated_count
         except SQLAlchemyError as e:
             await db.rollback()
@@ -265,10 +552,14 @@ class PostCRUD:
         if not post_ids:
             return 0
 
+        snapshot = await stats.snapshot_posts(db, post_ids)
         delete_stmt = delete(models.Post).where(models.Post.id.in_(post_ids))
         result = await db.execute(delete_stmt)
         try:
             await db.flush()
+            await stats.posts_deleted(db, snapshot)
+            invalidate_post_caches(db, post_ids, {row.user_id for row in snapshot})
+            search.unindex_posts(db, post_ids)
 
             return result.rowcount
         except SQLAlchemyError as e:
@@ -277,54 +568,7 @@ class PostCRUD:
 
     @staticmethod
     async def get_post_stats(db: AsyncSession, user_id: Optional[int] = None) -> Dict[str, Any]:
-        conditions = []
-        if user_id is not None:
-            conditions.append(models.Post.user_id == user_id)
-
-        total_stmt = select(func.count(models.Post.id))
-        published_stmt = select(func.count(models.Post.id)).where(models.Post.is_published == True)
-
-        if conditions:
-            where_clause = and_(*conditions)
-            total_stmt = total_stmt.where(where_clause)
-            published_stmt = published_stmt.where(and_(models.Post.is_published == True, where_clause))
-
-        total_result = await db.execute(total_stmt)
-        total_posts = total_result.scalar() or 0
-
-        published_result = await db.execute(published_stmt)
-        published_posts = published_result.scalar() or 0
-
-        posts_by_month_stmt = (
-            select(
-                func.extract("year", models.Post.created).label("year"),
-                func.extract("month", models.Post.created).label("month"),
-                func.count(models.Post.id).label("count"),
-            )
-            .group_by("year", "month")
-            .order_by("year", "month")
-        )
-
-        if user_id:
-            posts_by_month_stmt = posts_by_month_stmt.where(models.Post.user_id == user_id)
-
-        posts_by_month_result = await db.execute(posts_by_month_stmt)
-        posts_by_month = []
-        for row in posts_by_month_result.all():
-            year = int(row.year) if row.year else 0
-            month = int(row.month) if row.month else 0
-            count = int(row.count) if row.count else 0
-            posts_by_month.append({
-                "year": year,
-                "month": month,
-                "count": count
-            })
-
-        return {
-            "total_posts": total_posts,
-            "published_posts": published_posts,
-            "posts_by_month": posts_by_month,
-        }
+        return await stats.get_stats(db, user_id)
 
 class PostImageCRUD:
     @staticmethod
@@ -336,7 +580,11 @@ class PostImageCRUD:
         db_image = models.PostImage(post_id=post_id)
         try:
             await db_image.save_image(image_file, db)
+            if db_image.processing_status == models.IMAGE_PENDING:
+                await jobs.image_jobs.enqueue(db, db_image.id)
             await db.refresh(db_image)
+            await stats.images_changed(db, post.user_id, 1)
+            invalidate_post_caches(db, [post_id], [post.user_id], counts=False)
             return db_image
         except SQLAlchemyError as e:
             await db.rollback()
@@ -350,9 +598,14 @@ class PostImageCRUD:
 
         if not db_image:
             return False
+
+        user_result = await db.execute(select(models.Post.user_id).where(models.Post.id == db_image.post_id))
+        user_id = user_result.scalar_one()
         try:
             await db.delete(db_image)
             await db.flush()
+            await stats.images_changed(db, user_id, -1)
+            invalidate_post_caches(db, [db_image.post_id], [user_id], counts=False)
             return True
         except SQLAlchemyError as e:
             await db.rollback()
@@ -26,6 +26,18 @@ AsyncSessionFactory = async_sessionmaker(
 
 Base = declarative_base()
 
+
+def dialect_insert(session: AsyncSession, entity):
+    # INSERT с поддержкой ON CONFLICT там, где диалект его умеет
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy import insert
+    return insert(entity)
+
 # Dependency для получения асинхронной сессии БД
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionFactory() as session:
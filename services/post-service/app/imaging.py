@@ -0,0 +1,30 @@
+import posixpath
+from typing import Dict
+
+from common.imaging import ImageProcessor, ImageVariant
+from config import settings
+
+# Варианты изображения поста: имя -> размер и формат (см. common.imaging.ImageVariant)
+IMAGE_VARIANTS: Dict[str, ImageVariant] = {
+    "thumb": ImageVariant((300, 300)),
+    "medium": ImageVariant((800, 800)),
+    "thumb_webp": ImageVariant((300, 300), "WEBP"),
+    "medium_webp": ImageVariant((800, 800), "WEBP"),
+}
+
+
+def variant_path(image_path: str, name: str) -> str:
+    # Годится и для локальных путей, и для ключей хранилища
+    directory, filename = posixpath.split(image_path)
+    if IMAGE_VARIANTS[name].format == "WEBP":
+        filename = posixpath.splitext(filename)[0] + ".webp"
+    prefix = name.split("_", 1)[0]
+    return posixpath.join(directory, f"{prefix}_{filename}")
+
+
+# Общий пул процессов сервиса: копии строят фоновые задачи (см. jobs.py)
+image_processor = ImageProcessor(
+    workers=settings.IMAGE_WORKERS,
+    queue_size=settings.IMAGE_QUEUE_SIZE,
+    queue_timeout=settings.IMAGE_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, event
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import AsyncSession, AsyncSessionFactory
+from models import Post, PostImage, ImageJob, POST_IMAGE_BLOB_PREFIX, IMAGE_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_FAILED
+from imaging import image_processor
+from cache import response_cache
+from uploads import blob_store
+
+logger = logging.getLogger(__name__)
+
+# Ключ в session.info: изображения, задачи которых станут доступны после COMMIT
+PENDING_KEY = "image_jobs"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def retry_delay(attempts: int) -> float:
+    # Экспоненциальная задержка между попытками, не больше 5 минут
+    return min(2 ** attempts, 300)
+
+
+async def process_image(image_id: int) -> None:
+    async with AsyncSessionFactory() as db:
+        image = await db.get(PostImage, image_id)
+        if image is None or image.image_path is None:
+            return
+        user_id = await db.scalar(select(Post.user_id).where(Post.id == image.post_id))
+        await image.render_variants()
+        await db.commit()
+    await response_cache.invalidate_posts([image.post_id], [user_id])
+
+
+async def fail_image(db: AsyncSession, image_id: int) -> None:
+    result = await db.execute(
+        update(PostImage)
+        .where(PostImage.id == image_id)
+        .values(processing_status=IMAGE_FAILED)
+        .returning(PostImage.post_id)
+    )
+    post_ids = list(result.scalars())
+    user_ids = []
+    if post_ids:
+        owners = await db.execute(select(Post.user_id).where(Post.id.in_(post_ids)))
+        user_ids = list(owners.scalars())
+    await db.commit()
+    if post_ids:
+        await response_cache.invalidate_posts(post_ids, user_ids)
+
+
+class ImageJobQueue:
+    # Общая часть бэкендов: задача ставится в транзакции запроса,
+    # воркеры узнают о ней после COMMIT
+
+    def __init__(self, workers: int, max_attempts: int):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._tasks: List[asyncio.Task] = []
+
+    async def enqueue(self, db: AsyncSession, image_id: int) -> None:
+        db.info.setdefault(PENDING_KEY, []).append(image_id)
+
+    def committed(self, image_ids: Iterable[int]) -> None:
+        raise NotImplementedError
+
+    async def _worker(self) -> None:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+class MemoryJobQueue(ImageJobQueue):
+    # Очередь в памяти процесса: задачи теряются при перезапуске
+
+    def __init__(self, workers: int, max_attempts: int):
+        super().__init__(workers, max_attempts)
+        self._queue: Optional[asyncio.Queue] = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def committed(self, image_ids: Iterable[int]) -> None:
+        queue = self._get_queue()
+        for image_id in image_ids:
+            queue.put_nowait((image_id, 0))
+
+    async def _worker(self) -> None:
+        queue = self._get_queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            image_id, attempts = await queue.get()
+            try:
+                await process_image(image_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                attempts += 1
+                logger.exception("Ошибка обработки изображения %s, попытка %s", image_id, attempts)
+                if attempts < self.max_attempts:
+                    loop.call_later(retry_delay(attempts), queue.put_nowait, (image_id, attempts))
+                else:
+                    async with AsyncSessionFactory() as db:
+                        await fail_image(db, image_id)
+
+
+class DatabaseJobQueue(ImageJobQueue):
+    # Очередь в таблице ImageJob: задача записывается в одной транзакции с изображением
+    # и переживает перезапуск. Воркеры забирают задачи через SKIP LOCKED (PostgreSQL)
+    # или условный UPDATE по статусу.
+
+    def __init__(self, workers: int, max_attempts: int, poll_interval: float, lock_timeout: int):
+        super().__init__(workers, max_attempts)
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._wakeup: Optional[asyncio.Event] = None
+        self._recovered_at = 0.0
+
+    def _get_wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    async def enqueue(self, db: AsyncSession, image_id: int) -> None:
+        db.add(ImageJob(image_id=image_id, available_at=utcnow()))
+        await super().enqueue(db, image_id)
+
+    def committed(self, image_ids: Iterable[int]) -> None:
+        self._get_wakeup().set()
+
+    async def recover(self) -> None:
+        # Задачи, взятые упавшим воркером, возвращаются в очередь
+        self._recovered_at = time.monotonic()
+        async with AsyncSessionFactory() as db:
+            await db.execute(
+                update(ImageJob)
+                .where(
+                    ImageJob.status == JOB_RUNNING,
+                    ImageJob.locked_at < utcnow() - timedelta(seconds=self.lock_timeout),
+                )
+                .values(status=JOB_QUEUED, locked_at=None)
+            )
+            await db.commit()
+
+    async def _claim(self) -> Optional[Tuple[int, int, int]]:
+        async with AsyncSessionFactory() as db:
+            while True:
+                result = await db.execute(
+                    select(ImageJob.id, ImageJob.image_id, ImageJob.attempts)
+                    .where(ImageJob.status == JOB_QUEUED, ImageJob.available_at <= utcnow())
+                    .order_by(ImageJob.available_at, ImageJob.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = result.first()
+                if job is None:
+                    return None
+
+                result = await db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.id == job.id, ImageJob.status == JOB_QUEUED)
+                    .values(status=JOB_RUNNING, locked_at=utcnow(), attempts=ImageJob.attempts + 1)
+                )
+                await db.commit()
+                # Иначе задачу успел забрать другой воркер
+                if result.rowcount == 1:
+                    return job.id, job.image_id, job.attempts + 1
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._get_wakeup().wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            if time.monotonic() - self._recovered_at > self.lock_timeout:
+                await self.recover()
+
+    async def _run(self, job_id: int, image_id: int, attempts: int) -> None:
+        try:
+            await process_image(image_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Ошибка обработки изображения %s, попытка %s", image_id, attempts)
+            exhausted = attempts >= self.max_attempts
+            if exhausted:
+                values = {"status": JOB_FAILED}
+            else:
+                values = {
+                    "status": JOB_QUEUED,
+                    "available_at": utcnow() + timedelta(seconds=retry_delay(attempts)),
+                }
+            async with AsyncSessionFactory() as db:
+                await db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.id == job_id)
+                    .values(locked_at=None, last_error=str(e)[:500], **values)
+                )
+                if exhausted:
+                    await fail_image(db, image_id)
+                else:
+                    await db.commit()
+            return
+
+        async with AsyncSessionFactory() as db:
+            await db.execute(delete(ImageJob).where(ImageJob.id == job_id))
+            await db.commit()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                # Сброс до выборки: уведомление о новой задаче не потеряется
+                self._get_wakeup().clear()
+                job = await self._claim()
+                if job is None:
+                    await self._wait()
+                else:
+                    await self._run(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка воркера очереди изображений")
+                await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        await self.recover()
+        await super().start()
+
+
+async def collect_blobs(db: AsyncSession) -> int:
+    # Ссылки удаленных изображений снимаются по БД, затем удаляются файлы без ссылок
+    result = await db.execute(
+        select(PostImage.id, PostImage.content_hash).where(PostImage.content_hash.is_not(None))
+    )
+    live_refs = [(content_hash, f"{POST_IMAGE_BLOB_PREFIX}{image_id}") for image_id, content_hash in result]
+    await blob_store.prune_refs(POST_IMAGE_BLOB_PREFIX, live_refs)
+    removed = await blob_store.collect_garbage()
+    return len(removed)
+
+
+async def collect_blobs_periodically(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionFactory() as db:
+                await collect_blobs(db)
+        except Exception:
+            logger.exception("Ошибка сборки мусора в хранилище изображений")
+
+
+def _create_queue():
+    workers = settings.IMAGE_JOB_WORKERS or image_processor.workers
+    if settings.IMAGE_JOB_BACKEND == "memory":
+        return MemoryJobQueue(workers, settings.IMAGE_JOB_MAX_ATTEMPTS)
+    return DatabaseJobQueue(
+        workers,
+        settings.IMAGE_JOB_MAX_ATTEMPTS,
+        settings.IMAGE_JOB_POLL_INTERVAL,
+        settings.IMAGE_JOB_LOCK_TIMEOUT,
+    )
+
+
+image_jobs = _create_queue()
+
+
+@event.listens_for(Session, "after_commit")
+def _jobs_committed(session):
+    image_ids = session.info.pop(PENDING_KEY, None)
+    if image_ids:
+        image_jobs.committed(image_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _jobs_rolled_back(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
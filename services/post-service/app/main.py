@@ -1,20 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
-from typing import List
-from sqlalchemy import select, func
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from typing import List, Optional
+from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from database import get_async_session, AsyncSession
+from database import get_async_session, AsyncSession, AsyncSessionFactory
 
 from schemas import (
     PostCreate, PostUpdate, PostResponse,
     PostFilter, PostSort, PaginationParams,
-    PaginationResponse, ImageResponse, PostDetailResponse
+    PaginationResponse, ImageResponse, PostDetailResponse,
+    BulkPostCreate, BulkPostUpdate, BulkUpdateResponse,
+    BULK_UPDATED, BULK_NOT_FOUND, PostStatsResponse,
 )
 
-from models import Post, PostImage
+from models import Post, PostImage, IMAGE_PENDING
+from pagination import decode_cursor, apply_keyset, split_page
+from counting import count_posts, post_count_cache
+from crud import PostCRUD, flush_invalidations, invalidate_post_caches
+from cache import response_cache
+from search import search_engine
+from config import settings
+import stats
+from imaging import image_processor
+from jobs import image_jobs, collect_blobs_periodically
+from uploads import media_storage
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+background_tasks = set()
+
+@router.on_event("startup")
+async def build_search_index():
+    async with AsyncSessionFactory() as db:
+        await search_engine.reindex(db)
+
+@router.on_event("startup")
+async def start_stats_reconcile():
+    task = asyncio.create_task(stats.reconcile_periodically(settings.STATS_RECONCILE_INTERVAL))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@router.on_event("startup")
+async def start_image_jobs():
+    await image_jobs.start()
+    task = asyncio.create_task(collect_blobs_periodically(settings.BLOB_GC_INTERVAL))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@router.on_event("shutdown")
+async def stop_image_processor():
+    await image_jobs.stop()
+    image_processor.shutdown()
+    await media_storage.close()
+
 @router.post("/", response_model=PostResponse)
 async def create_post(
         post_data: PostCreate,
@@ -32,68 +75,148 @@ async def create_post(
     )
 
     db.add(post)
+    await db.flush()
+    await stats.posts_created(db, [post])
+    invalidate_post_caches(db, [post.id], [post.user_id])
     await db.commit()
+    await flush_invalidations(db)
     await db.refresh(post)
+    # У нового поста изображений нет: ответ не должен подгружать их лениво
+    set_committed_value(post, "images", [])
 
     return post
 
-@router.get("/", response_model=PaginationResponse)
-async def get_posts(
-        filter_params: PostFilter = Depends(),
-        sort_params: PostSort = Depends(),
-        pagination: PaginationParams = Depends(),
+@router.post("/bulk", response_model=List[PostResponse])
+async def bulk_create_posts(
+        bulk_data: BulkPostCreate,
         db: AsyncSession = Depends(get_async_session),
 ):
-    query = select(Post).options(selectinload(Post.images))
+    posts = await PostCRUD.bulk_create(db, bulk_data.posts, on_conflict=bulk_data.on_conflict)
+    await db.commit()
+    await flush_invalidations(db)
+    return posts
 
-    if filter_params.search:
-        query = query.where(
-            (Post.name.ilike(f"%{filter_params.search}%")) |
-            (Post.text.ilike(f"%{filter_params.search}%"))
+@router.patch("/bulk", response_model=BulkUpdateResponse)
+async def bulk_update_posts(
+        bulk_data: BulkPostUpdate,
+        db: AsyncSession = Depends(get_async_session),
+):
+    if "name" in bulk_data.data.model_fields_set:
+        results = await PostCRUD.bulk_rename(db, bulk_data.post_ids, bulk_data.data)
+        await db.commit()
+        await flush_invalidations(db)
+        return BulkUpdateResponse(
+            matched=sum(1 for status in results.values() if status != BULK_NOT_FOUND),
+            updated=sum(1 for status in results.values() if status == BULK_UPDATED),
+            results=results,
         )
 
-    if filter_params.is_published is not None:
-        query = query.where(Post.is_published == filter_params.is_published)
-
-    if filter_params.user_id is not None:
-        query = query.where(Post.user_id == filter_params.user_id)
+    matched, updated = await PostCRUD.bulk_update(db, bulk_data.post_ids, bulk_data.data)
+    await db.commit()
+    await flush_invalidations(db)
+    return BulkUpdateResponse(matched=matched, updated=updated)
+
+async def _load_posts_page(
+        db: AsyncSession,
+        filter_params: PostFilter,
+        sort_params: PostSort,
+        pagination: PaginationParams,
+) -> PaginationResponse:
+    conditions = PostCRUD.filter_conditions(filter_params)
+    query = PostCRUD.list_query()
+    if conditions:
+        query = query.where(and_(*conditions))
+
+    total = total_pages = None
+    total_is_estimate = False
+    if pagination.count_total:
+        total, total_is_estimate = await count_posts(
+            db, conditions, pagination.count_strategy, filter_params
+        )
+        total_pages = (total + pagination.per_page - 1) // pagination.per_page
 
-    if filter_params.date_from:
-        query = query.where(Post.created >= filter_params.date_from)
+    if pagination.use_cursor:
+        cursor = decode_cursor(pagination.cursor, sort_params) if pagination.cursor else None
+        query = apply_keyset(query, sort_params, cursor, pagination.per_page)
 
-    if filter_params.date_to:
-        query = query.where(Post.created <= filter_params.date_to)
+        result = await db.execute(query)
+        rows, next_cursor, prev_cursor = split_page(
+            result.all(), sort_params, cursor, pagination.per_page
+        )
 
-    order_column = getattr(Post, sort_params.sort_by)
-    if sort_params.sort_order == "desc":
-        query = query.order_by(order_column.desc())
-    else:
-        query = query.order_by(order_column.asc())
+        return PaginationResponse(
+            items=[PostCRUD.to_list_item(row) for row in rows],
+            total=total,
+            total_is_estimate=total_is_estimate,
+            per_page=pagination.per_page,
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+    query = query.order_by(*PostCRUD.order_by(sort_params, filter_params))
 
     offset = (pagination.page - 1) * pagination.per_page
     query = query.offset(offset).limit(pagination.per_page)
 
     result = await db.execute(query)
-    posts = result.scalars().all()
 
     return PaginationResponse(
-        items=posts,
+        items=[PostCRUD.to_list_item(row) for row in result.all()],
         total=total,
+        total_is_estimate=total_is_estimate,
         page=pagination.page,
         per_page=pagination.per_page,
-        total_pages=(total + pagination.per_page - 1) // pagination.per_page
+        total_pages=total_pages
     )
 
 
+@router.get("/", response_model=PaginationResponse)
+async def get_posts(
+        filter_params: PostFilter = Depends(),
+        sort_params: PostSort = Depends(),
+        pagination: PaginationParams = Depends(),
+        db: AsyncSession = Depends(get_async_session),
+):
+    cache_params = json.dumps({
+        "filter": post_count_cache.make_key(filter_params),
+        "sort": sort_params.model_dump(),
+        "pagination": pagination.model_dump(),
+    }, sort_keys=True)
+
+    cached = await response_cache.get_listing(cache_params, filter_params.user_id)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    page = await _load_posts_page(db, filter_params, sort_params, pagination)
+    payload = page.model_dump_json()
+    await response_cache.set_listing(cache_params, payload, filter_params.user_id)
+
+    return Response(content=payload, media_type="application/json")
+
+
+@router.get("/stats", response_model=PostStatsResponse)
+async def get_post_stats(
+        user_id: Optional[int] = Query(None, description="Статистика одного пользователя"),
+        db: AsyncSession = Depends(get_async_session),
+):
+    return await stats.get_stats(db, user_id)
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return response_cache.metrics()
+
+
 @router.get("/{post_id}", response_model=PostDetailResponse)
 async def get_post(
         post_id: int,
         db: AsyncSession = Depends(get_async_session)
 ):
+    cached = await response_cache.get_post(post_id)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     query = select(Post).options(selectinload(Post.images)).where(Post.id == post_id)
     result = await db.execute(query)
     post = result.scalar_one_or_none()
@@ -101,7 +224,10 @@ async def get_post(
     if not post:
         raise HTTPException(status_code=404, detail="Пост не найден")
 
-    return post
+    payload = PostDetailResponse.model_validate(post).model_dump_json()
+    await response_cache.set_post(post_id, payload)
+
+    return Response(content=payload, media_type="application/json")
 
 
 @router.patch("/{post_id}", response_model=PostResponse)
@@ -125,11 +251,16 @@ async def update_post(
         await Post.validate_unique_normalized_name(db, new_normalized, post_id)
         update_dict['normalized_name'] = new_normalized
 
+    if 'is_published' in update_dict and update_dict['is_published'] != post.is_published:
+        await stats.publication_changed(db, post.user_id, update_dict['is_published'])
+
     for field, value in update_dict.items():
         setattr(post, field, value)
 
+    invalidate_post_caches(db, [post.id], [post.user_id])
     await db.commit()
-    await db.refresh(post)
+    await flush_invalidations(db)
+    await db.refresh(post, ["updated", "images"])
 
     return post
 
@@ -146,8 +277,13 @@ async def delete_post(
     if not post:
         raise HTTPException(status_code=404, detail="Пост не найден")
 
+    snapshot = await stats.snapshot_posts(db, [post_id])
     await db.delete(post)
+    await db.flush()
+    await stats.posts_deleted(db, snapshot)
+    invalidate_post_caches(db, [post_id], [post.user_id])
     await db.commit()
+    await flush_invalidations(db)
 
     return {"message": "Пост успешно удален"}
 
@@ -168,6 +304,12 @@ async def upload_post_image(
     post_image = PostImage(post_id=post_id)
 
     await post_image.save_image(image_file, db)
+    if post_image.processing_status == IMAGE_PENDING:
+        await image_jobs.enqueue(db, post_image.id)
+    await stats.images_changed(db, post.user_id, 1)
+    invalidate_post_caches(db, [post_id], [post.user_id], counts=False)
+    await db.commit()
+    await flush_invalidations(db)
 
     return post_image
 
@@ -1,35 +1,46 @@
-import os
 import re
-import uuid
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, ClassVar
-from urllib.parse import urljoin
-
-import aiofiles
-from aiofiles.os import makedirs
+from typing import Dict, Optional
+
 from fastapi import HTTPException, UploadFile
-from sqlalchemy import Boolean, String, Integer, DateTime, ForeignKey, select
+from sqlalchemy import Boolean, String, Integer, DateTime, ForeignKey, JSON, select
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
-from sqlalchemy import exists
+from sqlalchemy import event, DDL, Index, text as sa_text
 from transliterate import translit
 from database import AsyncSession, Base
-from PIL import Image
+from imaging import image_processor, variant_path, IMAGE_VARIANTS
+from uploads import stream_upload, blob_store, media_storage
 from datetime import datetime, timezone
 
 ONLY_LETTERS_REGEX = re.compile(r"\W")
 
-ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
+def utcnow() -> datetime:
+    # Колонки DateTime без часового пояса: время в UTC без tzinfo
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
-async def get_path_image(filename: str) -> str:
-    if '.' in filename:
-        name, ext = filename.rsplit('.', 1)
-        return f"posts/{uuid.uuid4()}.{ext.lower()}"
-    return f"posts/{uuid.uuid4()}.jpg"
+def media_url(path: Optional[str]) -> Optional[str]:
+    # path - ключ в хранилище медиа (см. uploads.media_storage)
+    if path:
+        return media_storage.url(path)
+    return None
 
 
 class Post(Base):
     __tablename__ = "Post"
+    __table_args__ = (
+        # Лента: фильтр по is_published, сортировка по created с id для курсора
+        Index("ix_Post_is_published_created_id", "is_published", sa_text("created DESC"), "id"),
+        # Посты пользователя
+        Index("ix_Post_user_id_created", "user_id", sa_text("created DESC")),
+        # Только опубликованные: основной запрос главной страницы
+        Index(
+            "ix_Post_published_created_id",
+            sa_text("created DESC"),
+            sa_text("id DESC"),
+            postgresql_where=sa_text("is_published"),
+            sqlite_where=sa_text("is_published = 1"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -48,25 +59,26 @@ class Post(Base):
     normalized_name: Mapped[str] = mapped_column(
         String(150),
         nullable=False,
+        unique=True,
         index=True,
         comment="Нормализованное название"
     )
 
-    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
-    text: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    text: Mapped[str] = mapped_column(String, nullable=False)
 
     created: Mapped[datetime] = mapped_column(
         DateTime,
         nullable=False,
         index=True,
-        default=datetime.now(timezone.utc)
+        default=utcnow
     )
     updated: Mapped[datetime] = mapped_column(
         DateTime,
         nullable=False,
         index=True,
-        default=datetime.now(timezone.utc),
-        onupdate=datetime.now(timezone.utc)
+        default=utcnow,
+        onupdate=utcnow
     )
 
     images: Mapped[list["PostImage"]] = relationship(
@@ -92,14 +104,15 @@ class Post(Base):
         if obj_id:
             stmt = stmt.where(cls.id != obj_id)
 
-        result = await db.execute(select(exists().where(stmt)))
+        result = await db.execute(select(stmt.exists()))
         if result.scalar():
             raise HTTPException(
                 status_code=400,
                 detail="Уже есть такой же элемент"
             )
 
-    def _generate_normalized_name(self, name: str) -> str:
+    @staticmethod
+    def _generate_normalized_name(name: str) -> str:
         try:
             transliterated = translit(
                 name.lower(),
@@ -121,6 +134,35 @@ class Post(Base):
         return name
 
 
+# Поисковый вектор поддерживается самим PostgreSQL (generated column),
+# поэтому ORM о нем не знает, а схема для SQLite остается прежней
+POST_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE "Post" ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(text, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_post_search_vector ON "Post" USING GIN (search_vector)',
+    'CREATE INDEX IF NOT EXISTS ix_post_normalized_name_trgm ON "Post" USING GIN (normalized_name gin_trgm_ops)',
+)
+
+for _statement in POST_SEARCH_DDL:
+    event.listen(Post.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+# Владельцы ссылок в хранилище файлов: post-image-<id>
+POST_IMAGE_BLOB_PREFIX = "post-image-"
+
+IMAGE_PENDING = "pending"
+IMAGE_READY = "ready"
+IMAGE_FAILED = "failed"
+
+
 class PostImage(Base):
     __tablename__ = "PostImage"
 
@@ -128,73 +170,150 @@ class PostImage(Base):
 
     image_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     thumbnail_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    # Пути уменьшенных копий по имени варианта (см. imaging.IMAGE_VARIANTS)
+    variants: Mapped[Optional[Dict[str, str]]] = mapped_column(JSON, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True, comment="SHA-256 оригинала")
+    processing_status: Mapped[str] = mapped_column(
+        String(20),
+        nullable=False,
+        default=IMAGE_PENDING,
+        server_default=IMAGE_READY,
+        comment="Статус построения уменьшенных копий",
+    )
 
     post_id: Mapped[int] = mapped_column(Integer, ForeignKey("Post.id", ondelete="CASCADE"), nullable=False, index=True)
 
     post: Mapped["Post"] = relationship("Post", back_populates="images")
 
-    STATIC_DIR: ClassVar[str] = "static"
-    IMAGE_UPLOAD_DIR: ClassVar[str] = "posts/"
-    THUMBNAIL_SIZE: ClassVar[tuple[int, int]] = (300, 300)
-
     @property
     def image_url(self) -> Optional[str]:
-        if self.image_path:
-            return urljoin("/media/", self.image_path)
-        return None
+        return media_url(self.image_path)
 
     @property
     def thumbnail_url(self) -> Optional[str]:
-        if self.thumbnail_path:
-            return urljoin("/media/", self.thumbnail_path)
-        return None
+        # Пока копии строятся, миниатюру отдает /media/resize шлюза
+        if self.thumbnail_path is None and self.image_path:
+            return media_storage.resize_url(self.image_path, *IMAGE_VARIANTS["thumb"].size)
+        return media_url(self.thumbnail_path)
+
+    @property
+    def variant_urls(self) -> Dict[str, str]:
+        return {name: media_url(path) for name, path in (self.variants or {}).items()}
+
+    @property
+    def blob_owner(self) -> str:
+        return f"{POST_IMAGE_BLOB_PREFIX}{self.id}"
 
     async def save_image(self, image_file: UploadFile, db: AsyncSession):
         try:
-            file_extension = os.path.splitext(image_file.filename)[1].lower()
-            if file_extension not in ALLOWED_EXTENSIONS:
-                raise HTTPException(status_code=400, detail="Неподдерживаемый формат файла")
+            # Файл пишется на диск по частям, формат определяется по сигнатуре,
+            # одинаковые файлы хранятся один раз (см. uploads.blob_store)
+            stored = await stream_upload(image_file)
+            self.content_hash = stored.sha256
+            self.image_path = stored.key
+
+            variants = None if stored.created else await self._existing_variants()
+            if variants:
+                self._set_variants(variants)
+            else:
+                # Уменьшенные копии строит фоновая задача (см. jobs.py)
+                self.processing_status = IMAGE_PENDING
+            db.add(self)
+            await db.flush()
+            await blob_store.add_ref(stored.sha256, self.blob_owner)
 
-            MAX_SIZE = 10 * 1024 * 1024  # 10MB
+            return self
+        except Exception as e:
+            await db.rollback()
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(status_code=500, detail=f"Ошибка сохранения изображения: {str(e)}")
 
-            original_filename = image_file.filename
+    def _variant_keys(self) -> Dict[str, str]:
+        return {name: variant_path(self.image_path, name) for name in IMAGE_VARIANTS}
+
+    async def _existing_variants(self) -> Optional[Dict[str, str]]:
+        # Уменьшенные копии, уже построенные для того же содержимого, если есть все
+        keys = self._variant_keys()
+        for key in keys.values():
+            if not await media_storage.exists(key):
+                return None
+        return keys
+
+    def _set_variants(self, keys: Dict[str, str]) -> None:
+        self.variants = keys
+        self.thumbnail_path = keys["thumb"]
+        self.processing_status = IMAGE_READY
+
+    async def render_variants(self) -> None:
+        keys = self._variant_keys()
+        missing = [name for name, key in keys.items() if not await media_storage.exists(key)]
+        if missing:
+            # Все размеры из одного декодирования локальной копии в общем пуле процессов
+            async with media_storage.fetch(self.image_path) as source_path:
+                paths = {name: variant_path(source_path, name) for name in missing}
+                await image_processor.render(source_path, [(IMAGE_VARIANTS[name], paths[name]) for name in missing])
+                for name in missing:
+                    await media_storage.write_file(keys[name], paths[name])
+        self._set_variants(keys)
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FAILED = "failed"
+
+
+class ImageJob(Base):
+    __tablename__ = "ImageJob"
+    __table_args__ = (
+        # Выборка следующей задачи воркером
+        Index("ix_ImageJob_status_available_at", "status", "available_at"),
+    )
 
-            content = await image_file.read()
-            if len(content) > MAX_SIZE:
-                raise HTTPException(status_code=400, detail="Файл слишком большой")
+    id: Mapped[int] = mapped_column(primary_key=True)
+    image_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("PostImage.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default=JOB_QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, comment="Не раньше этого времени (UTC)")
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, comment="Взята воркером (UTC)")
 
-            filename = await get_path_image(original_filename)
+# Счетчики статистики по пользователям
+class PostStatsCounter(Base):
+    __tablename__ = "PostStatsCounter"
 
-            image_path = os.path.join(self.STATIC_DIR, self.IMAGE_UPLOAD_DIR, filename)
-            await makedirs(os.path.dirname(image_path), exist_ok=True)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment="ID пользователя")
+    total_posts: Mapped[int] = mapped_column(Integer, default=0, nullable=False, index=True)
+    published_posts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_images: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
-            async with aiofiles.open(image_path, 'wb') as out_file:
-                await out_file.write(content)
 
-            thumbnail_path = os.path.join(self.STATIC_DIR, self.IMAGE_UPLOAD_DIR, f"thumb_{filename}")
-            await self._create_thumbnail(image_path, thumbnail_path)
+class PostMonthlyStats(Base):
+    __tablename__ = "PostMonthlyStats"
 
-            self.image_path = os.path.join(self.IMAGE_UPLOAD_DIR, filename)
-            self.thumbnail_path = os.path.join(self.IMAGE_UPLOAD_DIR, f"thumb_{filename}")
-            await db.flush()
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment="ID пользователя")
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
-            return self
-        except Exception as e:
-            await db.rollback()
-            raise HTTPException(status_code=500, detail=f"Ошибка сохранения изображения: {str(e)}")
 
-    async def _create_thumbnail(self, original_path: str, thumbnail_path: str):
-        def create_thumbnail_sync():
-            with Image.open(original_path) as image:
-                image.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                ext = os.path.splitext(original_path)[1].lower()
-                if ext in ['.jpg', '.jpeg']:
-                    image.save(thumbnail_path, "JPEG", quality=85)
-                elif ext == '.png':
-                    image.save(thumbnail_path, "PNG")
-                else:
-                    image.save(thumbnail_path)
-
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as pool:
-            await loop.run_in_executor(pool, create_thumbnail_sync)
\ No newline at end of file
+# Общие счетчики, разбитые на STATS_SHARDS строк: запись меняет строку шарда
+# своего пользователя, общая статистика - сумма нескольких строк
+class PostStatsShard(Base):
+    __tablename__ = "PostStatsShard"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    total_posts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    published_posts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_images: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class PostMonthlyShard(Base):
+    __tablename__ = "PostMonthlyShard"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
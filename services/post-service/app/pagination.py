@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Select, DateTime, or_, and_
+
+from models import Post
+from schemas import PostSort
+
+CURSOR_NEXT = "next"
+CURSOR_PREV = "prev"
+
+
+class PageCursor(BaseModel):
+    # Позиция в ленте: значение ключа сортировки и id последней/первой записи
+    sort_by: str
+    sort_order: str
+    value: Any
+    id: int
+    direction: str = CURSOR_NEXT
+
+
+def _sort_column(sort: PostSort):
+    if sort.sort_by == "relevance":
+        raise HTTPException(
+            status_code=400,
+            detail="Курсорная пагинация не поддерживает сортировку по релевантности",
+        )
+    return getattr(Post, sort.sort_by)
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _load_value(sort: PostSort, value: Any) -> Any:
+    column = _sort_column(sort)
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def encode_cursor(item: Any, sort: PostSort, direction: str) -> str:
+    payload = PageCursor(
+        sort_by=sort.sort_by,
+        sort_order=sort.sort_order,
+        value=_dump_value(getattr(item, sort.sort_by)),
+        id=item.id,
+        direction=direction,
+    )
+    raw = json.dumps(payload.model_dump(), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: PostSort) -> PageCursor:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor = PageCursor(**json.loads(base64.urlsafe_b64decode(padded)))
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+    if cursor.sort_by != sort.sort_by or cursor.sort_order != sort.sort_order:
+        raise HTTPException(status_code=400, detail="Курсор не соответствует параметрам сортировки")
+    if cursor.direction not in (CURSOR_NEXT, CURSOR_PREV):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+    cursor.value = _load_value(sort, cursor.value)
+    return cursor
+
+
+def apply_keyset(stmt: Select, sort: PostSort, cursor: Optional[PageCursor], limit: int) -> Select:
+    # Пагинация по ключу (sort_by, id): условие по индексу вместо OFFSET,
+    # стоимость страницы не зависит от ее глубины
+    column = _sort_column(sort)
+    descending = sort.sort_order == "desc"
+    if cursor is not None and cursor.direction == CURSOR_PREV:
+        descending = not descending
+
+    if cursor is not None:
+        if sort.sort_by == "id":
+            stmt = stmt.where(Post.id < cursor.id if descending else Post.id > cursor.id)
+        elif descending:
+            stmt = stmt.where(or_(
+                column < cursor.value,
+                and_(column == cursor.value, Post.id < cursor.id),
+            ))
+        else:
+            stmt = stmt.where(or_(
+                column > cursor.value,
+                and_(column == cursor.value, Post.id > cursor.id),
+            ))
+
+    if sort.sort_by == "id":
+        order_by = [Post.id.desc() if descending else Post.id.asc()]
+    elif descending:
+        order_by = [column.desc(), Post.id.desc()]
+    else:
+        order_by = [column.asc(), Post.id.asc()]
+
+    # Одна лишняя строка показывает, есть ли следующая страница
+    return stmt.order_by(None).order_by(*order_by).limit(limit + 1)
+
+
+def split_page(
+        rows: Sequence[Any],
+        sort: PostSort,
+        cursor: Optional[PageCursor],
+        limit: int,
+) -> Tuple[List[Any], Optional[str], Optional[str]]:
+    items = list(rows[:limit])
+    has_more = len(rows) > limit
+
+    if cursor is not None and cursor.direction == CURSOR_PREV:
+        items.reverse()
+        next_cursor = encode_cursor(items[-1], sort, CURSOR_NEXT) if items else None
+        prev_cursor = encode_cursor(items[0], sort, CURSOR_PREV) if items and has_more else None
+    else:
+        next_cursor = encode_cursor(items[-1], sort, CURSOR_NEXT) if items and has_more else None
+        prev_cursor = encode_cursor(items[0], sort, CURSOR_PREV) if items and cursor is not None else None
+
+    return items, next_cursor, prev_cursor
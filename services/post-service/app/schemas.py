@@ -27,6 +27,8 @@ class ImageResponse(ImageBase, BaseResponseSchema):
     id: int
     image_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
+    variant_urls: Dict[str, str] = {}
+    processing_status: str = Field(..., description="pending, ready или failed")
     post_id: int
 
     @field_validator('image_url', 'thumbnail_url', mode="before")
@@ -65,6 +67,14 @@ class PostUpdate(BaseModel):
             raise ValueError(f'Поле не может быть пустым')
         return v
 
+    @model_validator(mode='after')
+    def check_not_null(self) -> 'PostUpdate':
+        # Поле можно не передавать, но null в него записать нельзя
+        for field in ('name', 'text', 'is_published'):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f'Поле {field} не может быть null')
+        return self
+
 class PostResponse(PostBase, BaseResponseSchema):
     id: int
     normalized_name: str
@@ -102,7 +112,7 @@ class PostSort(BaseModel):
     @field_validator("sort_by")
     @classmethod
     def validate_sort_field(cls, v):
-        allowed_fields = ["id", "name", "created", "updated", "user_id"]
+        allowed_fields = ["id", "name", "created", "updated", "user_id", "relevance"]
         if v not in allowed_fields:
             raise ValueError(f"Допустимые поля для сортировки: {', '.join(allowed_fields)}")
         return v
@@ -118,13 +128,50 @@ class PostSort(BaseModel):
 class PaginationParams(BaseModel):
     page: int = Field(default=1, ge=1, description="Номер страницы")
     per_page: int = Field(default=20, ge=1, le=100, description="Количество элементов на странице")
+    mode: str = Field(default="page", description="Режим пагинации (page/cursor)")
+    cursor: Optional[str] = Field(None, description="Курсор страницы для режима cursor")
+    with_total: Optional[bool] = Field(
+        default=None,
+        description="Считать ли общее количество постов (по умолчанию - только в режиме page)",
+    )
+    count_strategy: str = Field(default="exact", description="Способ подсчета (exact/estimate/cached)")
+
+    @field_validator("mode")
+    @classmethod
+    def validate_mode(cls, v: str) -> str:
+        v_lower = v.lower()
+        if v_lower not in ["page", "cursor"]:
+            raise ValueError('Режим пагинации должен быть "page" или "cursor"')
+        return v_lower
+
+    @field_validator("count_strategy")
+    @classmethod
+    def validate_count_strategy(cls, v: str) -> str:
+        v_lower = v.lower()
+        if v_lower not in ["exact", "estimate", "cached"]:
+            raise ValueError('Способ подсчета должен быть "exact", "estimate" или "cached"')
+        return v_lower
+
+    @property
+    def use_cursor(self) -> bool:
+        return self.mode == "cursor" or self.cursor is not None
+
+    @property
+    def count_total(self) -> bool:
+        # Курсорной ленте общее количество не нужно: COUNT - только по запросу
+        if self.with_total is None:
+            return not self.use_cursor
+        return self.with_total
 
 class PaginationResponse(BaseModel):
     items: List[PostListResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    page: Optional[int] = None
     per_page: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 class PostDetailResponse(PostResponse):
     image_count: int = 0
@@ -134,8 +181,21 @@ class PostDetailResponse(PostResponse):
         self.image_count = len(self.images)
         return self
 
+CONFLICT_FAIL = "fail"
+CONFLICT_SKIP = "skip"
+CONFLICT_RENAME = "rename"
+
 class BulkPostCreate(BaseModel):
     posts: List[PostCreate] = Field(..., max_items=100, description="Список постов")
+    on_conflict: str = Field(default=CONFLICT_FAIL, description="Совпадение normalized_name (fail/skip/rename)")
+
+    @field_validator("on_conflict")
+    @classmethod
+    def validate_on_conflict(cls, v: str) -> str:
+        v_lower = v.lower()
+        if v_lower not in [CONFLICT_FAIL, CONFLICT_SKIP, CONFLICT_RENAME]:
+            raise ValueError('on_conflict должен быть "fail", "skip" или "rename"')
+        return v_lower
 
     @field_validator("posts")
     @classmethod
@@ -149,6 +209,15 @@ class BulkPostUpdate(BaseModel):
     post_ids: List[int] = Field(..., max_items=100, description="ID постов для обновления")
     data: PostUpdate
 
+BULK_UPDATED = "updated"
+BULK_CONFLICT = "conflict"
+BULK_NOT_FOUND = "not_found"
+
+class BulkUpdateResponse(BaseModel):
+    matched: int
+    updated: int
+    results: Dict[int, str] = Field(default_factory=dict, description="Результат по каждому ID")
+
 class PostStatsResponse(BaseModel):
     total_posts: int
     published_posts: int
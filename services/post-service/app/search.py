@@ -0,0 +1,220 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, func, case, event, false, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import TSVECTOR, REGCONFIG
+from sqlalchemy.orm import Session, object_session
+from transliterate import translit
+
+from config import settings
+from database import AsyncSession, engine
+from models import Post
+
+TOKEN_REGEX = re.compile(r"[^\W_]+", re.UNICODE)
+
+NAME_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+
+def _transliterations(value: str) -> Set[str]:
+    # Исходная строка и ее варианты в кириллице и латинице
+    value = value.lower()
+    variants = {value}
+    for reversed_ in (True, False):
+        try:
+            variants.add(translit(value, "ru", reversed=reversed_).lower())
+        except Exception:
+            pass
+    return variants
+
+
+def tokenize(value: str) -> List[str]:
+    return TOKEN_REGEX.findall(value.lower()) if value else []
+
+
+class PostgresSearchEngine:
+    # Поиск по generated-колонке search_vector (GIN) и триграммам normalized_name
+
+    search_vector = literal_column('"Post".search_vector', type_=TSVECTOR)
+
+    def _ts_query(self, query: str):
+        ts_query = None
+        for variant in sorted(_transliterations(query)):
+            for config in ("russian", "english"):
+                part = func.websearch_to_tsquery(literal(config, REGCONFIG), variant)
+                ts_query = part if ts_query is None else ts_query.op("||")(part)
+        return ts_query
+
+    def condition(self, query: str):
+        normalized = Post._generate_normalized_name(query)
+        return or_(
+            self.search_vector.op("@@")(self._ts_query(query)),
+            Post.normalized_name.op("%")(normalized),
+        )
+
+    def rank(self, query: str):
+        normalized = Post._generate_normalized_name(query)
+        return (
+            func.ts_rank_cd(self.search_vector, self._ts_query(query))
+            + func.similarity(Post.normalized_name, normalized)
+        )
+
+    def add(self, post_id: int, name: str, text: str) -> None:
+        pass
+
+    def remove(self, post_ids: Iterable[int]) -> None:
+        pass
+
+    async def reindex(self, db: AsyncSession, post_ids: Optional[Iterable[int]] = None) -> None:
+        pass
+
+
+class MemorySearchIndex:
+    # Инвертированный индекс в памяти процесса: для SQLite и тестов
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._documents: Dict[int, Set[str]] = {}
+
+    def add(self, post_id: int, name: str, text: str) -> None:
+        self.remove([post_id])
+
+        weights: Dict[str, float] = defaultdict(float)
+        for token in tokenize(name):
+            for variant in _transliterations(token):
+                weights[variant] += NAME_WEIGHT
+        for token in tokenize(text):
+            weights[token] += TEXT_WEIGHT
+
+        length_norm = 1.0 / math.sqrt(sum(weights.values()) or 1.0)
+        for token, weight in weights.items():
+            self._postings[token][post_id] = weight * length_norm
+        self._documents[post_id] = set(weights)
+
+    def remove(self, post_ids: Iterable[int]) -> None:
+        for post_id in post_ids:
+            for token in self._documents.pop(post_id, ()):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(post_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def search(self, query: str) -> Dict[int, float]:
+        # Все слова запроса должны встретиться (в любой транслитерации)
+        scores: Optional[Dict[int, float]] = None
+        for token in tokenize(query):
+            matches: Dict[int, float] = defaultdict(float)
+            for variant in _transliterations(token):
+                for post_id, weight in self._postings.get(variant, {}).items():
+                    matches[post_id] = max(matches[post_id], weight)
+
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {
+                    post_id: score + matches[post_id]
+                    for post_id, score in scores.items()
+                    if post_id in matches
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+    def condition(self, query: str):
+        post_ids = list(self.search(query))
+        if not post_ids:
+            return false()
+        return Post.id.in_(post_ids)
+
+    def rank(self, query: str):
+        scores = self.search(query)
+        if not scores:
+            return literal_column("0.0")
+        return case(scores, value=Post.id, else_=0.0)
+
+    async def reindex(self, db: AsyncSession, post_ids: Optional[Iterable[int]] = None) -> None:
+        stmt = select(Post.id, Post.name, Post.text)
+        if post_ids is not None:
+            post_ids = list(post_ids)
+            self.remove(post_ids)
+            stmt = stmt.where(Post.id.in_(post_ids))
+        else:
+            self._postings.clear()
+            self._documents.clear()
+
+        result = await db.execute(stmt)
+        for row in result.all():
+            self.add(row.id, row.name, row.text)
+
+
+def _select_engine():
+    backend = settings.SEARCH_BACKEND
+    if backend == "auto":
+        backend = "postgres" if engine.dialect.name == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresSearchEngine()
+    return MemorySearchIndex()
+
+
+search_engine = _select_engine()
+
+
+# Изменения индекса копятся в сессии и применяются после фиксации транзакции:
+# откат не должен оставлять в индексе несуществующие посты или терять удаленные
+PENDING_INDEX_KEY = "pending_search_index"
+
+
+def _pending(session) -> Dict[int, Optional[Tuple[str, str]]]:
+    return session.info.setdefault(PENDING_INDEX_KEY, {})
+
+
+def index_posts(session, posts: Iterable) -> None:
+    pending = _pending(session)
+    for post in posts:
+        pending[post.id] = (post.name, post.text)
+
+
+def unindex_posts(session, post_ids: Iterable[int]) -> None:
+    pending = _pending(session)
+    for post_id in post_ids:
+        pending[post_id] = None
+
+
+async def reindex_posts(db: AsyncSession, post_ids: Iterable[int]) -> None:
+    # Текущие значения из транзакции: после UPDATE в обход ORM
+    post_ids = list(post_ids)
+    result = await db.execute(select(Post.id, Post.name, Post.text).where(Post.id.in_(post_ids)))
+    rows = result.all()
+    index_posts(db, rows)
+    unindex_posts(db, set(post_ids) - {row.id for row in rows})
+
+
+@event.listens_for(Post, "after_insert")
+@event.listens_for(Post, "after_update")
+def _index_post(mapper, connection, target):
+    index_posts(object_session(target), [target])
+
+
+@event.listens_for(Post, "after_delete")
+def _unindex_post(mapper, connection, target):
+    unindex_posts(object_session(target), [target.id])
+
+
+@event.listens_for(Session, "after_commit")
+def _index_committed(session):
+    pending = session.info.pop(PENDING_INDEX_KEY, None)
+    if not pending:
+        return
+    search_engine.remove([post_id for post_id, document in pending.items() if document is None])
+    for post_id, document in pending.items():
+        if document is not None:
+            search_engine.add(post_id, *document)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _index_rolled_back(session, previous_transaction):
+    session.info.pop(PENDING_INDEX_KEY, None)
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, extract
+
+from config import settings
+from database import AsyncSession, AsyncSessionFactory, dialect_insert
+from models import Post, PostImage, PostStatsCounter, PostMonthlyStats, PostStatsShard, PostMonthlyShard
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("total_posts", "published_posts", "total_images")
+# Строк в одном UPSERT: у asyncpg не больше 32767 параметров на запрос
+WRITE_BATCH = 1000
+# Ключ pg_advisory_xact_lock: сверки идут по одной
+RECONCILE_LOCK_ID = 7_305_009
+
+
+def _counters() -> Dict[str, int]:
+    return dict.fromkeys(COUNTER_FIELDS, 0)
+
+
+def shard_of(user_id: int) -> int:
+    return user_id % settings.STATS_SHARDS
+
+
+class StatsDelta:
+    # Накопитель изменений: строки пользователей и строки шардов общих счетчиков
+    # меняются UPSERT-запросами с прибавлением. Общей строки, через которую шла бы
+    # каждая запись, нет: запись затрагивает только шард своего пользователя.
+
+    def __init__(self):
+        self.counters: Dict[int, Dict[str, int]] = defaultdict(_counters)
+        self.months: Dict[Tuple[int, int, int], int] = defaultdict(int)
+        self.shard_counters: Dict[int, Dict[str, int]] = defaultdict(_counters)
+        self.shard_months: Dict[Tuple[int, int, int], int] = defaultdict(int)
+
+    def _add(self, user_id: int, field: str, value: int) -> None:
+        self.counters[user_id][field] += value
+        self.shard_counters[shard_of(user_id)][field] += value
+
+    def _add_month(self, user_id: int, year: int, month: int, value: int) -> None:
+        self.months[(user_id, year, month)] += value
+        self.shard_months[(shard_of(user_id), year, month)] += value
+
+    def post(self, user_id: int, created: Optional[datetime], is_published: bool, sign: int = 1, images: int = 0) -> None:
+        self._add(user_id, "total_posts", sign)
+        if is_published:
+            self._add(user_id, "published_posts", sign)
+        if images:
+            self._add(user_id, "total_images", sign * images)
+        if created is not None:
+            self._add_month(user_id, created.year, created.month, sign)
+
+    def posts(self, user_id: int, value: int) -> None:
+        self._add(user_id, "total_posts", value)
+
+    def published(self, user_id: int, value: int) -> None:
+        self._add(user_id, "published_posts", value)
+
+    def images(self, user_id: int, value: int) -> None:
+        self._add(user_id, "total_images", value)
+
+    def __sub__(self, other: "StatsDelta") -> "StatsDelta":
+        result = StatsDelta()
+        for mine, theirs, target in (
+                (self.counters, other.counters, result.counters),
+                (self.shard_counters, other.shard_counters, result.shard_counters),
+        ):
+            for key in mine.keys() | theirs.keys():
+                target[key] = {
+                    field: mine.get(key, {}).get(field, 0) - theirs.get(key, {}).get(field, 0)
+                    for field in COUNTER_FIELDS
+                }
+        for mine, theirs, target in (
+                (self.months, other.months, result.months),
+                (self.shard_months, other.shard_months, result.shard_months),
+        ):
+            for key in mine.keys() | theirs.keys():
+                target[key] = mine.get(key, 0) - theirs.get(key, 0)
+        return result
+
+    async def apply(self, db: AsyncSession) -> None:
+        # Строки в порядке ключа: параллельные транзакции блокируют их в одном
+        # порядке и не попадают во взаимоблокировку
+        await _increment(db, PostStatsCounter.__table__, ["user_id"], COUNTER_FIELDS, [
+            {"user_id": user_id, **values}
+            for user_id, values in sorted(self.counters.items())
+            if any(values.values())
+        ])
+        await _increment(db, PostMonthlyStats.__table__, ["user_id", "year", "month"], ["count"], [
+            {"user_id": user_id, "year": year, "month": month, "count": count}
+            for (user_id, year, month), count in sorted(self.months.items())
+            if count
+        ])
+        await _increment(db, PostStatsShard.__table__, ["shard"], COUNTER_FIELDS, [
+            {"shard": shard, **values}
+            for shard, values in sorted(self.shard_counters.items())
+            if any(values.values())
+        ])
+        await _increment(db, PostMonthlyShard.__table__, ["shard", "year", "month"], ["count"], [
+            {"shard": shard, "year": year, "month": month, "count": count}
+            for (shard, year, month), count in sorted(self.shard_months.items())
+            if count
+        ])
+
+
+async def _increment(db: AsyncSession, table, keys: List[str], fields: Iterable[str], rows: List[dict]) -> None:
+    for start in range(0, len(rows), WRITE_BATCH):
+        stmt = dialect_insert(db, table).values(rows[start:start + WRITE_BATCH])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={field: table.c[field] + stmt.excluded[field] for field in fields},
+        )
+        await db.execute(stmt)
+
+
+async def posts_created(db: AsyncSession, posts: Iterable[Post]) -> None:
+    delta = StatsDelta()
+    for post in posts:
+        delta.post(post.user_id, post.created, post.is_published)
+    await delta.apply(db)
+
+
+async def snapshot_posts(db: AsyncSession, post_ids: List[int]) -> List[Any]:
+    # Снимок удаляемых постов: после удаления (и каскада изображений) данных уже не будет
+    image_counts = (
+        select(PostImage.post_id, func.count(PostImage.id).label("images"))
+        .where(PostImage.post_id.in_(post_ids))
+        .group_by(PostImage.post_id)
+        .subquery()
+    )
+    stmt = (
+        select(Post.user_id, Post.created, Post.is_published, func.coalesce(image_counts.c.images, 0).label("images"))
+        .outerjoin(image_counts, image_counts.c.post_id == Post.id)
+        .where(Post.id.in_(post_ids))
+    )
+    result = await db.execute(stmt)
+    return list(result.all())
+
+
+async def posts_deleted(db: AsyncSession, snapshot: Iterable[Any]) -> None:
+    delta = StatsDelta()
+    for row in snapshot:
+        delta.post(row.user_id, row.created, row.is_published, sign=-1, images=row.images)
+    await delta.apply(db)
+
+
+async def publication_deltas(db: AsyncSession, post_ids: List[int], is_published: bool) -> StatsDelta:
+    # Считается до UPDATE: какие посты действительно сменят статус
+    stmt = (
+        select(Post.user_id, func.count(Post.id).label("count"))
+        .where(Post.id.in_(post_ids), Post.is_published != is_published)
+        .group_by(Post.user_id)
+    )
+    result = await db.execute(stmt)
+
+    delta = StatsDelta()
+    sign = 1 if is_published else -1
+    for row in result.all():
+        delta.published(row.user_id, sign * row.count)
+    return delta
+
+
+async def publication_changed(db: AsyncSession, user_id: int, is_published: bool) -> None:
+    delta = StatsDelta()
+    delta.published(user_id, 1 if is_published else -1)
+    await delta.apply(db)
+
+
+async def images_changed(db: AsyncSession, user_id: int, value: int) -> None:
+    delta = StatsDelta()
+    delta.images(user_id, value)
+    await delta.apply(db)
+
+
+async def get_stats(db: AsyncSession, user_id: Optional[int] = None) -> Dict[str, Any]:
+    # Общая статистика - сумма STATS_SHARDS строк шардов, без обхода пользователей
+    if user_id is None:
+        counter_table, month_table = PostStatsShard, PostMonthlyShard
+    else:
+        counter_table, month_table = PostStatsCounter, PostMonthlyStats
+    counters = select(
+        func.coalesce(func.sum(counter_table.total_posts), 0).label("total_posts"),
+        func.coalesce(func.sum(counter_table.published_posts), 0).label("published_posts"),
+        func.coalesce(func.sum(counter_table.total_images), 0).label("total_images"),
+    )
+    months = (
+        select(month_table.year, month_table.month, func.sum(month_table.count).label("count"))
+        .group_by(month_table.year, month_table.month)
+        .having(func.sum(month_table.count) > 0)
+        .order_by(month_table.year, month_table.month)
+    )
+    if user_id is not None:
+        counters = counters.where(PostStatsCounter.user_id == user_id)
+        months = months.where(PostMonthlyStats.user_id == user_id)
+
+    counter = (await db.execute(counters)).one()
+    total_posts = int(counter.total_posts)
+    published_posts = int(counter.published_posts)
+    total_images = int(counter.total_images)
+
+    months_result = await db.execute(months)
+    posts_by_month = [
+        {"year": row.year, "month": row.month, "count": int(row.count)}
+        for row in months_result.all()
+    ]
+
+    most_active_user = user_id
+    if user_id is None:
+        # Первая строка индекса по total_posts
+        most_active_result = await db.execute(
+            select(PostStatsCounter.user_id)
+            .where(PostStatsCounter.total_posts > 0)
+            .order_by(PostStatsCounter.total_posts.desc())
+            .limit(1)
+        )
+        most_active_user = most_active_result.scalar_one_or_none()
+
+    return {
+        "total_posts": total_posts,
+        "published_posts": published_posts,
+        "draft_posts": total_posts - published_posts,
+        "posts_by_month": posts_by_month,
+        "average_images_per_post": total_images / total_posts if total_posts else 0.0,
+        "most_active_user": most_active_user,
+    }
+
+
+async def _recount(db: AsyncSession) -> StatsDelta:
+    # Счетчики, посчитанные заново по таблицам Post и PostImage
+    image_counts = (
+        select(PostImage.post_id, func.count(PostImage.id).label("images"))
+        .group_by(PostImage.post_id)
+        .subquery()
+    )
+    year = extract("year", Post.created).label("year")
+    month = extract("month", Post.created).label("month")
+    result = await db.execute(
+        select(
+            Post.user_id,
+            Post.is_published,
+            year,
+            month,
+            func.count(Post.id).label("posts"),
+            func.coalesce(func.sum(image_counts.c.images), 0).label("images"),
+        )
+        .outerjoin(image_counts, image_counts.c.post_id == Post.id)
+        .group_by(Post.user_id, Post.is_published, year, month)
+    )
+
+    recount = StatsDelta()
+    for row in result.all():
+        recount.posts(row.user_id, row.posts)
+        if row.is_published:
+            recount.published(row.user_id, row.posts)
+        recount.images(row.user_id, int(row.images))
+        recount._add_month(row.user_id, int(row.year), int(row.month), row.posts)
+    return recount
+
+
+async def _stored(db: AsyncSession) -> StatsDelta:
+    # Текущие значения всех счетчиков как есть
+    stored = StatsDelta()
+    for table, key, target in (
+            (PostStatsCounter, PostStatsCounter.user_id, stored.counters),
+            (PostStatsShard, PostStatsShard.shard, stored.shard_counters),
+    ):
+        result = await db.execute(select(key, *(getattr(table, field) for field in COUNTER_FIELDS)))
+        for row in result.all():
+            target[row[0]] = dict(zip(COUNTER_FIELDS, row[1:]))
+    for table, key, target in (
+            (PostMonthlyStats, PostMonthlyStats.user_id, stored.months),
+            (PostMonthlyShard, PostMonthlyShard.shard, stored.shard_months),
+    ):
+        result = await db.execute(select(key, table.year, table.month, table.count))
+        for row in result.all():
+            target[(row[0], row.year, row.month)] = row.count
+    return stored
+
+
+async def reconcile(db: AsyncSession) -> None:
+    # Сверка счетчиков с таблицами Post и PostImage. Пересчет и текущие значения
+    # читаются из одного снимка базы, к счетчикам прибавляется их разница:
+    # записи, зафиксированные после снимка, не теряются, таблицы счетчиков
+    # не блокируются. Изменения записываются в транзакции db.
+    if db.get_bind().dialect.name == "postgresql":
+        # Следующая сверка ждет фиксации этой и делает снимок уже после нее -
+        # иначе одна и та же разница прибавилась бы дважды
+        await db.execute(select(func.pg_advisory_xact_lock(RECONCILE_LOCK_ID)))
+        async with AsyncSessionFactory() as snapshot:
+            await snapshot.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            recount = await _recount(snapshot)
+            stored = await _stored(snapshot)
+    else:
+        recount = await _recount(db)
+        stored = await _stored(db)
+
+    await (recount - stored).apply(db)
+    # Нулевые строки равносильны отсутствующим
+    for table in (PostStatsCounter, PostStatsShard):
+        await db.execute(delete(table).where(*(getattr(table, field) == 0 for field in COUNTER_FIELDS)))
+    for table in (PostMonthlyStats, PostMonthlyShard):
+        await db.execute(delete(table).where(table.count == 0))
+
+
+async def reconcile_periodically(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionFactory() as db:
+                await reconcile(db)
+                await db.commit()
+        except Exception:
+            logger.exception("Ошибка сверки статистики постов")
@@ -0,0 +1,97 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import aiofiles
+from aiofiles.os import remove
+from fastapi import HTTPException, UploadFile
+
+from common.blobstore import BlobStore
+from common.storage import storage_from_settings
+from config import settings
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+
+media_storage = storage_from_settings(settings)
+blob_store = BlobStore(media_storage, settings.BLOB_PREFIX, settings.BLOB_GC_GRACE)
+
+# Сигнатуры поддерживаемых форматов: расширение определяется по содержимому
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+@dataclass
+class StoredUpload:
+    # Ключ оригинала в хранилище медиа
+    key: str
+    extension: str
+    size: int
+    sha256: str
+    # False - такой файл уже был в хранилище
+    created: bool
+
+
+def sniff_image_extension(header: bytes) -> Optional[str]:
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
+async def discard_files(paths: Iterable[str]) -> None:
+    for path in paths:
+        try:
+            await remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def stream_upload(
+        upload: UploadFile,
+        max_size: int = MAX_UPLOAD_SIZE,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> StoredUpload:
+    # Загрузка пишется во временный файл по частям: в памяти не больше одного чанка,
+    # превышение размера обрывает прием сразу. Готовый файл кладется в хранилище
+    # по SHA-256: повторная загрузка того же содержимого не занимает места.
+    temp_path = blob_store.temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as out_file:
+            while chunk := await upload.read(chunk_size):
+                if extension is None:
+                    extension = sniff_image_extension(chunk)
+                    if extension is None:
+                        raise HTTPException(status_code=400, detail="Неподдерживаемый формат файла")
+
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=400, detail="Файл слишком большой")
+
+                digest.update(chunk)
+                await out_file.write(chunk)
+
+        if extension is None:
+            raise HTTPException(status_code=400, detail="Пустой файл")
+
+        sha256 = digest.hexdigest()
+        created = await blob_store.put(temp_path, sha256, extension)
+    except BaseException:
+        await discard_files([temp_path])
+        raise
+
+    return StoredUpload(
+        key=blob_store.original_key(sha256, extension),
+        extension=extension,
+        size=size,
+        sha256=sha256,
+        created=created,
+    )
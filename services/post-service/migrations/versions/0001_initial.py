@@ -0,0 +1,70 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Копия models.POST_SEARCH_DDL на момент ревизии: миграция не должна меняться
+# вместе с моделями
+POST_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE "Post" ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(text, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_post_search_vector ON "Post" USING GIN (search_vector)',
+    'CREATE INDEX IF NOT EXISTS ix_post_normalized_name_trgm ON "Post" USING GIN (normalized_name gin_trgm_ops)',
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "Post",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("is_published", sa.Boolean(), nullable=False, comment="Опубликовано"),
+        sa.Column("name", sa.String(150), nullable=False, comment="Название, max 150 символов"),
+        sa.Column("normalized_name", sa.String(150), nullable=False, comment="Нормализованное название"),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_Post_id", "Post", ["id"])
+    op.create_index("ix_Post_name", "Post", ["name"])
+    op.create_index("ix_Post_normalized_name", "Post", ["normalized_name"])
+    op.create_index("ix_Post_user_id", "Post", ["user_id"])
+    op.create_index("ix_Post_text", "Post", ["text"])
+    op.create_index("ix_Post_created", "Post", ["created"])
+    op.create_index("ix_Post_updated", "Post", ["updated"])
+
+    op.create_table(
+        "PostImage",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("image_path", sa.String(500), nullable=True),
+        sa.Column("thumbnail_path", sa.String(500), nullable=True),
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("Post.id", ondelete="CASCADE"), nullable=False),
+    )
+    op.create_index("ix_PostImage_id", "PostImage", ["id"])
+    op.create_index("ix_PostImage_post_id", "PostImage", ["post_id"])
+
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in POST_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    op.drop_table("PostImage")
+    op.drop_table("Post")
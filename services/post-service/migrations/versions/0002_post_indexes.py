@@ -0,0 +1,101 @@
+"""index plan for post listings
+
+Индексы под запросы PostCRUD: лента (is_published, created DESC, id),
+посты пользователя (user_id, created DESC), частичный индекс опубликованных
+постов и уникальность normalized_name. Btree-индекс на text удаляется:
+он раздувал запись, падал на длинных постах и не помогал поиску.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _dedupe_normalized_names() -> None:
+    # Уникальный индекс не построится на дублях: все посты с тем же
+    # normalized_name, кроме самого раннего, получают суффикс _<id>
+    op.execute(
+        """
+        UPDATE "Post" SET
+            name = substr(name, 1, 149 - length(CAST(id AS TEXT))) || '_' || CAST(id AS TEXT),
+            normalized_name = substr(normalized_name, 1, 149 - length(CAST(id AS TEXT))) || '_' || CAST(id AS TEXT)
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY normalized_name ORDER BY id) AS position
+                FROM "Post"
+            ) AS ranked
+            WHERE position > 1
+        )
+        """
+    )
+
+
+def _replace_normalized_name_index(unique: bool) -> None:
+    # На PostgreSQL новый индекс строится рядом со старым и переименовывается,
+    # чтобы поиск по normalized_name не оставался без индекса
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index("ix_Post_normalized_name", table_name="Post")
+        op.create_index("ix_Post_normalized_name", "Post", ["normalized_name"], unique=unique)
+        return
+
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс
+    op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_Post_normalized_name_new"')
+    op.create_index(
+        "ix_Post_normalized_name_new",
+        "Post",
+        ["normalized_name"],
+        unique=unique,
+        postgresql_concurrently=True,
+    )
+    op.drop_index("ix_Post_normalized_name", table_name="Post", postgresql_concurrently=True)
+    op.execute('ALTER INDEX "ix_Post_normalized_name_new" RENAME TO "ix_Post_normalized_name"')
+
+
+def upgrade() -> None:
+    _dedupe_normalized_names()
+
+    # На PostgreSQL индексы строятся без блокировки записи в таблицу
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_Post_text", table_name="Post", postgresql_concurrently=True)
+        op.drop_index("ix_Post_user_id", table_name="Post", postgresql_concurrently=True)
+
+        _replace_normalized_name_index(unique=True)
+
+        op.create_index(
+            "ix_Post_is_published_created_id",
+            "Post",
+            ["is_published", sa.text("created DESC"), "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_Post_user_id_created",
+            "Post",
+            ["user_id", sa.text("created DESC")],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_Post_published_created_id",
+            "Post",
+            [sa.text("created DESC"), sa.text("id DESC")],
+            postgresql_where=sa.text("is_published"),
+            sqlite_where=sa.text("is_published = 1"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_Post_published_created_id", table_name="Post", postgresql_concurrently=True)
+        op.drop_index("ix_Post_user_id_created", table_name="Post", postgresql_concurrently=True)
+        op.drop_index("ix_Post_is_published_created_id", table_name="Post", postgresql_concurrently=True)
+
+        _replace_normalized_name_index(unique=False)
+        op.create_index("ix_Post_user_id", "Post", ["user_id"], postgresql_concurrently=True)
+        op.create_index("ix_Post_text", "Post", ["text"], postgresql_concurrently=True)
@@ -0,0 +1,80 @@
+"""incremental post statistics
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "PostStatsCounter",
+        sa.Column("user_id", sa.Integer(), primary_key=True, comment="ID пользователя, 0 - все посты"),
+        sa.Column("total_posts", sa.Integer(), nullable=False),
+        sa.Column("published_posts", sa.Integer(), nullable=False),
+        sa.Column("total_images", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_PostStatsCounter_total_posts", "PostStatsCounter", ["total_posts"])
+
+    op.create_table(
+        "PostMonthlyStats",
+        sa.Column("user_id", sa.Integer(), primary_key=True, comment="ID пользователя, 0 - все посты"),
+        sa.Column("year", sa.Integer(), primary_key=True),
+        sa.Column("month", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    # Начальное заполнение счетчиков по существующим постам
+    op.execute(
+        """
+        INSERT INTO "PostMonthlyStats" (user_id, year, month, count)
+        SELECT user_id, CAST(EXTRACT(year FROM created) AS INTEGER),
+               CAST(EXTRACT(month FROM created) AS INTEGER), COUNT(*)
+        FROM "Post" GROUP BY 1, 2, 3
+        """
+        if op.get_bind().dialect.name == "postgresql" else
+        """
+        INSERT INTO "PostMonthlyStats" (user_id, year, month, count)
+        SELECT user_id, CAST(strftime('%Y', created) AS INTEGER),
+               CAST(strftime('%m', created) AS INTEGER), COUNT(*)
+        FROM "Post" GROUP BY 1, 2, 3
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "PostMonthlyStats" (user_id, year, month, count)
+        SELECT 0, year, month, SUM(count) FROM "PostMonthlyStats" GROUP BY year, month
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "PostStatsCounter" (user_id, total_posts, published_posts, total_images)
+        SELECT p.user_id, COUNT(*), SUM(CASE WHEN p.is_published THEN 1 ELSE 0 END),
+               COALESCE(SUM(i.images), 0)
+        FROM "Post" p
+        LEFT JOIN (SELECT post_id, COUNT(*) AS images FROM "PostImage" GROUP BY post_id) i
+            ON i.post_id = p.id
+        GROUP BY p.user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "PostStatsCounter" (user_id, total_posts, published_posts, total_images)
+        SELECT 0, COALESCE(SUM(total_posts), 0), COALESCE(SUM(published_posts), 0),
+               COALESCE(SUM(total_images), 0)
+        FROM "PostStatsCounter"
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("PostMonthlyStats")
+    op.drop_index("ix_PostStatsCounter_total_posts", table_name="PostStatsCounter")
+    op.drop_table("PostStatsCounter")
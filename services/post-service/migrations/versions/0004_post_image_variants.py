@@ -0,0 +1,24 @@
+"""post image variants
+
+Пути уменьшенных копий изображения (300px, 800px, WebP) в JSON-колонке.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("PostImage", sa.Column("variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("PostImage") as batch_op:
+        batch_op.drop_column("variants")
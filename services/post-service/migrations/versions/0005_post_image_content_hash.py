@@ -0,0 +1,29 @@
+"""post image content hash
+
+SHA-256 оригинала, вычисленный при потоковой загрузке.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "PostImage",
+        sa.Column("content_hash", sa.String(length=64), nullable=True, comment="SHA-256 оригинала"),
+    )
+    op.create_index("ix_PostImage_content_hash", "PostImage", ["content_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_PostImage_content_hash", table_name="PostImage")
+    with op.batch_alter_table("PostImage") as batch_op:
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,50 @@
+"""background image jobs
+
+Статус обработки PostImage и таблица задач построения уменьшенных копий.
+Существующие изображения уже обработаны синхронно, поэтому получают ready.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "PostImage",
+        sa.Column(
+            "processing_status",
+            sa.String(length=20),
+            nullable=False,
+            server_default="ready",
+            comment="Статус построения уменьшенных копий",
+        ),
+    )
+
+    op.create_table(
+        "ImageJob",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("PostImage.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(length=500), nullable=True),
+        sa.Column("available_at", sa.DateTime(), nullable=False, comment="Не раньше этого времени (UTC)"),
+        sa.Column("locked_at", sa.DateTime(), nullable=True, comment="Взята воркером (UTC)"),
+    )
+    op.create_index("ix_ImageJob_image_id", "ImageJob", ["image_id"])
+    op.create_index("ix_ImageJob_status_available_at", "ImageJob", ["status", "available_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ImageJob_status_available_at", table_name="ImageJob")
+    op.drop_index("ix_ImageJob_image_id", table_name="ImageJob")
+    op.drop_table("ImageJob")
+    with op.batch_alter_table("PostImage") as batch_op:
+        batch_op.drop_column("processing_status")
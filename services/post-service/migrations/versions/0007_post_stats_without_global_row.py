@@ -0,0 +1,37 @@
+"""post statistics without the global row
+
+Общая статистика считается суммой строк пользователей: строка user_id = 0,
+которую обновляла каждая запись, больше не нужна.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM "PostMonthlyStats" WHERE user_id = 0')
+    op.execute('DELETE FROM "PostStatsCounter" WHERE user_id = 0')
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        INSERT INTO "PostMonthlyStats" (user_id, year, month, count)
+        SELECT 0, year, month, SUM(count) FROM "PostMonthlyStats" GROUP BY year, month
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "PostStatsCounter" (user_id, total_posts, published_posts, total_images)
+        SELECT 0, COALESCE(SUM(total_posts), 0), COALESCE(SUM(published_posts), 0),
+               COALESCE(SUM(total_images), 0)
+        FROM "PostStatsCounter"
+        """
+    )
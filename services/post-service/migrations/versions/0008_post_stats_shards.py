@@ -0,0 +1,55 @@
+"""sharded global post statistics
+
+Общие счетчики хранятся в нескольких строках (STATS_SHARDS): общая статистика
+читается из них, а не суммой по всем пользователям. Строки заполняются из
+счетчиков пользователей по user_id % 16; при другом STATS_SHARDS распределение
+выправит сверка - суммы от него не зависят.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "PostStatsShard",
+        sa.Column("shard", sa.Integer(), primary_key=True),
+        sa.Column("total_posts", sa.Integer(), nullable=False),
+        sa.Column("published_posts", sa.Integer(), nullable=False),
+        sa.Column("total_images", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "PostMonthlyShard",
+        sa.Column("shard", sa.Integer(), primary_key=True),
+        sa.Column("year", sa.Integer(), primary_key=True),
+        sa.Column("month", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    op.execute(
+        """
+        INSERT INTO "PostStatsShard" (shard, total_posts, published_posts, total_images)
+        SELECT user_id % 16, SUM(total_posts), SUM(published_posts), SUM(total_images)
+        FROM "PostStatsCounter" GROUP BY 1
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "PostMonthlyShard" (shard, year, month, count)
+        SELECT user_id % 16, year, month, SUM(count)
+        FROM "PostMonthlyStats" GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("PostMonthlyShard")
+    op.drop_table("PostStatsShard")
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(SERVICE_DIR / "app"), str(SERVICE_DIR.parent)]
+
+# По умолчанию тесты идут на SQLite. Поиск, оценки количества и планы запросов
+# проверяются на PostgreSQL: его адрес задается в TEST_DATABASE_URL.
+WORK_DIR = tempfile.mkdtemp(prefix="post-service-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite+aiosqlite:///{WORK_DIR}/test.db"
+os.environ["STORAGE_LOCAL_ROOT"] = os.path.join(WORK_DIR, "static")
+
+from alembic import command
+from alembic.config import Config
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import counting
+import database
+import main
+import models
+
+# Без пула: каждый тест работает в своем цикле событий
+test_engine = create_async_engine(os.environ["DATABASE_URL"], poolclass=NullPool)
+database.AsyncSessionFactory.configure(bind=test_engine)
+
+postgres_only = pytest.mark.skipif(
+    test_engine.dialect.name != "postgresql",
+    reason="Нужен PostgreSQL (TEST_DATABASE_URL)",
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def seed_posts(count: int, users: int = 1) -> None:
+    async with database.AsyncSessionFactory() as db:
+        await db.execute(insert(models.Post), [
+            {
+                "name": f"Пост про кота {i}",
+                "normalized_name": f"post_pro_kota_{i}",
+                "text": "Кот сидит на окне" if i % 2 else "Собака спит",
+                "user_id": i % users + 1,
+                "is_published": i % 10 != 0,
+            }
+            for i in range(count)
+        ])
+        await db.commit()
+        if test_engine.dialect.name == "postgresql":
+            await db.execute(text('ANALYZE "Post"'))
+
+
+@pytest.fixture
+def schema():
+    async def recreate():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.drop_all)
+            await conn.run_sync(database.Base.metadata.create_all)
+
+    run(recreate())
+    counting.post_count_cache.invalidate()
+    yield
+
+
+def alembic_config() -> Config:
+    config = Config(str(SERVICE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(SERVICE_DIR / "migrations"))
+    return config
+
+
+@pytest.fixture
+def migrate():
+    # Пустая база и функция миграции до указанной ревизии
+    async def drop():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.drop_all)
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+    run(drop())
+    counting.post_count_cache.invalidate()
+    config = alembic_config()
+    return lambda revision="head": command.upgrade(config, revision)
+
+
+@pytest.fixture
+def client(schema):
+    # Без запуска startup-обработчиков: фоновые задачи тестам не нужны
+    app = FastAPI()
+    app.include_router(main.router)
+    return TestClient(app)
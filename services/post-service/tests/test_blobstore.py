@@ -0,0 +1,90 @@
+import hashlib
+import os
+import time
+
+from common.blobstore import BlobStore, TOUCH_NAME
+from common.storage import LocalStorage
+from conftest import run
+
+DATA = b"kot"
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+def make_store(tmp_path) -> BlobStore:
+    return BlobStore(LocalStorage(str(tmp_path)), gc_grace=60)
+
+
+def age(store: BlobStore, prefix: str, seconds: float = 3600) -> None:
+    # Все файлы под префиксом старше срока сборки мусора
+    old = time.time() - seconds
+    for directory, _, files in os.walk(store.storage.local_path(prefix)):
+        for name in files:
+            os.utime(os.path.join(directory, name), (old, old))
+
+
+def test_collect_garbage_removes_unreferenced_blobs(tmp_path):
+    store = make_store(tmp_path)
+
+    async def scenario():
+        await store.put_bytes(DATA, ".jpg")
+        age(store, store.prefix)
+        return await store.collect_garbage()
+
+    assert run(scenario()) == [DIGEST]
+    assert not os.path.exists(store.storage.local_path(store.original_key(DIGEST, ".jpg")))
+    assert run(store.storage.list(store.trash_prefix)) == []
+
+
+def test_collect_garbage_keeps_blob_uploaded_during_collection(tmp_path):
+    # Та же картинка загружается, пока сборщик переносит объект в корзину
+    store = make_store(tmp_path)
+    storage = store.storage
+    move = storage.move
+    uploads = []
+
+    async def move_during_upload(key, new_key):
+        await move(key, new_key)
+        if not uploads:
+            temp_path = store.temp_path()
+            store._write_temp(temp_path, DATA)
+            uploads.append(await store.put(temp_path, DIGEST, ".jpg"))
+            await store.add_ref(DIGEST, "post-image-1")
+
+    async def scenario():
+        await store.put_bytes(DATA, ".jpg")
+        age(store, store.prefix)
+        storage.move = move_during_upload
+        return await store.collect_garbage()
+
+    assert run(scenario()) == []
+    with open(storage.local_path(store.original_key(DIGEST, ".jpg")), "rb") as f:
+        assert f.read() == DATA
+    assert run(store.refcount(DIGEST)) == 1
+
+
+def test_collect_garbage_keeps_recently_touched_blob(tmp_path):
+    store = make_store(tmp_path)
+
+    async def scenario():
+        await store.put_bytes(DATA, ".jpg")
+        age(store, store.prefix)
+        await store.storage.write(store.blob_prefix(DIGEST) + TOUCH_NAME, b"")
+        return await store.collect_garbage()
+
+    assert run(scenario()) == []
+    assert os.path.exists(store.storage.local_path(store.original_key(DIGEST, ".jpg")))
+
+
+def test_prune_refs_removes_replaced_files(tmp_path):
+    store = make_store(tmp_path)
+    other = hashlib.sha256(b"pes").hexdigest()
+
+    async def scenario():
+        await store.add_ref(DIGEST, "post-image-1")
+        await store.add_ref(other, "post-image-1")
+        await store.add_ref(other, "post-image-2")
+        age(store, store.refs_prefix)
+        removed = await store.prune_refs("post-image-", [(DIGEST, "post-image-1")])
+        return removed, await store.refcount(DIGEST), await store.refcount(other)
+
+    assert run(scenario()) == (2, 1, 0)
@@ -0,0 +1,42 @@
+import crud
+
+
+def create(client, names, on_conflict="fail"):
+    return client.post("/posts/bulk", json={
+        "posts": [{"name": name, "text": "Текст поста", "user_id": 1} for name in names],
+        "on_conflict": on_conflict,
+    })
+
+
+def test_bulk_update_rejects_null_name(client):
+    create(client, ["Кот"])
+
+    response = client.patch("/posts/bulk", json={"post_ids": [1], "data": {"name": None}})
+
+    assert response.status_code == 422
+
+
+def test_update_rejects_null_fields(client):
+    create(client, ["Кот"])
+
+    for field in ("name", "text", "is_published"):
+        response = client.patch("/posts/1", json={field: None})
+        assert response.status_code == 422, field
+
+
+def test_bulk_create_renames_past_checked_suffixes(client, monkeypatch):
+    monkeypatch.setattr(crud, "RENAME_BATCH", 2)
+    create(client, ["Кот", "Кот_1", "Кот_2", "Кот_3", "Пес"])
+
+    response = create(client, ["Кот", "Пес", "Мышь"], on_conflict="rename")
+
+    assert response.status_code == 200, response.text
+    assert [post["name"] for post in response.json()] == ["Кот_4", "Пес_1", "Мышь"]
+
+
+def test_create_rejects_existing_normalized_name(client):
+    create(client, ["Кот"])
+
+    response = client.post("/posts/", json={"name": "кот", "text": "Текст поста", "user_id": 1})
+
+    assert response.status_code == 400
@@ -0,0 +1,98 @@
+import cache
+import crud
+import database
+from conftest import run
+
+
+def test_memory_cache_versions_are_bounded():
+    backend = cache.MemoryCache(max_entries=3)
+
+    async def scenario():
+        for post_id in range(10):
+            await backend.get_version(f"ver:post:{post_id}")
+            await backend.bump_version(f"ver:missing:{post_id}")
+        return len(backend._versions)
+
+    assert run(scenario()) == 3
+
+
+def test_evicted_version_does_not_serve_stale_entries():
+    backend = cache.MemoryCache(max_entries=2)
+    response_cache = cache.ResponseCache(backend, ttl=60)
+
+    async def scenario():
+        await response_cache.set_post(1, "old")
+        await backend.get_version("ver:post:2")
+        await backend.get_version("ver:post:3")
+        await response_cache.invalidate_posts([1], [])
+        return await response_cache.get_post(1)
+
+    assert run(scenario()) is None
+
+
+def listing_version(session_action):
+    async def scenario():
+        before = await cache.response_cache.backend.get_version(cache.ResponseCache.LISTING_TAG)
+        async with database.AsyncSessionFactory() as db:
+            crud.invalidate_post_caches(db, [1], [1])
+            pending = await cache.response_cache.backend.get_version(cache.ResponseCache.LISTING_TAG)
+            await session_action(db)
+            await crud.flush_invalidations(db)
+        after = await cache.response_cache.backend.get_version(cache.ResponseCache.LISTING_TAG)
+        return before, pending, after
+
+    return run(scenario())
+
+
+def test_caches_invalidated_after_commit(schema):
+    async def commit(db):
+        await db.commit()
+
+    before, pending, after = listing_version(commit)
+    assert pending == before
+    assert after > before
+
+
+def test_caches_kept_on_rollback(schema):
+    async def rollback(db):
+        await db.rollback()
+
+    before, pending, after = listing_version(rollback)
+    assert pending == before == after
+
+
+def test_listing_reflects_bulk_create(client):
+    assert client.get("/posts/").json()["total"] == 0
+
+    response = client.post("/posts/bulk", json={"posts": [{"name": "Кот", "text": "Мяу", "user_id": 1}]})
+    assert response.status_code == 200, response.text
+
+    assert client.get("/posts/").json()["total"] == 1
+
+
+def test_update_is_visible_right_after_response(client):
+    post_id = client.post("/posts/", json={"name": "Кот", "text": "Мяу", "user_id": 1}).json()["id"]
+    assert client.get(f"/posts/{post_id}").json()["text"] == "Мяу"
+    assert client.get("/posts/").json()["items"][0]["preview_text"] == "Мяу"
+
+    response = client.patch(f"/posts/{post_id}", json={"text": "Мур"})
+    assert response.status_code == 200, response.text
+
+    # Версии кэша повышены до ответа на PATCH
+    assert client.get(f"/posts/{post_id}").json()["text"] == "Мур"
+    assert client.get("/posts/").json()["items"][0]["preview_text"] == "Мур"
+
+
+def test_write_keeps_other_users_listings_cached(client):
+    for user_id in (1, 2):
+        client.post("/posts/", json={"name": f"Кот {user_id}", "text": "Мяу", "user_id": user_id})
+    for user_id in (1, 2):
+        client.get("/posts/", params={"user_id": user_id})
+    hits = dict(cache.response_cache.hits)
+
+    client.post("/posts/", json={"name": "Еще кот", "text": "Мяу", "user_id": 1})
+
+    assert client.get("/posts/", params={"user_id": 2}).json()["total"] == 1
+    assert cache.response_cache.hits["listing"] == hits["listing"] + 1
+    assert client.get("/posts/", params={"user_id": 1}).json()["total"] == 2
+    assert cache.response_cache.hits["listing"] == hits["listing"] + 1
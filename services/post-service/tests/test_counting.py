@@ -0,0 +1,42 @@
+from sqlalchemy.dialects import postgresql
+
+import counting
+import database
+import models
+import search
+from conftest import postgres_only, run, seed_posts
+
+SEARCH_QUERY = "кот'; DROP TABLE \"Post\"; --"
+
+
+def test_explain_keeps_search_as_parameters():
+    condition = search.PostgresSearchEngine().condition(SEARCH_QUERY)
+    stmt = counting.Explain(counting.select(models.Post.id).where(condition))
+
+    compiled = stmt.compile(dialect=postgresql.asyncpg.dialect())
+
+    assert str(compiled).startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "DROP TABLE" not in str(compiled)
+    assert SEARCH_QUERY.lower() in compiled.params.values()
+
+
+@postgres_only
+def test_estimated_count_with_search(schema):
+    run(seed_posts(2000))
+
+    async def estimate():
+        async with database.AsyncSessionFactory() as db:
+            condition = search.search_engine.condition("кот")
+            return await counting._estimated_count(db, [condition])
+
+    assert run(estimate()) > 0
+
+
+@postgres_only
+def test_list_posts_estimate_with_search(client):
+    run(seed_posts(2000))
+
+    for query in ("кот", SEARCH_QUERY):
+        response = client.get("/posts/", params={"search": query, "count_strategy": "estimate"})
+        assert response.status_code == 200, response.text
+        assert response.json()["total"] is not None
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import and_, select, text
+
+import counting
+import database
+import models
+import schemas
+from conftest import postgres_only, run, seed_posts
+from crud import PostCRUD
+
+
+def seq_scans(plan: dict) -> list:
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def listing(**filters):
+    filter_params = schemas.PostFilter(**filters)
+    return (
+        PostCRUD.list_query()
+        .where(and_(*PostCRUD.filter_conditions(filter_params)))
+        .order_by(*PostCRUD.order_by(schemas.PostSort(), filter_params))
+        .limit(20)
+    )
+
+
+@postgres_only
+@pytest.mark.parametrize("stmt", [
+    listing(is_published=True),
+    listing(user_id=7),
+    select(models.Post.id).where(models.Post.normalized_name == "post_pro_kota_42"),
+], ids=["feed", "user_posts", "normalized_name"])
+def test_post_queries_use_indexes(migrate, stmt):
+    # Индексы из миграций, а не из metadata.create_all
+    migrate()
+    run(seed_posts(5000, users=50))
+
+    async def explain():
+        async with database.AsyncSessionFactory() as db:
+            # Seq Scan остается в плане и с этим запретом, только если
+            # подходящего индекса нет
+            await db.execute(text("SET LOCAL enable_seqscan = off"))
+            result = await db.execute(counting.Explain(stmt))
+            return result.scalar()
+
+    plan = run(explain())[0]["Plan"]
+    assert seq_scans(plan) == []
@@ -0,0 +1,34 @@
+from sqlalchemy import insert, select
+
+import database
+import models
+from conftest import run
+
+
+def test_unique_index_migration_renames_duplicates(migrate):
+    migrate("0001")
+
+    async def insert_duplicates():
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(insert(models.Post.__table__), [
+                {"name": "Кот", "normalized_name": "kot", "text": "", "user_id": 1, "is_published": True},
+                {"name": "кот!", "normalized_name": "kot", "text": "", "user_id": 1, "is_published": True},
+                {"name": "Пес", "normalized_name": "pes", "text": "", "user_id": 1, "is_published": True},
+            ])
+            await db.commit()
+
+    run(insert_duplicates())
+    migrate("0002")
+
+    async def names():
+        async with database.AsyncSessionFactory() as db:
+            result = await db.execute(
+                select(models.Post.id, models.Post.name, models.Post.normalized_name).order_by(models.Post.id)
+            )
+            return result.all()
+
+    assert run(names()) == [(1, "Кот", "kot"), (2, "кот!_2", "kot_2"), (3, "Пес", "pes")]
+
+
+def test_migrations_upgrade_to_head(migrate):
+    migrate()
@@ -0,0 +1,125 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+import cache
+import database
+import models
+import pagination
+import schemas
+from conftest import run
+
+CREATED = datetime(2024, 3, 1, 12, 0, 0)
+
+
+def seed_same_created(count: int) -> None:
+    # Одинаковый ключ сортировки у всех постов: порядок держится только на id
+    async def seed():
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(insert(models.Post), [
+                {
+                    "name": f"Пост {i}",
+                    "normalized_name": f"post_{i}",
+                    "text": "Кот сидит на окне",
+                    "user_id": 1,
+                    "is_published": True,
+                    "created": CREATED,
+                    "updated": CREATED,
+                }
+                for i in range(count)
+            ])
+            await db.commit()
+        await cache.response_cache.invalidate_listings()
+
+    run(seed())
+
+
+def tamper(token: str, **changes) -> str:
+    padded = token + "=" * (-len(token) % 4)
+    payload = {**json.loads(base64.urlsafe_b64decode(padded)), **changes}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_roundtrip_keeps_datetime_value():
+    sort = schemas.PostSort(sort_by="created", sort_order="desc")
+    post = models.Post(id=42, created=CREATED)
+
+    token = pagination.encode_cursor(post, sort, pagination.CURSOR_NEXT)
+    cursor = pagination.decode_cursor(token, sort)
+
+    assert "=" not in token
+    assert cursor.id == 42
+    assert cursor.value == CREATED
+    assert cursor.direction == pagination.CURSOR_NEXT
+
+
+@pytest.mark.parametrize("token", [
+    "не-base64",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"sort_by": "created"}').decode(),
+])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(HTTPException) as error:
+        pagination.decode_cursor(token, schemas.PostSort())
+
+    assert error.value.status_code == 400
+
+
+def test_cursor_pages_are_stable_with_equal_sort_keys(client):
+    seed_same_created(25)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"mode": "cursor", "per_page": 7, "sort_by": "created"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/posts/", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        seen.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+        last_page = body
+
+    assert len(seen) == 25
+    assert seen == sorted(seen, reverse=True)
+
+    # Назад от последней страницы - та же предыдущая страница
+    previous = client.get("/posts/", params={"per_page": 7, "sort_by": "created", "cursor": body["prev_cursor"]})
+    assert [item["id"] for item in previous.json()["items"]] == [item["id"] for item in last_page["items"]]
+
+
+def test_cursor_mode_skips_total_by_default(client):
+    seed_same_created(3)
+
+    default = client.get("/posts/", params={"mode": "cursor"}).json()
+    counted = client.get("/posts/", params={"mode": "cursor", "with_total": "true"}).json()
+    page = client.get("/posts/").json()
+
+    assert default["total"] is None
+    assert counted["total"] == 3
+    assert page["total"] == 3
+
+
+def test_tampered_cursor_returns_400(client):
+    seed_same_created(5)
+    token = client.get("/posts/", params={"mode": "cursor", "per_page": 2}).json()["next_cursor"]
+
+    for bad in (
+        token[:-3],
+        tamper(token, direction="sideways"),
+        tamper(token, id="не число"),
+        tamper(token, sort_by="name"),
+    ):
+        response = client.get("/posts/", params={"cursor": bad, "per_page": 2})
+        assert response.status_code == 400, bad
+
+    # Курсор другой сортировки
+    response = client.get("/posts/", params={"cursor": token, "per_page": 2, "sort_order": "asc"})
+    assert response.status_code == 400
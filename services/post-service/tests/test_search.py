@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import select
+
+import crud
+import database
+import models
+import search
+from conftest import run
+
+memory_only = pytest.mark.skipif(
+    not isinstance(search.search_engine, search.MemorySearchIndex),
+    reason="Индекс в памяти процесса работает только без PostgreSQL",
+)
+
+
+def new_post(name: str) -> models.Post:
+    return models.Post(name=name, text="Кот сидит на окне", user_id=1, is_published=True)
+
+
+@memory_only
+def test_index_is_updated_after_commit(schema):
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            post = new_post("Рыжий кот")
+            db.add(post)
+            await db.flush()
+            before_commit = search.search_engine.search("рыжий")
+            await db.commit()
+            return post.id, before_commit, search.search_engine.search("рыжий")
+
+    post_id, before_commit, after_commit = run(scenario())
+
+    assert post_id not in before_commit
+    assert post_id in after_commit
+
+
+@memory_only
+def test_rolled_back_insert_is_not_indexed(schema):
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            post = new_post("Полосатый кот")
+            db.add(post)
+            await db.flush()
+            post_id = post.id
+            await db.rollback()
+        return post_id
+
+    post_id = run(scenario())
+
+    assert post_id not in search.search_engine.search("полосатый")
+
+
+@memory_only
+def test_rolled_back_delete_keeps_post_indexed(schema):
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            post = new_post("Черный кот")
+            db.add(post)
+            await db.commit()
+            post_id = post.id
+
+        async with database.AsyncSessionFactory() as db:
+            await crud.PostCRUD.bulk_delete(db, [post_id])
+            await db.rollback()
+
+        async with database.AsyncSessionFactory() as db:
+            await db.delete(await db.get(models.Post, post_id))
+            await db.flush()
+            await db.rollback()
+        return post_id
+
+    post_id = run(scenario())
+
+    assert post_id in search.search_engine.search("черный")
+
+
+@memory_only
+def test_bulk_update_reindexes_after_commit(schema):
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            db.add_all([new_post("Первый"), new_post("Второй")])
+            await db.commit()
+            post_ids = list((await db.execute(select(models.Post.id))).scalars().all())
+
+        async with database.AsyncSessionFactory() as db:
+            await crud.PostCRUD.bulk_update(db, post_ids, crud.schemas.PostUpdate(text="Собака спит"))
+            pending = search.search_engine.search("собака")
+            await db.commit()
+        return post_ids, pending, search.search_engine.search("собака")
+
+    post_ids, pending, committed = run(scenario())
+
+    assert pending == {}
+    assert sorted(committed) == sorted(post_ids)
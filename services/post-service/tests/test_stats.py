@@ -0,0 +1,138 @@
+import asyncio
+
+from sqlalchemy import delete, func, select, update
+
+import database
+import models
+import stats
+from conftest import postgres_only, run, seed_posts
+
+
+async def reconcile():
+    async with database.AsyncSessionFactory() as db:
+        await stats.reconcile(db)
+        await db.commit()
+
+
+def create(client, names, user_id):
+    response = client.post("/posts/bulk", json={
+        "posts": [{"name": name, "text": "Текст поста", "user_id": user_id} for name in names],
+    })
+    assert response.status_code == 200, response.text
+
+
+def test_global_stats_sum_user_rows(client):
+    create(client, ["Кот", "Пес"], user_id=1)
+    create(client, ["Мышь"], user_id=2)
+    client.patch("/posts/bulk", json={"post_ids": [3], "data": {"is_published": False}})
+
+    total = client.get("/posts/stats").json()
+    user = client.get("/posts/stats", params={"user_id": 1}).json()
+
+    assert (total["total_posts"], total["published_posts"], total["most_active_user"]) == (3, 2, 1)
+    assert sum(month["count"] for month in total["posts_by_month"]) == 3
+    assert (user["total_posts"], user["published_posts"]) == (2, 2)
+
+
+def test_reconcile_overwrites_counters(client):
+    create(client, ["Кот", "Пес"], user_id=1)
+    create(client, ["Мышь"], user_id=2)
+    before = client.get("/posts/stats").json()
+
+    async def corrupt():
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(update(models.PostStatsCounter).values(total_posts=100))
+            await db.execute(update(models.PostMonthlyStats).values(count=100))
+            await db.execute(update(models.PostStatsShard).values(total_posts=100))
+            await db.execute(update(models.PostMonthlyShard).values(count=100))
+            db.add(models.PostStatsShard(shard=999, total_posts=7, published_posts=0, total_images=0))
+            db.add(models.PostStatsCounter(user_id=3, total_posts=5, published_posts=5, total_images=0))
+            await db.commit()
+
+    run(corrupt())
+    run(reconcile())
+    run(reconcile())
+
+    assert client.get("/posts/stats").json() == before
+    assert client.get("/posts/stats", params={"user_id": 3}).json()["total_posts"] == 0
+
+
+@postgres_only
+def test_concurrent_reconcile_and_writes(client):
+    run(seed_posts(500, users=5))
+    run(reconcile())
+
+    async def scenario():
+        async def write(i):
+            async with database.AsyncSessionFactory() as db:
+                post = models.Post(name=f"Новый пост {i}", text="Текст", user_id=1, is_published=True)
+                db.add(post)
+                await db.flush()
+                await stats.posts_created(db, [post])
+                await db.commit()
+
+        await asyncio.gather(reconcile(), reconcile(), *(write(i) for i in range(20)), reconcile())
+
+    run(scenario())
+
+    assert client.get("/posts/stats").json()["total_posts"] == 520
+
+
+def test_global_stats_come_from_shard_rows(client):
+    for user_id in range(1, 40):
+        create(client, [f"Пост {user_id}"], user_id=user_id)
+
+    async def shards():
+        async with database.AsyncSessionFactory() as db:
+            rows = await db.execute(select(func.count(), func.sum(models.PostStatsShard.total_posts)))
+            return rows.one()
+
+    count, total = run(shards())
+
+    assert count <= stats.settings.STATS_SHARDS
+    assert total == 39
+    assert client.get("/posts/stats").json()["total_posts"] == 39
+
+
+def test_reconcile_writes_many_rows_in_batches(client):
+    # 9000 пользователей: одним UPSERT это 36000 параметров, больше предела asyncpg
+    run(seed_posts(9000, users=9000))
+
+    async def drop_counters():
+        async with database.AsyncSessionFactory() as db:
+            for table in (models.PostStatsCounter, models.PostMonthlyStats, models.PostStatsShard, models.PostMonthlyShard):
+                await db.execute(delete(table))
+            await db.commit()
+
+    run(drop_counters())
+    run(reconcile())
+
+    total = client.get("/posts/stats").json()
+    assert total["total_posts"] == 9000
+    assert client.get("/posts/stats", params={"user_id": 9000}).json()["total_posts"] == 1
+
+
+@postgres_only
+def test_reconcile_does_not_block_writers(client):
+    run(seed_posts(100, users=5))
+
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            await stats.reconcile(db)
+
+            # Сверка еще не зафиксирована: запись другого пользователя проходит
+            async def write():
+                async with database.AsyncSessionFactory() as writer:
+                    post = models.Post(name="Новый пост", text="Текст", user_id=42, is_published=True)
+                    writer.add(post)
+                    await writer.flush()
+                    await stats.posts_created(writer, [post])
+                    await writer.commit()
+
+            await asyncio.wait_for(write(), timeout=5)
+            await db.commit()
+
+    run(scenario())
+    run(reconcile())
+
+    assert client.get("/posts/stats").json()["total_posts"] == 101
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+
+import uploads
+from conftest import run
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+CONCURRENT_UPLOADS = 20
+
+
+class GeneratedUpload:
+    # Файл заданного размера, который отдается по частям и целиком в памяти не бывает
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b""
+        if self.position == 0:
+            chunk = JPEG_HEADER + self.seed.to_bytes(4, "big") + bytes(size - 8)
+        else:
+            chunk = bytes(size)
+        self.position += size
+        await asyncio.sleep(0)
+        return chunk
+
+
+def test_concurrent_uploads_keep_memory_bounded():
+    # 20 одновременных загрузок по 10MB: прежний read() целиком держал бы в памяти 200MB
+    async def scenario():
+        files = [GeneratedUpload(uploads.MAX_UPLOAD_SIZE, seed) for seed in range(CONCURRENT_UPLOADS)]
+        tracemalloc.start()
+        try:
+            stored = await asyncio.gather(*(uploads.stream_upload(file) for file in files))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return stored, peak
+
+    stored, peak = run(scenario())
+
+    assert len({item.sha256 for item in stored}) == CONCURRENT_UPLOADS
+    assert all(item.size == uploads.MAX_UPLOAD_SIZE for item in stored)
+    # Не больше пары чанков на загрузку
+    assert peak < CONCURRENT_UPLOADS * 3 * uploads.UPLOAD_CHUNK_SIZE
+
+
+def test_oversized_upload_is_rejected_without_reading_it_all():
+    upload = GeneratedUpload(10 * uploads.MAX_UPLOAD_SIZE, 0)
+
+    with pytest.raises(HTTPException) as error:
+        run(uploads.stream_upload(upload))
+
+    assert error.value.status_code == 400
+    assert upload.position <= uploads.MAX_UPLOAD_SIZE + uploads.UPLOAD_CHUNK_SIZE
+    # Временный файл удален
+    assert os.listdir(uploads.media_storage.temp_dir()) == []
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from database import AsyncSessionFactory
+from models import Profile
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+async def backfill_image_variants(batch_size: int = BATCH_SIZE) -> int:
+    # Манифест миниатюр для аватарок, загруженных до появления Profile.image_variants:
+    # готовые миниатюры берутся из хранилища, недостающие строятся
+    updated = 0
+    last_id = 0
+    while True:
+        async with AsyncSessionFactory() as db:
+            result = await db.execute(
+                select(Profile)
+                .where(Profile.id > last_id, Profile.image.is_not(None))
+                .order_by(Profile.id)
+                .limit(batch_size)
+            )
+            profiles = result.scalars().all()
+            if not profiles:
+                return updated
+
+            for profile in profiles:
+                # JSON null и SQL NULL читаются одинаково
+                if profile.image_variants is None:
+                    profile.image_variants = await profile._build_thumbnails()
+                    updated += profile.image_variants is not None
+            await db.commit()
+            last_id = profiles[-1].id
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(backfill_image_variants())
+    logger.info("Манифест миниатюр заполнен для %d профилей", count)
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from database import AsyncSession, AsyncSessionFactory
+from models import Profile, PROFILE_BLOB_PREFIX, blob_store
+
+logger = logging.getLogger(__name__)
+
+
+async def prune_avatar_refs(db: AsyncSession) -> int:
+    # Снимает ссылки удаленных профилей и замененных аватарок; файлы без ссылок
+    # удаляет общий сборщик мусора (BlobStore.collect_garbage в post-service)
+    result = await db.execute(select(Profile.user_id, Profile.image).where(Profile.image.is_not(None)))
+    live_refs = []
+    for user_id, image in result:
+        digest = blob_store.digest_from_key(image)
+        if digest:
+            live_refs.append((digest, f"{PROFILE_BLOB_PREFIX}{user_id}"))
+    return await blob_store.prune_refs(PROFILE_BLOB_PREFIX, live_refs)
+
+
+async def main() -> int:
+    async with AsyncSessionFactory() as db:
+        return await prune_avatar_refs(db)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(main())
+    logger.info("Снято ссылок на аватарки: %d", count)
@@ -0,0 +1,9 @@
+from common.imaging import ImageProcessor
+from config import settings
+
+# Пул процессов для обработки аватарок: событийный цикл не блокируется
+image_processor = ImageProcessor(
+    workers=settings.IMAGE_WORKERS,
+    queue_size=settings.IMAGE_QUEUE_SIZE,
+    queue_timeout=settings.IMAGE_QUEUE_TIMEOUT,
+)
@@ -1,19 +1,28 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, Optional
+import logging
+import os
 import re
+import uuid
 
-from sqlalchemy import String, DateTime, Boolean, Integer, ForeignKey, Date, event
+from sqlalchemy import String, DateTime, Boolean, Integer, ForeignKey, Date, JSON, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship, validates, selectinload
 
 from database import AsyncSession
 
 from database import Base
+from config import settings
+from common.blobstore import BlobStore
+from common.imaging import ImageQueueFull, ImageVariant
+from common.storage import ObjectNotFound, StorageError, storage_from_settings
+from fastapi import HTTPException
+from imaging import image_processor
 import hashlib
-from PIL import Image as PILImage
-import io
-import aiofiles
+import posixpath
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 class UserManager:
     CANONICAL_DOMAINS = {
@@ -171,6 +180,13 @@ class User(Base):
         return result.scalar_one_or_none()
 
 
+# Аватарки лежат в общем с post-service хранилище по содержимому
+media_storage = storage_from_settings(settings)
+blob_store = BlobStore(media_storage, settings.BLOB_PREFIX, settings.BLOB_GC_GRACE)
+# Префикс владельцев ссылок на аватарки
+PROFILE_BLOB_PREFIX = "profile-"
+
+
 class Profile(Base):
     __tablename__ = "Profile"
 
@@ -204,6 +220,12 @@ class Profile(Base):
         nullable=True,
         comment="Путь к аватарке"
     )
+    # Готовые миниатюры: размер -> ключ в хранилище (заполняется при загрузке)
+    image_variants: Mapped[Optional[Dict[str, str]]] = mapped_column(
+        JSON,
+        nullable=True,
+        comment="Миниатюры аватарки"
+    )
 
     user: Mapped["User"] = relationship(
         "User",
@@ -211,124 +233,105 @@ class Profile(Base):
         lazy="joined"
     )
 
-    IMAGE_BASE_DIR = Path("static/users")
     THUMBNAIL_DIR = "thumbnails"
+    THUMBNAIL_SIZES = {
+        "300x300": (300, 300),
+        "50x50": (50, 50),
+    }
 
     @property
-    def image_upload_path(self) -> Path:
-        # Путь для загрузки изображений пользователя
-        return self.IMAGE_BASE_DIR / str(self.user_id)
+    def blob_owner(self) -> str:
+        # Владелец ссылки в хранилище файлов
+        return f"{PROFILE_BLOB_PREFIX}{self.user_id}"
 
     async def save_image(self, file_data: bytes, filename: str) -> str:
-        # Сохранение загруженного изображения
-        await aiofiles.os.makedirs(self.image_upload_path, exist_ok=True)
-
-        filepath = self.image_upload_path / filename
+        # Сохранение загруженного изображения: одинаковые файлы хранятся один раз.
+        # Ссылку на прежнюю аватарку снимает prune_avatar_refs по закоммиченным данным:
+        # до коммита (и после отката) профиль еще ссылается на нее.
+        extension = Path(filename).suffix.lower()
 
-        async with aiofiles.open(filepath, 'wb') as f:
-            await f.write(file_data)
+        digest = await blob_store.put_bytes(file_data, extension)
+        await blob_store.add_ref(digest, self.blob_owner)
+        self.image = blob_store.original_key(digest, extension)
 
-        self.image = str(filepath)
-
-        await self._create_thumbnail(filepath, 300, 300)
-        await self._create_thumbnail(filepath, 50, 50)
+        # Миниатюры строятся при загрузке, ответы API берут их из image_variants
+        self.image_variants = await self._build_thumbnails()
 
         return self.image
 
-    async def get_image_url(self, size: str = "original") -> Optional[str]:
-        # Получить URL изображения заданного размера
+    def _image_key(self) -> str:
+        # Старые записи хранят путь от корня проекта, новые - ключ в хранилище
+        key = self.image.replace("\\", "/")
+        return key[len("static/"):] if key.startswith("static/") else key
+
+    def get_image_url(self, size: str = "original") -> Optional[str]:
+        # URL изображения заданного размера без обращений к хранилищу
         if not self.image:
             return None
 
-        if size == "300x300":
-            return await self._get_thumbnail_url(300, 300)
-        elif size == "50x50":
-            return await self._get_thumbnail_url(50, 50)
+        if size not in self.THUMBNAIL_SIZES:
+            return media_storage.url(self._image_key())
 
-        return self.image
+        # Шлюз строит и кэширует миниатюры сам
+        resize_url = media_storage.resize_url(self._image_key(), *self.THUMBNAIL_SIZES[size], "cover")
+        if resize_url:
+            return resize_url
 
-    async def _get_thumbnail_url(self, width: int, height: int) -> Optional[str]:
-        # Получить URL миниатюры
-        if not self.image:
-            return None
+        thumbnail_key = (self.image_variants or {}).get(size)
+        return media_storage.url(thumbnail_key) if thumbnail_key else None
 
-        original_path = Path(self.image)
+    def _thumbnail_key(self, width: int, height: int) -> str:
+        source_key = self._image_key()
+        directory, filename = posixpath.split(source_key)
+        stem, suffix = posixpath.splitext(filename)
 
         hash_name = hashlib.md5(
-            f"{original_path.stem}_{width}x{height}".encode()
+            f"{stem}_{width}x{height}".encode()
         ).hexdigest()[:8]
 
-        thumbnail_name = f"{original_path.stem}_{width}x{height}_{hash_name}{original_path.suffix}"
-        thumbnail_path = original_path.parent / self.THUMBNAIL_DIR / thumbnail_name
-
-        try:
-            if await aiofiles.os.path.exists(thumbnail_path):
-                return str(thumbnail_path)
-        except:
-            pass
-
-        if await self._create_thumbnail(original_path, width, height):
-            return str(thumbnail_path)
-
-        return None
-
-    async def _create_thumbnail(self, source_path: Path, width: int, height: int) -> bool:
-        try:
+        thumbnail_name = f"{stem}_{width}x{height}_{hash_name}{suffix}"
+        return posixpath.join(directory, self.THUMBNAIL_DIR, thumbnail_name)
+
+    async def _build_thumbnails(self) -> Optional[Dict[str, str]]:
+        # Миниатюры лежат рядом с оригиналом и строятся, только если их еще нет
+        variants = {}
+        missing = {}
+        for size, (width, height) in self.THUMBNAIL_SIZES.items():
+            if media_storage.resize_url(self._image_key(), width, height, "cover"):
+                continue
+            thumbnail_key = self._thumbnail_key(width, height)
             try:
-                async with aiofiles.open(source_path, 'rb') as f:
-                    image_data = await f.read()
-            except FileNotFoundError:
-                print(f"Source file not found: {source_path}")
-                return False
-
-            thumbnail_dir = source_path.parent / self.THUMBNAIL_DIR
-            await aiofiles.os.makedirs(thumbnail_dir, exist_ok=True)
-
-            hash_name = hashlib.md5(
-                f"{source_path.stem}_{width}x{height}".encode()
-            ).hexdigest()[:8]
-            thumbnail_name = f"{source_path.stem}_{width}x{height}_{hash_name}{source_path.suffix}"
-            thumbnail_path = thumbnail_dir / thumbnail_name
-
-            image = PILImage.open(io.BytesIO(image_data))
-
-            if image.mode in ('RGBA', 'LA'):
-                background = PILImage.new('RGB', image.size, (255, 255, 255))
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            elif image.mode == 'P':
-                image = image.convert('RGB')
-
-            image = self._crop_center(image, width, height)
-
-            image.save(thumbnail_path, quality=85, optimize=True)
-            return True
-
-        except Exception as e:
-            print(f"Error creating thumbnail: {e}")
-            return False
-
-    def _crop_center(self, image: PILImage.Image, width: int, height: int) -> PILImage.Image:
-        img_width, img_height = image.size
-
-        target_ratio = width / height
-        img_ratio = img_width / img_height
-
-        if img_ratio > target_ratio:
-            new_width = int(img_height * target_ratio)
-            left = (img_width - new_width) // 2
-            right = left + new_width
-            top = 0
-            bottom = img_height
-        else:
-            new_height = int(img_width / target_ratio)
-            top = (img_height - new_height) // 2
-            bottom = top + new_height
-            left = 0
-            right = img_width
-
-        cropped = image.crop((left, top, right, bottom))
-        return cropped.resize((width, height), PILImage.Resampling.LANCZOS)
+                exists = await media_storage.exists(thumbnail_key)
+            except StorageError:
+                exists = False
+            if exists:
+                variants[size] = thumbnail_key
+            else:
+                missing[size] = (width, height)
+
+        if missing:
+            # Все размеры из одного декодирования локальной копии в пуле процессов
+            temp_dir = media_storage.temp_dir()
+            paths = {size: os.path.join(temp_dir, uuid.uuid4().hex) for size in missing}
+            outputs = [(ImageVariant(missing[size], crop=True), paths[size]) for size in missing]
+            try:
+                async with media_storage.fetch(self._image_key()) as source_path:
+                    await image_processor.render(source_path, outputs)
+                for size, path in paths.items():
+                    thumbnail_key = self._thumbnail_key(*missing[size])
+                    await media_storage.write_file(thumbnail_key, path)
+                    variants[size] = thumbnail_key
+            except ObjectNotFound:
+                logger.warning("Исходный файл аватарки не найден: %s", self._image_key())
+            except ImageQueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+            except Exception:
+                logger.exception("Ошибка построения миниатюр аватарки %s", self._image_key())
+            finally:
+                for path in paths.values():
+                    if os.path.exists(path):
+                        os.remove(path)
+        return variants or None
 
     def increment_attempts(self) -> None:
         # Увеличить счетчик попыток входа
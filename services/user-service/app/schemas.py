@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional, Any
+from typing import Optional, Any, Iterable, List
 from enum import Enum
 
 from pydantic import BaseModel, EmailStr, field_validator, ConfigDict, Field
@@ -59,7 +59,8 @@ class ProfileResponse(ProfileBase):
     image_50x50: Optional[str] = None
 
     @classmethod
-    async def from_profile(cls, profile: Profile) -> 'ProfileResponse':
+    def from_profile(cls, profile: Profile) -> 'ProfileResponse':
+        # Только данные строки Profile: без обращений к хранилищу
         return cls(
             id=profile.id,
             user_id=profile.user_id,
@@ -67,9 +68,9 @@ class ProfileResponse(ProfileBase):
             attempts_count=profile.attempts_count,
             block_date=profile.block_date,
             image=profile.image,
-            image_url=await profile.get_image_url(),
-            image_300x300=await profile.get_image_url("300x300"),
-            image_50x50=await profile.get_image_url("50x50")
+            image_url=profile.get_image_url(),
+            image_300x300=profile.get_image_url("300x300"),
+            image_50x50=profile.get_image_url("50x50")
         )
 
 
@@ -154,10 +155,10 @@ class UserResponse(UserBase):
     profile: Optional[ProfileResponse] = None
 
     @classmethod
-    async def from_user(cls, user: Any) -> 'UserResponse':
+    def from_user(cls, user: Any) -> 'UserResponse':
         profile_response = None
         if user.profile:
-            profile_response = await ProfileResponse.from_profile(user.profile)
+            profile_response = ProfileResponse.from_profile(user.profile)
 
         return cls(
             id=user.id,
@@ -173,6 +174,11 @@ class UserResponse(UserBase):
             profile=profile_response
         )
 
+    @classmethod
+    def from_users(cls, users: Iterable[Any]) -> List['UserResponse']:
+        # Для списков: профили уже загружены одним запросом (User.profile, lazy="selectin")
+        return [cls.from_user(user) for user in users]
+
 
 class UserWithTokenResponse(UserResponse):
     access_token: str
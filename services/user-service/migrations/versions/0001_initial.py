@@ -0,0 +1,59 @@
+"""initial schema
+
+Схема до появления миграций. База, созданная раньше через
+Base.metadata.create_all, отмечается этой ревизией: alembic stamp 0001.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "User",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("password", sa.String(150), nullable=False, comment="Пароль"),
+        sa.Column("last_login", sa.DateTime(), nullable=True, comment="Последний вход"),
+        sa.Column("is_superuser", sa.Boolean(), nullable=False, comment="Суперпользователь"),
+        sa.Column("username", sa.String(150), nullable=False, comment="Никнейм пользователя"),
+        sa.Column("first_name", sa.String(150), nullable=False, comment="Имя пользователя"),
+        sa.Column("last_name", sa.String(150), nullable=False, comment="Фамилия пользователя"),
+        sa.Column("email", sa.String(150), nullable=False, comment="Почта"),
+        sa.Column("is_staff", sa.Boolean(), nullable=False, comment="Персонал"),
+        sa.Column("is_active", sa.Boolean(), nullable=False, comment="Активный"),
+        sa.Column("date_joined", sa.DateTime(), nullable=False, comment="Дата регистрации"),
+    )
+    op.create_index("ix_User_id", "User", ["id"])
+    op.create_index("ix_User_username", "User", ["username"], unique=True)
+    op.create_index("ix_User_email", "User", ["email"], unique=True)
+
+    op.create_table(
+        "Profile",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "user_id",
+            sa.Integer(),
+            sa.ForeignKey("User.id", ondelete="CASCADE"),
+            nullable=False,
+            comment="ID пользователя",
+        ),
+        sa.Column("birthday", sa.Date(), nullable=True, comment="Дата рождения"),
+        sa.Column("attempts_count", sa.Integer(), nullable=False, comment="Количество попыток входа"),
+        sa.Column("block_date", sa.DateTime(), nullable=True, comment="Дата блокировки"),
+        sa.Column("image", sa.String(500), nullable=True, comment="Путь к аватарке"),
+    )
+    op.create_index("ix_Profile_id", "Profile", ["id"])
+    op.create_index("ix_Profile_user_id", "Profile", ["user_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("Profile")
+    op.drop_table("User")
@@ -0,0 +1,26 @@
+"""profile thumbnail manifest
+
+Колонка с ключами готовых миниатюр аватарки. Манифест существующих аватарок
+заполняет python app/backfill.py: миниатюры ищутся в хранилище, недостающие
+строятся. Без манифеста ответы API отдают миниатюры только через шлюз.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("Profile", sa.Column("image_variants", sa.JSON(), nullable=True, comment="Миниатюры аватарки"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Profile") as batch_op:
+        batch_op.drop_column("image_variants")
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(SERVICE_DIR / "app"), str(SERVICE_DIR.parent)]
+
+# По умолчанию тесты идут на SQLite, с TEST_DATABASE_URL - на PostgreSQL
+WORK_DIR = tempfile.mkdtemp(prefix="user-service-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite+aiosqlite:///{WORK_DIR}/test.db"
+os.environ["STORAGE_LOCAL_ROOT"] = os.path.join(WORK_DIR, "static")
+# Миниатюры строит сервис, а не шлюз
+os.environ["STORAGE_RESIZE"] = "false"
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import database
+import models
+
+# Без пула: каждый тест работает в своем цикле событий
+test_engine = create_async_engine(os.environ["DATABASE_URL"], poolclass=NullPool)
+database.AsyncSessionFactory.configure(bind=test_engine)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def alembic_config() -> Config:
+    config = Config(str(SERVICE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(SERVICE_DIR / "migrations"))
+    return config
+
+
+@pytest.fixture
+def migrate():
+    # Пустая база и функция миграции до указанной ревизии
+    async def drop():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.drop_all)
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+    run(drop())
+    config = alembic_config()
+    return lambda revision="head": command.upgrade(config, revision)
+
+
+@pytest.fixture
+def schema(migrate):
+    migrate()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def image_pool():
+    yield
+    models.image_processor.shutdown()
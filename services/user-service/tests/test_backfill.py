@@ -0,0 +1,53 @@
+import io
+from datetime import datetime
+
+from PIL import Image
+from sqlalchemy import insert, select
+
+import database
+import models
+from backfill import backfill_image_variants
+from conftest import run
+
+IMAGE_KEY = "users/avatar.png"
+
+
+def png(size) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(output, "PNG")
+    return output.getvalue()
+
+
+def test_backfill_fills_manifest_for_existing_avatars(migrate):
+    migrate("0001")
+    legacy = models.Profile(user_id=1, image=f"static/{IMAGE_KEY}")
+    existing_key = legacy._thumbnail_key(300, 300)
+
+    async def prepare():
+        await models.media_storage.write(IMAGE_KEY, png((640, 480)))
+        await models.media_storage.write(existing_key, png((300, 300)))
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(insert(models.User.__table__).values(
+                id=1, password="x", is_superuser=False, username="kot", first_name="", last_name="",
+                email="kot@example.com", is_staff=False, is_active=True, date_joined=datetime(2026, 1, 1),
+            ))
+            await db.execute(insert(models.Profile.__table__).values(
+                id=1, user_id=1, attempts_count=0, image=legacy.image,
+            ))
+            await db.commit()
+
+    run(prepare())
+    migrate()
+
+    assert run(backfill_image_variants(batch_size=1)) == 1
+
+    async def load():
+        async with database.AsyncSessionFactory() as db:
+            profile = (await db.execute(select(models.Profile))).scalar_one()
+            built = await models.media_storage.exists(profile.image_variants["50x50"])
+            return profile, built
+
+    profile, built = run(load())
+    assert profile.image_variants == {"300x300": existing_key, "50x50": legacy._thumbnail_key(50, 50)}
+    assert built
+    assert profile.get_image_url("50x50").endswith(legacy._thumbnail_key(50, 50))
@@ -0,0 +1,48 @@
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import database
+import models
+from blobs import prune_avatar_refs
+from conftest import run
+
+
+def test_prune_avatar_refs_removes_replaced_avatars(schema):
+    profile = models.Profile(user_id=1)
+
+    async def scenario():
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(insert(models.User.__table__).values(
+                id=1, password="x", is_superuser=False, username="kot", first_name="", last_name="",
+                email="kot@example.com", is_staff=False, is_active=True, date_joined=datetime(2026, 1, 1),
+            ))
+            await db.commit()
+
+        await profile.save_image(b"old", "old.png")
+        old_digest = models.blob_store.digest_from_key(profile.image)
+        await profile.save_image(b"new", "new.png")
+        new_digest = models.blob_store.digest_from_key(profile.image)
+
+        # Ссылки старше срока сборки мусора
+        old = time.time() - 2 * models.blob_store.gc_grace
+        refs_root = models.media_storage.local_path(models.blob_store.refs_prefix)
+        for directory, _, files in os.walk(refs_root):
+            for name in files:
+                os.utime(os.path.join(directory, name), (old, old))
+
+        async with database.AsyncSessionFactory() as db:
+            await db.execute(insert(models.Profile.__table__).values(
+                id=1, user_id=1, attempts_count=0, image=profile.image,
+            ))
+            await db.commit()
+            removed = await prune_avatar_refs(db)
+        return (
+            removed,
+            await models.blob_store.refcount(old_digest),
+            await models.blob_store.refcount(new_digest),
+        )
+
+    assert run(scenario()) == (1, 0, 1)
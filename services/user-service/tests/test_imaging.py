@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from PIL import Image
+
+import models
+from conftest import run
+
+
+def save_png(key: str, size) -> None:
+    path = models.media_storage.local_path(key)
+    Image.linear_gradient("L").resize(size).convert("RGB").save(path, "PNG")
+
+
+def test_avatar_processing_does_not_block_other_requests():
+    # Пока пул строит миниатюры большой аватарки, другие запросы отвечают сразу
+    app = FastAPI()
+    profile = models.Profile(user_id=1, image="users/big.png")
+
+    @app.post("/avatar")
+    async def avatar():
+        profile.image_variants = await profile._build_thumbnails()
+        return profile.image_variants
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    async def scenario():
+        # Процессы пула запускаются до замера
+        warmup = models.Profile(user_id=2, image="users/small.png")
+        await models.media_storage.write(warmup.image, b"")
+        save_png(warmup.image, (64, 64))
+        assert await warmup._build_thumbnails()
+
+        await models.media_storage.write(profile.image, b"")
+        save_png(profile.image, (4000, 4000))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            upload = asyncio.create_task(client.post("/avatar"))
+            latencies = []
+            while not upload.done():
+                ping_started = time.perf_counter()
+                assert (await client.get("/ping")).status_code == 200
+                latencies.append(time.perf_counter() - ping_started)
+                await asyncio.sleep(0.005)
+            response = await upload
+            return response, time.perf_counter() - started, latencies
+
+    response, processing, latencies = run(scenario())
+    assert response.status_code == 200
+    assert set(response.json()) == {"300x300", "50x50"}
+    assert len(latencies) >= 5
+    assert max(latencies) < min(0.05, processing / 2)